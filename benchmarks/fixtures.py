@@ -0,0 +1,275 @@
+"""The fixtures of the benchmarks: synthetic night plans and the catalog
+responses (VOTables) for their targets, which are replayed instead of
+querying SIMBAD, VizieR and IRSA.
+
+The catalog responses are recorded (with network access) or, as a
+stand-in, generated with::
+
+    python benchmarks/fixtures.py --record
+    python benchmarks/fixtures.py --generate
+"""
+
+import argparse
+import random
+import re
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+from unittest.mock import patch
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "catalogs"
+PROG_ID = "110.2474.004"
+
+# NOTE: The science targets and calibrators of the synthetic night plans
+SCIENCE_TARGETS = [
+    "HD 104237",
+    "HD 100546",
+    "HD 98922",
+    "HD 142666",
+    "HD 144432",
+    "HD 163296",
+    "HD 169142",
+    "HD 179218",
+]
+CALIBRATORS = [
+    ("LN", "HD138538"),
+    ("LN", "HD102839"),
+    ("L", "HD96918"),
+    ("N", "HD102461"),
+    ("LN", "HD139127"),
+    ("L", "HD145366"),
+    ("N", "HD169916"),
+    ("LN", "HD175775"),
+]
+
+# NOTE: The columns of the generated VizieR tables (besides the queried ones)
+VIZIER_COLUMNS = {
+    "gaia": ["RA_ICRS", "DE_ICRS", "Source", "Plx", "BPmag", "RPmag", "RV", "Teff"],
+    "tycho": ["RAJ2000", "DEJ2000", "TYC1", "BTmag", "e_BTmag", "e_VTmag"],
+    "nomad": ["RAJ2000", "DEJ2000", "NOMAD1", "Bmag", "Rmag", "Jmag", "Hmag"],
+    "two_mass": ["RAJ2000", "DEJ2000", "_2MASS", "e_Jmag", "e_Hmag", "e_Kmag"],
+    "wise": ["RAJ2000", "DEJ2000", "WISE", "W2mag", "W4mag", "e_W1mag"],
+    "mdfc": ["RAJ2000", "DEJ2000", "Name", "med-Mflux", "LDD", "e_LDD"],
+}
+SIMBAD_COLUMNS = ["main_id", "ra", "dec", "sp_type", "pmra", "pmdec", "V", "H", "K"]
+IRSA_BANDS = ["CTIO U", "CTIO B", "CTIO V", "2MASS J", "2MASS H", "UKIRT K", "IRAC-1"]
+
+
+def get_slug(name: str) -> str:
+    """Gets the file name of a target's fixture."""
+    return re.sub(r"\W+", "_", name).strip("_")
+
+
+def get_targets() -> List[str]:
+    """Gets all targets (as queried, e.g., "HD 138538") of the night plans."""
+    from p2obt.backend.utils import add_space
+
+    return [
+        add_space(name)
+        for name in [*SCIENCE_TARGETS, *(name for _, name in CALIBRATORS)]
+    ]
+
+
+def make_night_plan(blocks: int, blocks_per_night: int = 10) -> str:
+    """Makes a synthetic night plan (as created with `calibrator_find.pro`).
+
+    The blocks cycle through the science targets and the "CAL-SCI",
+    "SCI-CAL" and "CAL-SCI-CAL" orders.
+
+    Parameters
+    ----------
+    blocks : int
+        The number of blocks (science targets with their calibrators).
+    blocks_per_night : int, optional
+        The number of blocks per night.
+
+    Returns
+    -------
+    night_plan : str
+        The content of the night plan.
+    """
+    lines = [
+        f"run 1, {PROG_ID} = 0109.C-0413(C), ATs large array, MATISSE, LR, visitor mode",
+        "",
+    ]
+    for index in range(blocks):
+        if index % blocks_per_night == 0:
+            night = index // blocks_per_night + 1
+            lines += [f"night {night}, June {(night - 1) % 30 + 1}:", ""]
+
+        science = SCIENCE_TARGETS[index % len(SCIENCE_TARGETS)]
+        tag, calibrator = CALIBRATORS[index % len(CALIBRATORS)]
+        after_tag, after_calibrator = CALIBRATORS[(index + 1) % len(CALIBRATORS)]
+        cal_line = (
+            f"11:40 cal_{tag}_{calibrator:<12} 15 36 43.222  -66 19 01.33"
+            "    65.7     10.6          4.11     K1.5III    2.47    1.70     30"
+        )
+        after_line = cal_line.replace(
+            f"cal_{tag}_{calibrator}", f"cal_{after_tag}_{after_calibrator}"
+        )
+        sci_line = (
+            f"12:10 {science:<17} 12 00 05.081  -78 11 34.56"
+            "     8.6     13.4   4.59                               1.69     30  MR"
+        )
+        order = index % 3
+        if order == 0:
+            lines += [cal_line, sci_line]
+        elif order == 1:
+            lines += [sci_line, after_line]
+        else:
+            lines += [cal_line, sci_line, after_line]
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def write_votable(table, file: Path) -> None:
+    """Writes a table as a VOTable."""
+    from astropy.io.votable import from_table
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+    from_table(table).to_xml(str(file))
+
+
+def generate_catalogs(directory: Path = FIXTURE_DIR, seed: int = 42) -> None:
+    """Generates catalog responses (VOTables with the catalogs' columns)
+    as a stand-in for recorded ones."""
+    from astropy.table import Table
+
+    from p2obt.config.options import OPTIONS
+
+    rng = random.Random(seed)
+    for name in get_targets():
+        slug = get_slug(name)
+        ra, dec = rng.uniform(150, 290), rng.uniform(-80, -20)
+        magnitude = rng.uniform(3, 8)
+        for catalog, extra_columns in VIZIER_COLUMNS.items():
+            rows = rng.randint(1, 3)
+            columns = {}
+            for column in [*extra_columns, *getattr(OPTIONS.catalogs, catalog).query]:
+                if column in ("RA_ICRS", "RAJ2000"):
+                    values = [ra + rng.uniform(-1e-3, 1e-3) for _ in range(rows)]
+                elif column in ("DE_ICRS", "DEJ2000"):
+                    values = [dec + rng.uniform(-1e-3, 1e-3) for _ in range(rows)]
+                elif column in ("Source", "TYC1", "NOMAD1", "_2MASS", "WISE", "Name"):
+                    values = [f"{slug}-{row}" for row in range(rows)]
+                elif "flux" in column:
+                    values = [rng.uniform(1, 80) for _ in range(rows)]
+                else:
+                    values = [magnitude + rng.uniform(-1, 1) for _ in range(rows)]
+                columns[column] = values
+            write_votable(Table(columns), directory / catalog / f"{slug}.xml")
+
+        simbad = {
+            "main_id": [name],
+            "ra": [ra],
+            "dec": [dec],
+            "sp_type": [rng.choice(["A0V", "B9V", "K1.5III", "G6Ib", "K5III"])],
+            "pmra": [rng.uniform(-30, 30)],
+            "pmdec": [rng.uniform(-30, 30)],
+            "V": [magnitude + 1],
+            "H": [magnitude - 0.5],
+            "K": [magnitude - 0.7],
+        }
+        write_votable(Table(simbad), directory / "simbad" / f"{slug}.xml")
+
+        extinction = rng.uniform(0.01, 0.5)
+        irsa = {
+            "Filter_name": IRSA_BANDS,
+            "LamEff": [0.36, 0.44, 0.55, 1.24, 1.66, 2.19, 3.52],
+            "A_over_E_B_V_SandF": [4.1, 3.6, 2.7, 0.7, 0.45, 0.3, 0.17],
+            "A_SandF": [
+                value * extinction for value in [4.1, 3.6, 2.7, 0.7, 0.45, 0.3, 0.17]
+            ],
+        }
+        write_votable(Table(irsa), directory / "irsa" / f"{slug}.xml")
+
+
+def record_catalogs(directory: Path = FIXTURE_DIR) -> None:
+    """Records the catalog responses for the targets (requires network access)."""
+    from astroquery.ipac.irsa.irsa_dust import IrsaDust
+
+    from p2obt.backend.query import get_catalog
+    from p2obt.config.options import OPTIONS
+
+    catalogs = [catalog for catalog in OPTIONS.catalogs.available if catalog != "local"]
+    for name in get_targets():
+        slug = get_slug(name)
+        for catalog in catalogs:
+            table = get_catalog(name, catalog)
+            if table:
+                write_votable(table, directory / catalog / f"{slug}.xml")
+        table = IrsaDust.get_extinction_table(name)
+        write_votable(table, directory / "irsa" / f"{slug}.xml")
+        print(f"Recorded '{name}'.")
+
+
+@contextmanager
+def replay_catalogs(directory: Path = FIXTURE_DIR) -> Iterator[Dict[str, int]]:
+    """Replays the recorded catalog responses instead of querying SIMBAD,
+    VizieR and IRSA.
+
+    The responses are parsed from the VOTables on every query (as they
+    would be from the services' responses). Targets without a response
+    are not found.
+
+    Yields
+    ------
+    stats : dict
+        The number of replayed responses per catalog.
+    """
+    from astropy.table import Table
+    from astroquery.ipac.irsa.irsa_dust import IrsaDustClass
+    from astroquery.simbad import SimbadClass
+    from astroquery.utils import TableList
+    from astroquery.vizier import VizierClass
+
+    from p2obt.config.options import OPTIONS
+
+    catalogs = {
+        getattr(OPTIONS.catalogs, catalog).catalog: catalog
+        for catalog in VIZIER_COLUMNS
+    }
+    stats = {}
+
+    def read(catalog: str, name: str) -> Table | None:
+        file = directory / catalog / f"{get_slug(name)}.xml"
+        stats[catalog] = stats.get(catalog, 0) + 1
+        return Table.read(file, format="votable") if file.exists() else None
+
+    def query_vizier(self, name, *args, **kwargs):
+        catalog = catalogs[self.catalog]
+        table = read(catalog, name)
+        return TableList({} if table is None else {self.catalog: table})
+
+    def query_simbad(self, name, *args, **kwargs):
+        table = read("simbad", name)
+        return Table(names=SIMBAD_COLUMNS) if table is None else table
+
+    def query_irsa(self, name, *args, **kwargs):
+        return read("irsa", name)
+
+    with (
+        patch.object(VizierClass, "query_object", query_vizier),
+        patch.object(SimbadClass, "add_votable_fields", lambda self, *fields: None),
+        patch.object(SimbadClass, "query_object", query_simbad),
+        patch.object(IrsaDustClass, "get_extinction_table", query_irsa),
+    ):
+        yield stats
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--record", action="store_true", help="Record the responses")
+    group.add_argument("--generate", action="store_true", help="Generate stand-ins")
+    args = parser.parse_args(args)
+    if args.record:
+        record_catalogs()
+    else:
+        generate_catalogs()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
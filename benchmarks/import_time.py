@@ -0,0 +1,109 @@
+"""Benchmarks the import time of p2obt (each in a fresh interpreter) and
+checks that the heavy dependencies are not imported with it.
+
+Exits with a non-zero status if an import exceeds its budget (in seconds)
+or imports a dependency it should not::
+
+    python benchmarks/import_time.py --repeat 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+HEAVY_MODULES = [
+    "astropy",
+    "astroquery",
+    "keyring",
+    "numpy",
+    "p2api",
+    "pandas",
+    "requests",
+]
+
+# NOTE: The statements with their time budget (in seconds) and the heavy
+# modules they are allowed to import
+IMPORTS = {
+    "import p2obt": (0.1, []),
+    "from p2obt import OPTIONS": (0.1, []),
+    "from p2obt import create_obs": (0.5, ["p2api", "requests"]),
+    "from p2obt import query": (0.1, []),
+    "from p2obt.cli import main": (0.1, []),
+}
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+duration = time.perf_counter() - start
+modules = sorted(name for name in {heavy} if name in sys.modules)
+print(json.dumps({{"duration": duration, "modules": modules}}))
+"""
+
+
+def time_import(statement: str, repeat: int) -> Dict:
+    """Times an import statement in fresh interpreters.
+
+    Parameters
+    ----------
+    statement : str
+        The import statement.
+    repeat : int
+        The number of interpreters.
+
+    Returns
+    -------
+    result : dict
+        The median and minimum duration (in seconds) and the heavy modules
+        that were imported.
+    """
+    script = SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)
+    durations, modules = [], set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        durations.append(result["duration"])
+        modules.update(result["modules"])
+    return {
+        "median": statistics.median(durations),
+        "min": min(durations),
+        "modules": sorted(modules),
+    }
+
+
+def main(args: List[str] | None = None) -> int:
+    """Runs the benchmark and returns the exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print the results as json")
+    args = parser.parse_args(args)
+
+    results, failed = {}, False
+    for statement, (budget, allowed_modules) in IMPORTS.items():
+        result = time_import(statement, args.repeat)
+        unexpected = sorted(set(result["modules"]) - set(allowed_modules))
+        result["failed"] = result["median"] > budget or bool(unexpected)
+        failed |= result["failed"]
+        results[statement] = result
+
+        if not args.json:
+            status = "FAILED" if result["failed"] else "ok"
+            print(
+                f"{statement:<32} {result['median']:8.4f} s (budget {budget:.2f} s)"
+                f"  {status}"
+            )
+            if unexpected:
+                print(f"{'':<32} imports {', '.join(unexpected)}")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    return int(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Benchmarks p2obt offline, i.e., the parsing of synthetic night plans,
+the target queries (replaying the recorded catalog responses, see
+'benchmarks/fixtures.py'), the composition, writing and uploading (to a
+local stand-in of P2) of the OBs.
+
+The results can be saved as a baseline and compared to one, which exits
+with a non-zero status if a benchmark regressed::
+
+    python benchmarks/run.py --save
+    python benchmarks/run.py --compare benchmarks/baselines/4.1.3.json
+"""
+
+import argparse
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from fixtures import PROG_ID, get_targets, make_night_plan, replay_catalogs
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+# NOTE: The sizes (blocks) of the synthetic night plans
+PLAN_SIZES = [10, 100, 1000]
+
+# NOTE: The number of OBs that are composed, written and uploaded
+OB_COUNT = 100
+
+
+def query_targets(targets: List[str]) -> Dict[str, Dict]:
+    """Queries the targets (with the replayed catalog responses)."""
+    from p2obt.backend.query import query
+
+    return {name: query(name, query_exinction=True) for name in targets}
+
+
+def compose_obs(targets: Dict[str, Dict], count: int) -> List[Tuple[str, Dict]]:
+    """Composes a number of OBs, cycling through the (queried) targets."""
+    from p2obt.backend.compose import compose_ob
+
+    names, obs = list(targets), []
+    for index in range(count):
+        name = names[index % len(names)]
+        ob_kind = "sci" if index % 2 else "cal"
+        sci_name = None if ob_kind == "sci" else names[(index + 1) % len(names)]
+        ob = compose_ob(
+            name,
+            ob_kind,
+            "large",
+            "gr",
+            sci_name=sci_name,
+            tag="LN",
+            target=targets[name],
+        )
+        obs.append((f"{name.replace(' ', '_')}_{index}", ob))
+    return obs
+
+
+def get_benchmarks(stack: ExitStack) -> Dict[str, Tuple[Callable, int]]:
+    """Gets the benchmarks (a function and its number of items, e.g., OBs)
+    and sets up their fixtures (within the stack)."""
+    from p2obt.backend.compose import write_ob
+    from p2obt.backend.local_server import LocalP2Server
+    from p2obt.backend.parse import parse_night_plan_to_dict
+    from p2obt.backend.upload import (
+        create_remote_container,
+        get_remote_run,
+        upload_ob,
+    )
+    from p2obt.config.options import OPTIONS
+
+    OPTIONS.cache.query.active = False
+    OPTIONS.p2.rate, OPTIONS.p2.burst = 1e6, 10**6
+    directory = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+    stack.enter_context(replay_catalogs())
+
+    benchmarks = {}
+    for size in PLAN_SIZES:
+        night_plan = directory / f"night_plan_{size}.txt"
+        night_plan.write_text(make_night_plan(size), encoding="utf-8")
+        benchmarks[f"parse[{size}]"] = (
+            lambda night_plan=night_plan: parse_night_plan_to_dict(
+                night_plan, cache=False
+            ),
+            size,
+        )
+
+    targets = get_targets()
+    benchmarks["query"] = (lambda: query_targets(targets), len(targets))
+
+    queried = query_targets(targets)
+    benchmarks["compose_ob"] = (lambda: compose_obs(queried, OB_COUNT), OB_COUNT)
+
+    obs = compose_obs(queried, OB_COUNT)
+    output_dir = directory / "obs"
+    output_dir.mkdir()
+
+    def write_obs():
+        for ob_name, ob in obs:
+            write_ob(ob, ob_name, output_dir)
+
+    benchmarks["write_ob"] = (write_obs, OB_COUNT)
+
+    server = stack.enter_context(LocalP2Server(latency=0))
+    connection = server.connect()
+    run_id = get_remote_run(connection, PROG_ID)
+
+    def upload_obs():
+        container_id = create_remote_container(connection, "benchmark", run_id)
+        for _, ob in obs:
+            upload_ob(connection, ob, container_id)
+
+    benchmarks["upload_ob"] = (upload_obs, OB_COUNT)
+    return benchmarks
+
+
+def time_benchmark(function: Callable, items: int, repeat: int) -> Dict:
+    """Times a benchmark (without its output).
+
+    Parameters
+    ----------
+    function : callable
+        The benchmark.
+    items : int
+        The number of items (e.g., blocks or OBs) of the benchmark.
+    repeat : int
+        The number of runs.
+
+    Returns
+    -------
+    result : dict
+        The median and minimum duration (in seconds) as well as the
+        median duration per item.
+    """
+    durations = []
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+
+    median = statistics.median(durations)
+    return {
+        "median": median,
+        "min": min(durations),
+        "items": items,
+        "per_item": median / items,
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Compares the results to a baseline and prints the ratios of the
+    median durations.
+
+    Returns
+    -------
+    regressions : list of str
+        The benchmarks that are slower than the baseline by more than
+        the threshold (a ratio).
+    """
+    print(f"\nCompared to {baseline['meta']['version']} ({baseline['meta']['date']}):")
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["median"] / baseline["results"][name]["median"]
+        status = "REGRESSED" if ratio > threshold else "ok"
+        if ratio > threshold:
+            regressions.append(name)
+        print(f"{name:<16} {ratio:6.2f}x  {status}")
+    return regressions
+
+
+def main(args: List[str] | None = None) -> int:
+    """Runs the benchmarks and returns the exit status."""
+    import p2obt
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", default="", help="Only run the matching benchmarks")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--save",
+        nargs="?",
+        const=BASELINE_DIR / f"{p2obt.__version__}.json",
+        type=Path,
+        help="Save the results as a baseline (by default for the version)",
+    )
+    parser.add_argument("--compare", type=Path, help="Compare to a baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="The ratio to the baseline above which a benchmark regressed",
+    )
+    args = parser.parse_args(args)
+
+    results = {}
+    with ExitStack() as stack:
+        benchmarks = get_benchmarks(stack)
+        for name, (function, items) in benchmarks.items():
+            if args.k not in name:
+                continue
+            result = results[name] = time_benchmark(function, items, args.repeat)
+            print(
+                f"{name:<16} {result['median']:9.4f} s (min {result['min']:.4f} s)"
+                f"  {result['per_item'] * 1e3:9.3f} ms/item"
+            )
+
+    if args.save is not None:
+        meta = {
+            "version": p2obt.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "repeat": args.repeat,
+        }
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(
+            json.dumps({"meta": meta, "results": results}, indent=2) + "\n"
+        )
+        print(f"\nSaved the baseline to '{args.save}'.")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        return int(bool(compare(results, baseline, args.threshold)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,37 @@
-from .automate import create_ob, create_obs
-
-# TODO: Fix this import so all the subpackages can be directly imported
-from .backend import *
-from .config.options import OPTIONS
+from importlib import import_module
+from importlib.util import find_spec
+from typing import Any, List
 
+from .config.options import OPTIONS, options_scope
 
 __version__ = "4.1.3"
+
+# NOTE: The functions (and their dependencies, e.g., p2api) and the backend's
+# modules are only imported on their first access
+LAZY_IMPORTS = {
+    "create_ob": ".automate",
+    "create_obs": ".automate",
+    "create_obs_batch": ".automate",
+    "replay_obs": ".automate",
+    "query": ".backend.query",
+}
+
+__all__ = ["OPTIONS", "options_scope", *LAZY_IMPORTS]
+
+
+def __getattr__(name: str) -> Any:
+    """Imports the functions and the backend's modules (e.g., "p2obt.parse")
+    on their first access."""
+    if name in LAZY_IMPORTS:
+        value = getattr(import_module(LAZY_IMPORTS[name], __name__), name)
+    elif not name.startswith("_") and find_spec(f"{__name__}.backend.{name}"):
+        value = import_module(f".backend.{name}", __name__)
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *LAZY_IMPORTS})
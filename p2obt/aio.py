@@ -0,0 +1,670 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Tuple,
+)
+
+import p2api
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from .backend.client import (
+    THROTTLING_STATUS,
+    UNAUTHORIZED_STATUS,
+    AdaptiveLimiter,
+    get_backoff,
+    get_budget,
+    get_limiters,
+    is_transient,
+)
+from .backend.compose import compose_ob as compose_ob_sync
+from .backend.compose import set_ob_name, write_ob
+from .backend.logger import setup_logging
+from .backend.query import get_best_match
+from .backend.query import get_catalog as get_catalog_sync
+from .backend.query import query_dust_extinction, query_local_catalog
+from .backend.upload import (
+    TEMPLATE_MAPPING,
+    apply_mapping,
+    get_credentials,
+    set_ob_header,
+)
+from .backend.session import load_token, remove_token, save_token
+from .backend.trace import trace_call
+from .backend.utils import add_space, remove_parenthesis
+from .config.options import OPTIONS
+
+if TYPE_CHECKING:
+    import astropy.units as u
+    from astroquery.utils import TableList
+
+# NOTE: The interval (in seconds) in which a call waiting for the
+# concurrency limits (shared with the threads) checks them again
+LIMIT_POLL = 0.01
+
+
+def check_httpx() -> None:
+    """Checks if the optional dependency "httpx" is installed."""
+    if httpx is None:
+        raise ImportError(
+            "The asyncio api requires 'httpx'. Install it with 'pip install p2obt[aio]'."
+        )
+
+
+def parse_votable(content: bytes) -> "TableList":
+    """Parses the (VOTable) response of a VizieR query into its tables.
+
+    Tables of the same name (e.g., split by VizieR) are stacked. If the
+    response is not a VOTable (e.g., an error page) no tables are returned.
+    """
+    from astropy.io import votable
+    from astropy.table import vstack
+    from astroquery.utils import TableList
+
+    if not content.lstrip().startswith(b"<?xml"):
+        return TableList({})
+
+    tables = {}
+    vo_tree = votable.parse(BytesIO(content), verify="ignore", invalid="mask")
+    for table in vo_tree.iter_tables():
+        if len(table.array) == 0:
+            continue
+        name = table.name
+        if table.ref is not None:
+            name = vo_tree.get_table_by_id(table.ref).name
+        tables.setdefault(name, []).append(table.to_table(use_names_over_ids=True))
+    return TableList(
+        {
+            name: vstack(parts) if len(parts) > 1 else parts[0]
+            for name, parts in tables.items()
+        }
+    )
+
+
+@asynccontextmanager
+async def get_client(
+    client: "httpx.AsyncClient | None" = None,
+) -> AsyncIterator["httpx.AsyncClient"]:
+    """Yields the given http client or a new one that is closed afterwards."""
+    check_httpx()
+    if client is not None:
+        yield client
+        return
+
+    from astroquery.vizier import Vizier
+
+    async with httpx.AsyncClient(timeout=Vizier.TIMEOUT) as client:
+        yield client
+
+
+async def get_catalog(
+    client: "httpx.AsyncClient",
+    name: str,
+    catalog: str,
+    match_radius: "u.arcsec" = 5.0,
+):
+    """Queries the specified catalog (asynchronously).
+
+    The VizieR catalogs are queried over async http. SIMBAD (whose query
+    needs the service's field metadata) is queried in a worker thread.
+
+    Parameters
+    ----------
+    client : httpx.AsyncClient
+        The http client.
+    name : str
+        The target's name.
+    catalog : str
+        The catalog's name.
+    match_radius : astropy.units.arcsec
+        The radius in which is queried.
+        Default is 5.
+
+    Returns
+    -------
+    catalog_table : Table
+        The table containing the queried catalog's results.
+    """
+    if catalog == "simbad":
+        return await asyncio.to_thread(get_catalog_sync, name, catalog, match_radius)
+
+    import astropy.units as u
+    from astroquery.vizier import Vizier
+
+    if not isinstance(match_radius, u.Quantity):
+        match_radius *= u.arcsec
+
+    data = getattr(OPTIONS.catalogs, catalog)
+    query_site = Vizier(catalog=data.catalog, columns=data.fields)
+    payload = query_site.query_object(name, radius=match_radius, get_query_payload=True)
+    # NOTE: Only astroquery's public api is used (the payload and the server)
+    url = f"https://{query_site.VIZIER_SERVER}/viz-bin/votable"
+    response = await client.post(url, content=payload)
+    response.raise_for_status()
+    catalog_table = parse_votable(response.content)
+
+    # NOTE: Only get table from TableList if not empty
+    if catalog_table:
+        catalog_table = catalog_table[0]
+    return catalog_table
+
+
+async def query(
+    target_name: str,
+    catalogs: List | None = None,
+    exclude_catalogs: List | None = None,
+    match_radius: float | None = 5.0,
+    query_exinction: bool | None = False,
+    client: "httpx.AsyncClient | None" = None,
+) -> Dict:
+    """Queries information for an astronomical target by its name from
+    various catalogs (asynchronously, see
+    :func:`query <p2obt.backend.query.query>`).
+
+    All catalogs are queried concurrently.
+
+    Parameters
+    ----------
+    target_name : str
+        The target's name.
+    catalogs : list of str, optional
+        The catalogs to query. By default the catalogs "gaia",
+        "tycho", "nomad", "2mass", "wise", "mdfc" and "simbad"
+        as well as local catalogs (with "local") are included.
+    exclude_catalogs : list of str
+        A list of catalog to be excluded. Can be any of the catalogs
+        listed as default for the catalogs parameter.
+    match_radius : float, optional
+        The radius in which the target queried. Default is 5.
+    client : httpx.AsyncClient, optional
+        The http client. If not given, one is created for the query.
+
+    Returns
+    -------
+    target : dict
+        The target's queried information.
+    """
+    setup_logging()
+    target_name = add_space(target_name)
+    target = {"name": target_name}
+    if catalogs is None:
+        catalogs = OPTIONS.catalogs.available
+    catalogs = [
+        catalog for catalog in catalogs if catalog not in (exclude_catalogs or [])
+    ]
+
+    local_query = None
+    if "local" in catalogs:
+        catalogs.remove("local")
+        local_query = asyncio.create_task(
+            asyncio.to_thread(query_local_catalog, target_name)
+        )
+
+    async with get_client(client) as client:
+        catalog_tables = await asyncio.gather(
+            *[
+                get_catalog(client, target_name, catalog, match_radius)
+                for catalog in catalogs
+            ]
+        )
+    local_target = await local_query if local_query is not None else {}
+
+    # NOTE: The best matches depend on the previous catalogs' results
+    for catalog, catalog_table in zip(catalogs, catalog_tables):
+        best_matches = get_best_match(target, catalog, catalog_table)
+        target = {**target, **best_matches}
+
+    target["name"] = remove_parenthesis(target["name"])
+    dust_target = {}
+    if query_exinction:
+        dust_target = await asyncio.to_thread(query_dust_extinction, target["name"])
+    return {**target, **local_target, **dust_target}
+
+
+async def compose_ob(
+    target_name: str,
+    ob_kind: str,
+    array: str,
+    mode: str | None = "st",
+    sci_name: str | None = None,
+    tag: str | None = None,
+    resolution: str | None = "low",
+    target: Dict | None = None,
+    client: "httpx.AsyncClient | None" = None,
+) -> Dict:
+    """Composes the dictionary (asynchronously, see
+    :func:`compose_ob <p2obt.backend.compose.compose_ob>`).
+
+    Parameters
+    ----------
+    target_name : str
+        The target's name.
+    ob_kind : str
+        The type of OB. If it is a science target ("sci") or a calibrator ("cal").
+    array : str
+        Determines the array configuration. Possible values are "UTs",
+        "small", "medium", "large", "extended".
+    mode : str, optional
+        The mode of operation for MATISSE. Can be either "st"/"standalone"
+        or "gr"/"gra4mat". Default is standalone.
+    sci_name : str, optional
+        The name of the science target. If the OB is a science OB, this
+        is None.
+    tag : str, optional
+        The calibrator tag (L, N or LN).
+    resolution : str, optional
+        The resolution of the OB. Can be either "low", "med" or "high".
+    target : dict, optional
+        The target's already queried information. If not given,
+        the target is queried.
+    client : httpx.AsyncClient, optional
+        The http client used for the query.
+
+    Returns
+    -------
+    target : dict
+        A dictionary containg all the target's information.
+    """
+    if target is None:
+        target = await query(target_name, client=client)
+    return compose_ob_sync(
+        target_name, ob_kind, array, mode, sci_name, tag, resolution, target=target
+    )
+
+
+@asynccontextmanager
+async def limit_call(concurrency_limiter: AdaptiveLimiter) -> AsyncIterator[None]:
+    """Waits (without blocking the event loop) until a call is allowed by the
+    concurrency limiter and the budget shared with the threads and processes
+    (see :func:`get_budget <p2obt.backend.client.get_budget>`)."""
+    budget = get_budget()
+    acquire_budget = getattr(budget, "acquire", None)
+    while True:
+        if concurrency_limiter.try_enter():
+            if acquire_budget is None or acquire_budget(False):
+                break
+            concurrency_limiter.__exit__()
+        await asyncio.sleep(LIMIT_POLL)
+
+    try:
+        yield
+    finally:
+        if acquire_budget is not None:
+            budget.release()
+        concurrency_limiter.__exit__()
+
+
+async def get_access_token(
+    client: "httpx.AsyncClient", server: str, user_name: str, password: str
+) -> str:
+    """Logs in to the P2 API and returns the access token."""
+    login_url = p2api.p2api.LOGIN_URL[server]
+    response = await client.post(
+        login_url, data={"username": user_name, "password": password}
+    )
+    if response.status_code != 200:
+        raise p2api.P2Error(response.status_code, "POST", login_url, "cannot login")
+    return response.json()["access_token"]
+
+
+class AsyncP2Connection:
+    """An asyncio connection to the P2 API covering the calls used to
+    upload OBs (mirroring the `p2api.ApiConnection`'s methods).
+
+    The calls share the process-wide rate limit, the adaptive concurrency
+    limit and the concurrency budget with the :class:`P2Connection
+    <p2obt.backend.client.P2Connection>`. Transient errors are retried with
+    an exponential backoff and jitter (see 'OPTIONS.p2').
+
+    Parameters
+    ----------
+    server : str
+        Either "demo", "production" for paranal or "production_lasilla" for la
+        silla.
+    access_token : str
+        The access token of the P2 API.
+    client : httpx.AsyncClient, optional
+        The http client. If not given, one is created.
+    authenticate : callable, optional
+        A coroutine function that logs in again and returns a new access
+        token. If given, a call rejected as unauthorized (e.g., because a
+        reused session has expired) is retried once with the new token.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        access_token: str,
+        client: "httpx.AsyncClient | None" = None,
+        authenticate: Callable[[], Awaitable[str]] | None = None,
+    ) -> None:
+        check_httpx()
+        self.apiUrl = p2api.p2api.API_URL[server]
+        self.access_token, self.request_count = access_token, 0
+        self.client = client or httpx.AsyncClient(timeout=60)
+        self.authenticate = authenticate
+        self.token_lock = asyncio.Lock()
+
+    @classmethod
+    async def login(
+        cls,
+        server: str,
+        user_name: str,
+        password: str,
+        client: "httpx.AsyncClient | None" = None,
+    ) -> "AsyncP2Connection":
+        """Logs in to the P2 API and returns the connection."""
+        check_httpx()
+        client = client or httpx.AsyncClient(timeout=60)
+        access_token = await get_access_token(client, server, user_name, password)
+        return cls(server, access_token, client)
+
+    async def __aenter__(self) -> "AsyncP2Connection":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes the connection's http client."""
+        await self.client.aclose()
+
+    async def send(
+        self, method: str, url: str, data=None, etag=None
+    ) -> Tuple[Any, str]:
+        """Makes a single call to the P2 API."""
+        self.request_count += 1
+        headers = {
+            "Authorization": f"Bearer {self.access_token}",
+            "Accept": "application/json",
+        }
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        if etag is not None:
+            headers["If-Match"] = etag
+
+        url = self.apiUrl + url
+        response = await self.client.request(method, url, headers=headers, json=data)
+        content_type = response.headers.get("Content-Type", "").split(";")[0]
+        etag = response.headers.get("ETag")
+        if 200 <= response.status_code < 300:
+            if content_type == "application/json":
+                return response.json(), etag
+            return None, etag
+        if content_type == "application/json" and "error" in response.json():
+            raise p2api.P2Error(
+                response.status_code, method, url, response.json()["error"]
+            )
+        raise p2api.P2Error(response.status_code, method, url, "oops unknown error")
+
+    async def refresh_token(self, token: str) -> None:
+        """Replaces a rejected access token (unless another task already
+        has)."""
+        async with self.token_lock:
+            if self.access_token == token:
+                print("Session expired. Logging in again...")
+                self.access_token = await self.authenticate()
+
+    async def request(
+        self, method: str, url: str, data=None, etag=None
+    ) -> Tuple[Any, str]:
+        """Makes a rate limited call to the P2 API and retries it if it fails
+        transiently (or, once, with a new access token if it is unauthorized)."""
+        rate_limiter, concurrency_limiter = get_limiters()
+        attempt, refreshed = 0, False
+        while True:
+            while (wait := rate_limiter.try_acquire()) > 0:
+                await asyncio.sleep(wait)
+
+            async with limit_call(concurrency_limiter):
+                start, token = time.perf_counter(), self.access_token
+                try:
+                    response = await self.send(method, url, data, etag)
+                except (p2api.P2Error, httpx.TransportError) as error:
+                    failure, latency = error, time.perf_counter() - start
+                    status = (
+                        error.args[0]
+                        if isinstance(error, p2api.P2Error) and error.args
+                        else None
+                    )
+                    concurrency_limiter.update(latency, status in THROTTLING_STATUS)
+                    trace_call(method, url, start, status, error, attempt)
+                    if isinstance(error, httpx.TransportError):
+                        transient = isinstance(error, httpx.ConnectTimeout) or (
+                            method != "POST"
+                        )
+                    else:
+                        transient = is_transient(error, method)
+                    refresh = (
+                        status == UNAUTHORIZED_STATUS
+                        and self.authenticate is not None
+                        and not refreshed
+                    )
+                    if not refresh and (attempt >= OPTIONS.p2.retries or not transient):
+                        raise
+                else:
+                    concurrency_limiter.update(time.perf_counter() - start)
+                    trace_call(method, url, start, attempt=attempt)
+                    return response
+
+            # NOTE: The new login does not count as one of the retries
+            if refresh:
+                refreshed = True
+                await self.refresh_token(token)
+                continue
+
+            backoff = get_backoff(attempt)
+            logging.warning(
+                f"Retrying {method} {url} in {backoff:.2f} s"
+                f" (attempt {attempt + 1}/{OPTIONS.p2.retries}): {failure}"
+            )
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+    async def getRuns(self) -> Tuple[List[Dict], str]:
+        return await self.request("GET", "/obsRuns")
+
+    async def createItem(self, itemType: str, containerId: int, name: str):
+        return await self.request(
+            "POST",
+            f"/containers/{containerId}/items",
+            {"itemType": itemType, "name": name},
+        )
+
+    async def createOB(self, containerId: int, name: str):
+        return await self.createItem("OB", containerId, name)
+
+    async def createFolder(self, containerId: int, name: str):
+        return await self.createItem("Folder", containerId, name)
+
+    async def createGroup(self, containerId: int, name: str):
+        return await self.createItem("Group", containerId, name)
+
+    async def createConcatenation(self, containerId: int, name: str):
+        return await self.createItem("Concatenation", containerId, name)
+
+    async def createTimeLink(self, containerId: int, name: str):
+        return await self.createItem("TimeLink", containerId, name)
+
+    async def saveOB(self, ob: Dict, version: str):
+        return await self.request("PUT", f"/obsBlocks/{ob['obId']}", ob, version)
+
+    async def createTemplate(self, obId: int, name: str):
+        return await self.request(
+            "POST", f"/obsBlocks/{obId}/templates", {"templateName": name}
+        )
+
+    async def setTemplateParams(
+        self, obId: int, template: Dict, params: Dict, version: str
+    ):
+        for parameter in template["parameters"]:
+            parameter["value"] = params.get(parameter["name"], parameter["value"])
+        return await self.request(
+            "PUT",
+            f"/obsBlocks/{obId}/templates/{template['templateId']}",
+            template,
+            version,
+        )
+
+
+async def login(
+    user_name: str | None = None,
+    store_password: bool | None = False,
+    remove_password: bool | None = False,
+    server: str | None = "demo",
+) -> AsyncP2Connection:
+    """Login to the p2 API with the given username (asynchronously, see
+    :func:`login <p2obt.backend.upload.login>`).
+
+    Returns
+    -------
+    connection : AsyncP2Connection
+    """
+    check_httpx()
+    if user_name is None:
+        user_name = await asyncio.to_thread(input, "Input your ESO-username: ")
+
+    async def authenticate(remove_password: bool = False) -> str:
+        """Logs in with the password and returns (and caches) the token."""
+        _, password = await asyncio.to_thread(
+            get_credentials, user_name, store_password, remove_password, server
+        )
+        async with httpx.AsyncClient(timeout=60) as client:
+            access_token = await get_access_token(client, server, user_name, password)
+        if OPTIONS.p2.session.reuse:
+            save_token(server, user_name, access_token)
+        return access_token
+
+    access_token = None
+    if remove_password:
+        remove_token(server, user_name)
+    elif OPTIONS.p2.session.reuse:
+        access_token = load_token(server, user_name)
+
+    if access_token is None:
+        access_token = await authenticate(remove_password)
+    else:
+        print("Session reused from cache.")
+    return AsyncP2Connection(server, access_token, authenticate=authenticate)
+
+
+async def upload_ob(
+    connection: AsyncP2Connection, ob: Dict, container_id: int | None = None
+) -> int | None:
+    """Uploads an OB to p2 (asynchronously, see
+    :func:`upload_ob <p2obt.backend.upload.upload_ob>`).
+
+    Parameters
+    ----------
+    connection : AsyncP2Connection
+        The asyncio P2 API connection.
+    ob : dict
+    container_id : int
+        The id that specifies the container on p2.
+
+    Returns
+    -------
+    ob_id : int, optional
+        The uploaded OB's id. If the upload failed "None".
+    """
+    if connection is None or container_id is None:
+        return None
+
+    ob_name = ob["header"]["user"]["name"]
+    try:
+        print(f"\tCreating OB '{ob_name}'...")
+        remote_ob, version = await connection.createOB(container_id, ob_name)
+        set_ob_header(remote_ob, ob["header"])
+        remote_ob, version = await connection.saveOB(remote_ob, version)
+        ob_id = remote_ob["obId"]
+
+        for template_kind in ["acquisition", "observation"]:
+            template_name = "TEMPLATE.NAME"
+            if template_kind == "acquisition":
+                template_name = f"ACQUISITION.{template_name}"
+            content = ob[template_kind]
+            apply_mapping(content, TEMPLATE_MAPPING)
+            print(f"\t\tAdding template '{content[template_name]}'...")
+            template, version = await connection.createTemplate(
+                ob_id, content[template_name]
+            )
+            await connection.setTemplateParams(ob_id, template, content, version)
+    except p2api.P2Error:
+        print(f"[ERROR]: Failed uploading OB '{ob_name}'! See 'p2obt.log'.")
+        logging.error(f"[ERROR]: Failed uploading OB '{ob_name}'!", exc_info=True)
+        return None
+    return ob_id
+
+
+async def create_ob(
+    target: str,
+    ob_kind: str,
+    array: str,
+    mode: str = "st",
+    sci_name: str | None = None,
+    tag: str | None = None,
+    resolution: str = "low",
+    connection: AsyncP2Connection | None = None,
+    container_id: int | None = None,
+    output_dir: Path | None = None,
+    client: "httpx.AsyncClient | None" = None,
+) -> int | None:
+    """Creates a singular OB either locally or on P2 (asynchronously, see
+    :func:`create_ob <p2obt.automate.create_ob>`).
+
+    Parameters
+    ----------
+    target : str
+        The name of the target.
+    ob_kind : str
+        The type of OB. If it is a science target ("sci") or a calibrator ("cal").
+    array : str
+        Determines the array configuration. Possible values are "UTs",
+        "small", "medium", "large", "extended".
+    mode : str, optional
+        The mode of operation for MATISSE. Can be either "st"/"standalone"
+        or "gr"/"gra4mat". Default is standalone.
+    sci_name : str, optional
+        The name of the science target. If the OB is a science OB, this
+        is None.
+    tag : str, optional
+        The calibrator tag (L, N or LN).
+    resolution : str, optional
+        The resolution of the OB. Can be either "low", "med" or "high".
+    connection : AsyncP2Connection, optional
+        The asyncio P2 API connection.
+    container_id : int, optional
+        The id of the container on P2.
+    output_dir : path, optional
+        The output directory, where the (.obx)-file will be created in.
+        If left at "None" no file will be created.
+    client : httpx.AsyncClient, optional
+        The http client used for the query.
+
+    Returns
+    -------
+    ob_id : int, optional
+        The uploaded OB's id, if uploaded.
+    """
+    setup_logging()
+    ob = await compose_ob(
+        target, ob_kind, array, mode, sci_name, tag, resolution, client=client
+    )
+    if output_dir is not None:
+        ob_name = set_ob_name(target, ob_kind, sci_name, tag)
+        await asyncio.to_thread(write_ob, ob, ob_name, output_dir)
+    return await upload_ob(connection, ob, container_id)
@@ -1,22 +1,65 @@
 import logging
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from functools import partial
 from pathlib import Path
-from typing import Dict, List
+from types import SimpleNamespace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+)
 from warnings import warn
 
 from p2api.p2api import ApiConnection
 
+from .backend.client import reset_limiters, set_budget
 from .backend.compose import compose_ob, set_ob_name, write_ob
+from .backend.journal import Journal
+from .backend.logger import log_context, setup_logging
+from .backend.memory import MemoryBudget, release_obs
+from .backend.metrics import (
+    collect_metrics,
+    increment,
+    print_report,
+    save_report,
+    timed,
+    timed_iter,
+)
 from .backend.parse import (
+    get_night_plans,
+    iter_night_plan,
+    iter_night_plan_dict,
     parse_array_config,
+    parse_night_plan_table,
     parse_night_name,
-    parse_night_plan_to_dict,
     parse_observation_type,
     parse_operational_mode,
     parse_resolution,
     parse_run_prog_id,
 )
+from .backend.pipeline import Stage, run_pipeline, run_stages
+from .backend.profiling import profile_run
+from .backend.query import get_catalog_telemetry, query
+from .backend.replay import RecordingConnection, replay
+from .backend.sync import RemoteSync
+from .backend.trace import trace_calls
 from .backend.upload import create_remote_container, get_remote_run, login, upload_ob
 from .backend.utils import create_night_plan_dict
+from .config.options import OPTIONS
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from astropy.table import Table
 
 # FIXME: Raise more errors (especially for the quyering).
 # Should avoid problems.
@@ -33,6 +76,163 @@ OPERATIONAL_MODES = {
 }
 
 
+def get_pending_obs(block: Dict) -> List[Dict]:
+    """Gets the OBs of a block that have neither failed nor been skipped."""
+    return [ob for ob in block["obs"] if not ob.get("skip") and not ob.get("failed")]
+
+
+def get_log_context(block: Dict, ob: Dict) -> ContextManager:
+    """Gets the log context (run, night, container, target and OB name)
+    of an OB."""
+    return log_context(
+        run=block.get("run"),
+        night=block.get("night"),
+        container=block.get("container_id"),
+        target=ob["target"],
+        ob=set_ob_name(ob["target"], ob["ob_kind"], ob["sci_name"], ob["tag"]),
+    )
+
+
+def handle_failure(ob: Dict) -> None:
+    """Marks an OB as failed and reports it."""
+    ob["failed"] = True
+    print(f"Failed creating OB '{ob['target']}'! See 'p2obt.log'.")
+    logging.error(f"Failed creating OB '{ob['target']}'!", exc_info=True)
+
+
+def query_obs(block: Dict) -> Dict:
+    """Queries the targets of a block's OBs (pipeline stage)."""
+    for ob in get_pending_obs(block):
+        with get_log_context(block, ob):
+            try:
+                with timed("query"):
+                    ob["query"] = query(ob["target"])
+            except KeyError:
+                handle_failure(ob)
+    return block
+
+
+def compose_obs(block: Dict) -> Dict:
+    """Composes a block's OBs from the queried targets (pipeline stage)."""
+    for ob in get_pending_obs(block):
+        with get_log_context(block, ob):
+            try:
+                with timed("compose"):
+                    ob["ob"] = compose_ob(
+                        ob["target"],
+                        ob["ob_kind"],
+                        ob["array"],
+                        ob["mode"],
+                        ob["sci_name"],
+                        ob["tag"],
+                        ob["resolution"],
+                        target=ob.get("query"),
+                    )
+            except KeyError:
+                handle_failure(ob)
+    return block
+
+
+def write_obs(block: Dict) -> Dict:
+    """Writes a block's OBs to (.obx)-files (pipeline stage)."""
+    if block.get("output_dir") is None:
+        return block
+
+    for ob in get_pending_obs(block):
+        ob_name = set_ob_name(ob["target"], ob["ob_kind"], ob["sci_name"], ob["tag"])
+        with timed("write"):
+            write_ob(ob["ob"], ob_name, block["output_dir"])
+    return block
+
+
+def upload_obs(
+    block: Dict,
+    connection: ApiConnection | None = None,
+    remote_sync: RemoteSync | None = None,
+    journal: Journal | None = None,
+) -> Dict:
+    """Uploads a block's OBs in order to their container (pipeline stage)."""
+    if block.get("container_id") is None:
+        return block
+
+    for ob in get_pending_obs(block):
+        with get_log_context(block, ob), timed("upload"):
+            if remote_sync is not None:
+                ob["id"] = remote_sync.upload_ob(ob["ob"], block["container_id"])
+            else:
+                ob["id"] = upload_ob(
+                    connection,
+                    ob["ob"],
+                    block["container_id"],
+                    journal,
+                    ob.get("journal_key"),
+                )
+    return block
+
+
+def get_stages(
+    connection: ApiConnection | None = None,
+    remote_sync: RemoteSync | None = None,
+    journal: Journal | None = None,
+    budget: MemoryBudget | None = None,
+) -> List[Stage]:
+    """Gets the stages of the OB creation (query, compose, write and upload)
+    with their number of workers (see 'OPTIONS.pipeline').
+
+    If a memory budget is given, the created OBs are released in a final
+    stage once it has been crossed (see :class:`MemoryBudget
+    <p2obt.backend.memory.MemoryBudget>`).
+    """
+    workers = OPTIONS.pipeline.workers
+    upload = partial(
+        upload_obs, connection=connection, remote_sync=remote_sync, journal=journal
+    )
+    stages = [
+        Stage("query", query_obs, workers.query),
+        Stage("compose", compose_obs, workers.compose),
+        Stage("write", write_obs, workers.write),
+        Stage("upload", upload, workers.upload),
+    ]
+    if budget is not None:
+        stages.append(Stage("release", partial(release_obs, budget=budget)))
+    return stages
+
+
+def make_ob(
+    target: str,
+    ob_kind: str,
+    array: str,
+    mode: str,
+    sci_name: str | None,
+    tag: str | None,
+    resolution: str,
+    journal: Journal | None = None,
+    container_id: int | None = None,
+) -> Dict:
+    """Makes the specification of an OB that is passed through the stages.
+
+    If the OB has already been fully uploaded according to the journal,
+    it is skipped.
+    """
+    ob = {
+        "target": target,
+        "ob_kind": ob_kind,
+        "array": array,
+        "mode": mode,
+        "sci_name": sci_name,
+        "tag": tag,
+        "resolution": resolution,
+    }
+    if journal is not None and container_id is not None:
+        ob["journal_key"] = journal.key(
+            "ob", container_id, target, ob_kind, sci_name, tag
+        )
+        if (journal.get(ob["journal_key"]) or {}).get("done"):
+            print(f"\tOB for '{target}' already uploaded (journal)...")
+            ob["skip"] = True
+    return ob
+
+
 def create_ob(
     target: str,
     ob_kind: str,
@@ -48,6 +248,9 @@ def create_ob(
     user_name: str | None = None,
     server: str = "production",
     output_dir: Path | None = None,
+    remote_sync: RemoteSync | None = None,
+    journal: Journal | None = None,
+    profile: str | bool | None = None,
 ) -> None:
     """Creates a singular OB either locally or on P2.
 
@@ -82,39 +285,282 @@ def create_ob(
     output_dir : path, optional
         The output directory, where the (.obx)-files will be created in.
         If left at "None" no files will be created.
+    remote_sync : RemoteSync, optional
+        If given, the OB is synchronised with the contents of the container
+        on P2 (created, updated or skipped) instead of always being created.
+    journal : Journal, optional
+        If given, the upload's steps are committed to the journal and an OB
+        that has already been fully uploaded is skipped (without a query).
+    profile : str or bool, optional
+        If given, the OB's creation is profiled (see :func:`create_obs`).
     """
-    try:
-        if container_id is not None:
-            if connection is None:
-                connection = login(user_name, store_password, remove_password, server)
-        if sci_name is not None and ob_kind == "sci":
-            warn(
-                "[WARNING]: The OB was specified as a science OB,"
-                " but a science target name was separately specified."
-                " It will be changed to a calibrator."
-            )
-            ob_kind = "cal"
-        ob = compose_ob(
-            target,
-            ob_kind,
-            array,
-            mode,
-            sci_name,
-            tag,
-            resolution,
+    setup_logging()
+    if container_id is not None:
+        if connection is None:
+            connection = login(user_name, store_password, remove_password, server)
+    if sci_name is not None and ob_kind == "sci":
+        warn(
+            "[WARNING]: The OB was specified as a science OB,"
+            " but a science target name was separately specified."
+            " It will be changed to a calibrator."
+        )
+        ob_kind = "cal"
+
+    ob = make_ob(
+        target, ob_kind, array, mode, sci_name, tag, resolution, journal, container_id
+    )
+    block = {"obs": [ob], "container_id": container_id, "output_dir": output_dir}
+    with profile_run(profile, output_dir):
+        run_stages(block, get_stages(connection, remote_sync, journal))
+
+
+def until_deadline(
+    night_plan: Iterable[Tuple[str, str, Dict]], deadline: float
+) -> Iterator[Tuple[str, str, Dict]]:
+    """Yields the blocks of a night plan until the deadline (see
+    `time.perf_counter`) has passed. The blocks already started are
+    finished, the remaining ones are left for a later run."""
+    for block in night_plan:
+        if time.perf_counter() > deadline:
+            message = "Deadline reached! The remaining blocks are left for a later run."
+            print(f"[WARNING]: {message}")
+            logging.warning(message)
+            increment("deadline.reached")
+            return
+        yield block
+
+
+def iter_blocks(
+    night_plan: Iterable[Tuple[str, str, Dict]],
+    output_dir: Path | None = None,
+    container_id: int | None = None,
+    connection: ApiConnection | None = None,
+    remote_sync: RemoteSync | None = None,
+    journal: Journal | None = None,
+) -> Iterator[Dict]:
+    """Iterates over the blocks (a science target and its calibrators) of a
+    night plan and yields them with their OBs in order.
+
+    The local directories and the containers on P2 are created (in the
+    order of the night plan) before each block is yielded.
+
+    Parameters
+    ----------
+    night_plan : iterable of tuple
+        The blocks of the night plan with their run and night (see
+        :func:`iter_night_plan <p2obt.backend.parse.iter_night_plan>`).
+    output_dir: path, optional
+        The output directory, where the (.obx)-files will be created in.
+    container_id : int, optional
+        The id that specifies the container on p2.
+    connection : ApiConnection, optional
+        The connection to the P2 database.
+    remote_sync : RemoteSync, optional
+        If given, the existing containers on P2 are reused.
+    journal : Journal, optional
+        If given, the containers already created according to the journal
+        are reused.
+
+    Yields
+    ------
+    block : dict
+        The block with its OBs, the container's id and the output directory.
+    """
+    run_id = run_name = night_name = None
+
+    def get_container(name: str, parent_id: int, container_type: str) -> int:
+        """Gets (if synchronised or journaled) or creates the container on P2."""
+        if journal is not None:
+            journal_key = journal.key("container", parent_id, container_type, name)
+            step = journal.get(journal_key)
+            if step is not None:
+                print(f"Found container '{name}' in journal...")
+                return step["id"]
+
+        with log_context(run=run_name, night=night_name, container=parent_id):
+            if remote_sync is not None:
+                new_container_id = remote_sync.container(
+                    name, parent_id, container_type
+                )
+            else:
+                new_container_id = create_remote_container(
+                    connection, name, parent_id, container_type
+                )
+
+        if journal is not None:
+            journal.commit(journal_key, "container", id=new_container_id, name=name)
+        return new_container_id
+
+    current_run = current_night = None
+    for run_key, night_key, block in night_plan:
+        if run_key != current_run:
+            current_run, current_night = run_key, None
+            run_name = run_key.split(",")[0].strip()
+            array = parse_array_config(run_key)
+            mode = parse_operational_mode(run_key)
+            res = parse_resolution(run_key)
+            ob_type = parse_observation_type(run_key)
+
+            if connection is not None:
+                run_dir = None
+                if container_id is None:
+                    run_prog_id = parse_run_prog_id(run_key)
+                    run_id = get_remote_run(connection, run_prog_id)
+                else:
+                    run_id = container_id
+            else:
+                run_dir = output_dir / "".join(run_key.split(",")[0].strip().split())
+                run_dir.mkdir(parents=True, exist_ok=True)
+
+            print(f"{'':-^50}")
+            print(f"Creating OBs for {run_key}...")
+
+        block.update(
+            {
+                "array": array or block["array"],
+                "mode": mode or block["mode"],
+                "res": res or block["res"],
+                "type": ob_type or block["type"],
+            }
         )
-        upload_ob(connection, ob, container_id)
 
-        if output_dir is not None:
-            write_ob(ob, set_ob_name(target, ob_kind, sci_name, tag), output_dir)
+        if night_key != current_night:
+            current_night = night_key
+            print(f"{'':-^50}")
+            night_name = parse_night_name(night_key)
+            if night_name != "full_night":
+                print(f"Creating OBs for {night_name}")
+                print(f"{'':-^50}")
 
-    except KeyError:
-        print(f"Failed creating OB '{target}'! See 'p2obt.log'.")
-        logging.error(f"Failed creating OB '{target}'!", exc_info=True)
+            if ob_type == "vm" and run_id is not None:
+                night_id = get_container(night_name, run_id, "folder")
+            else:
+                night_id = run_id
+
+            if run_dir is not None:
+                night_dir = run_dir / night_name
+                print(f"Creating folder '{night_dir.name}...'")
+                night_dir.mkdir(parents=True, exist_ok=True)
+            else:
+                night_dir = None
+            ids = {}
+
+        target = block["target"].replace(" ", "_")
+        if night_dir is not None:
+            target_dir = night_dir / target
+            target_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            target_dir = None
+
+        # TODO: For the imaging also change the OB mode to imaging instead of snapshot
+        if night_id is not None:
+            if block["type"] in ["ts", "im"]:
+                container_type = "group" if block["type"] == "im" else "timelink"
+                if target not in ids:
+                    ids[target] = get_container(
+                        f"Image-{target}", night_id, container_type
+                    )
+
+            image_entry = ids.get(target, None)
+
+            # TODO: Make sure that the convention is correct (imaging runs)
+            # TODO: Make different names for OB and SCI target
+            # TODO: Do the same for the OB name if im run (or time series?)
+            if image_entry is not None:
+                container_name = f"{target}-{block['array']}"
+            else:
+                container_name = target
+            # TODO: Also add time link for time series here
+
+            # TODO: Does this need to be a folder here for visitor mode or not?
+            # TODO: Fix this so that OBs are always created in the right group
+            target_id = get_container(
+                container_name,
+                image_entry if image_entry is not None else night_id,
+                "concatenation",
+            )
+        else:
+            target_id = None
+
+        before_ind = [
+            i for i, cal in enumerate(block["cals"]) if cal.get("order") == "b"
+        ]
+        after_ind = [
+            i for i, cal in enumerate(block["cals"]) if cal.get("order") == "a"
+        ]
+
+        obs = []
+        for ind in [*before_ind, "target", *after_ind]:
+            if ind != "target":
+                cal, sci_name = block["cals"][ind], block["target"]
+                target, tag, ob_kind = cal["name"], cal["tag"], "cal"
+            else:
+                target, sci_name, ob_kind, tag = (
+                    block["target"],
+                    None,
+                    "sci",
+                    None,
+                )
+
+            obs.append(
+                make_ob(
+                    target,
+                    ob_kind,
+                    block["array"],
+                    block["mode"],
+                    sci_name,
+                    tag,
+                    block["res"],
+                    journal,
+                    target_id,
+                )
+            )
+
+        yield {
+            "obs": obs,
+            "container_id": target_id,
+            "output_dir": target_dir,
+            "run": run_name,
+            "night": night_name,
+        }
+
+
+def get_summary(
+    blocks: List[Dict], connection: ApiConnection | None, duration: float
+) -> Dict[str, int | float]:
+    """Summarises the processed blocks of a night plan.
+
+    Parameters
+    ----------
+    blocks : list of dict
+        The processed blocks.
+    connection : ApiConnection, optional
+        The connection to the P2 database.
+    duration : float
+        The time taken (in seconds).
+
+    Returns
+    -------
+    summary : dict
+        The number of blocks and OBs, the OBs created (uploaded or
+        written), skipped and failed, the calls to P2 and the time taken.
+    """
+    obs = [ob for block in blocks for ob in block["obs"]]
+    failed = [ob for ob in obs if ob.get("failed") or ("id" in ob and ob["id"] is None)]
+    skipped = [ob for ob in obs if ob.get("skip")]
+    return {
+        "blocks": len(blocks),
+        "obs": len(obs),
+        "created": len(obs) - len(failed) - len(skipped),
+        "skipped": len(skipped),
+        "failed": len(failed),
+        "calls": getattr(connection, "request_count", 0),
+        "duration": round(duration, 3),
+    }
 
 
 def create_obs(
-    night_plan: Path | None = None,
+    night_plan: "Path | pd.DataFrame | Table | None" = None,
     container_id: int | None = None,
     targets: List[str] | None = None,
     calibrators: List[List[str] | str] | None = None,
@@ -128,15 +574,25 @@ def create_obs(
     remove_password: bool | None = False,
     server: str | None = "production",
     output_dir: Path | None = None,
-) -> None:
-    """Creates the OBs from a night-plan parsed dictionary or from
+    sync: bool = False,
+    journal: Path | None = None,
+    record: Path | None = None,
+    report: Path | None = None,
+    trace: Path | None = None,
+    profile: str | bool | None = None,
+    deadline: float | None = None,
+) -> Dict[str, Any]:
+    """Creates the OBs from a night plan, a night plan table or from
     a manual input of the four needed lists.
 
     Parameters
     ----------
-    night_plan : path, optional
-        A dictionary containing a parsed night plan. If given
-        it will automatically upload the obs to p2.
+    night_plan : path or pandas.DataFrame or astropy.table.Table, optional
+        The path to a night plan (created with `calibrator_find.pro`) or
+        a night plan table (or a (.csv)-file containing it) with a row for
+        each science target and its calibrators (see
+        :func:`parse_night_plan_table <p2obt.backend.parse.parse_night_plan_table>`).
+        If given it will automatically upload the obs to p2.
     container_id : int, optional
         The id that specifies the container on p2.
     targets : list, optional
@@ -169,160 +625,380 @@ def create_obs(
     output_dir: path, optional
         The output directory, where the (.obx)-files will be created in.
         If left at "None" no files will be created.
+    sync : bool, optional
+        If 'True' the existing contents of the containers on P2 are fetched
+        and diffed against the composed OBs, so that only new or changed
+        containers and OBs are created or updated. Re-running the same night
+        plan does then not create duplicates. Default is 'False'.
+    journal : path, optional
+        A (.jsonl)-file in which every completed upload step (containers,
+        OBs and their templates) is recorded. If the run fails, calling it
+        again with the same journal resumes from the last committed step.
+        Can not be combined with 'sync' (which needs no journal to resume).
+    record : path, optional
+        A (.jsonl)-file in which all operations on P2 are recorded (offline)
+        instead of being executed. The containers, OBs and templates are
+        referenced symbolically and the log can be pushed to P2 later
+        with :func:`replay_obs`.
+    report : path, optional
+        A (.json)-file to which the run's report (the summary with its
+        metrics) is saved.
+    trace : path, optional
+        A (.json)-file to which the calls to P2 are saved as a trace that
+        can be viewed on a timeline (see :meth:`Tracer.save
+        <p2obt.backend.trace.Tracer.save>`).
+    profile : str or bool, optional
+        If given, the run is profiled with either "cprofile" (or 'True') or
+        "sample" (a sampling profiler) and the results are saved to "profiles"
+        in the output directory (see :func:`profile_run
+        <p2obt.backend.profiling.profile_run>`). By default the environment
+        variable "P2OBT_PROFILE" is used (e.g., "P2OBT_PROFILE=sample").
+    deadline : float, optional
+        The time (in seconds) after which no further blocks are started.
+        The blocks already started are finished and the remaining ones
+        are left for a later run (e.g., resumed with the same 'journal'
+        or with 'sync').
+
+    Returns
+    -------
+    summary : dict
+        The number of blocks, OBs (created, skipped and failed), calls to
+        P2 and the time taken (see :func:`get_summary`) as well as the
+        metrics, i.e., the timings of the stages (parse, query per catalog,
+        compose, write and the uploads of the containers, OBs and templates),
+        see :class:`Metrics <p2obt.backend.metrics.Metrics>`, and the
+        telemetry of the catalogs (see :func:`get_catalog_telemetry
+        <p2obt.backend.query.get_catalog_telemetry>`) and the calls to P2
+        per endpoint, OB, container and run (see :meth:`Tracer.summary
+        <p2obt.backend.trace.Tracer.summary>`) and the peak memory (see
+        :class:`MemoryBudget <p2obt.backend.memory.MemoryBudget>`).
     """
+    setup_logging()
+    start = time.perf_counter()
     if night_plan is None and output_dir is None and container_id is None:
         raise IOError(
             "Either output directory, container id or night plan must be provided!"
         )
+    if sync and journal is not None:
+        raise IOError("Syncing can not be combined with a journal!")
 
+    # NOTE: Anything but a path is a table (pandas and astropy are not imported)
+    is_table = night_plan is not None and (
+        not isinstance(night_plan, (str, Path)) or Path(night_plan).suffix == ".csv"
+    )
     if output_dir is not None:
         output_dir = (
             Path(output_dir, "manualOBs")
-            if targets
+            if targets or is_table
             else Path(output_dir, "automaticOBs")
         )
         # TODO: Apply here a removal of the old files
 
-    if night_plan is None:
-        night_plan = create_night_plan_dict(
-            targets, calibrators, orders, tags, resolution, configuration, modes
+    with (
+        profile_run(profile, output_dir),
+        collect_metrics() as metrics,
+        trace_calls() as tracer,
+    ):
+        if night_plan is None:
+            with timed("parse"):
+                night_plan = create_night_plan_dict(
+                    targets, calibrators, orders, tags, resolution, configuration, modes
+                )
+            if night_plan is None:
+                raise IOError(
+                    "Targets, calbirators and their orders must either input manually"
+                    "or a path to a night plan provided!"
+                )
+            night_plan = iter_night_plan_dict(night_plan)
+        elif is_table:
+            with timed("parse"):
+                night_plan = parse_night_plan_table(night_plan)
+            night_plan = iter_night_plan_dict(night_plan)
+        else:
+            # NOTE: The night plan is parsed while the first blocks are processed
+            night_plan = timed_iter(iter_night_plan(night_plan), "parse")
+
+        if record is not None:
+            if sync or journal is not None:
+                raise IOError(
+                    "Recording can not be combined with syncing or a journal!"
+                )
+            night_plan, runs = list(night_plan), []
+            if container_id is None:
+                runs = list(
+                    {parse_run_prog_id(run_key): None for run_key, *_ in night_plan}
+                )
+            connection = RecordingConnection(runs)
+        elif output_dir is None:
+            connection = login(user_name, store_password, remove_password, server)
+        else:
+            connection = None
+
+        remote_sync = (
+            RemoteSync(connection) if sync and connection is not None else None
         )
-    else:
-        night_plan = parse_night_plan_to_dict(night_plan)
+        if journal is not None and connection is not None:
+            journal = Journal(journal)
+        else:
+            journal = None
+
+        if deadline is not None:
+            night_plan = until_deadline(night_plan, start + deadline)
+        blocks = iter_blocks(
+            night_plan, output_dir, container_id, connection, remote_sync, journal
+        )
+        budget = MemoryBudget()
+        try:
+            blocks = run_pipeline(
+                blocks,
+                get_stages(connection, remote_sync, journal, budget),
+                OPTIONS.pipeline.queue_size,
+            )
+        except BaseException:
+            # NOTE: The OBs synchronised before the error are skipped when run again
+            if remote_sync is not None:
+                remote_sync.save()
+            raise
+        finally:
+            if journal is not None:
+                journal.close()
+
+        if remote_sync is not None:
+            remote_sync.finish()
+        if record is not None:
+            connection.save(record)
+
+    # TODO: Add some color here :D
+    print("Done!")
+    summary = get_summary(blocks, connection, time.perf_counter() - start)
+    summary["metrics"] = metrics.summary()
+    summary["catalogs"] = get_catalog_telemetry(summary["metrics"])
+    summary["p2"] = tracer.summary()
+    summary["memory"] = budget.summary()
+    print_report(summary["metrics"])
+    print(f"Peak memory: {summary['memory']['peak_rss']} MiB")
+    if report is not None:
+        save_report(summary, report)
+    if trace is not None:
+        tracer.save(trace)
+    return summary
+
+
+def replay_obs(
+    record: Path,
+    user_name: str | None = None,
+    store_password: bool | None = True,
+    remove_password: bool | None = False,
+    server: str | None = "production",
+    workers: int | None = None,
+) -> Dict[str, int]:
+    """Pushes the operations recorded by :func:`create_obs` to P2.
+
+    Parameters
+    ----------
+    record : path
+        The (.jsonl)-file with the recorded operations.
+    user_name : str, optional
+        The p2 user name.
+    server: str, optional
+        The server to connect to. Can be either "production" or "test".
+    workers : int, optional
+        The number of containers that are filled concurrently.
+        Default is 'OPTIONS.pipeline.workers.upload'.
+
+    Returns
+    -------
+    summary : dict
+        The number of replayed and failed operations.
+    """
+    setup_logging()
+    connection = login(user_name, store_password, remove_password, server)
+    return replay(record, connection, workers)
+
+
+def init_batch_worker(
+    options: SimpleNamespace, budget: Any, rate: float, burst: int
+) -> None:
+    """Initialises a worker process of :func:`create_obs_batch`."""
+    for key, value in vars(options).items():
+        setattr(OPTIONS, key, value)
+    OPTIONS.p2.rate, OPTIONS.p2.burst = rate, burst
+    reset_limiters()
+    set_budget(budget)
+    # NOTE: Each worker process logs to its own file
+    setup_logging(mode="a", per_process=True)
+
 
-    if night_plan is None:
+def create_obs_batch_plan(night_plan: Path, kwargs: Dict) -> Dict:
+    """Creates the OBs of a single night plan of a batch (in a worker process)."""
+    with log_context(plan=Path(night_plan).name):
+        try:
+            return create_obs(night_plan, **kwargs)
+        except Exception as error:
+            logging.error(f"Failed creating OBs for '{night_plan}'!", exc_info=True)
+            return {"error": f"{type(error).__name__}: {error}"}
+
+
+def get_batch_names(night_plans: List[Path]) -> Dict[Path, str]:
+    """Gets the unique names of the night plans of a batch, under which
+    their outputs (e.g., the journal or the report) are saved.
+
+    The name is the night plan's stem or, if another night plan has the
+    same stem, "<parent>_<stem>".
+
+    Raises
+    ------
+    IOError
+        If the night plans cannot be told apart by their names.
+    """
+    stems = Counter(night_plan.stem for night_plan in night_plans)
+    names = {
+        night_plan: (
+            night_plan.stem
+            if stems[night_plan.stem] == 1
+            else f"{night_plan.parent.name}_{night_plan.stem}"
+        )
+        for night_plan in night_plans
+    }
+    duplicates = [
+        name for name, number in Counter(names.values()).items() if number > 1
+    ]
+    if duplicates or len(names) < len(night_plans):
         raise IOError(
-            "Targets, calbirators and their orders must either input manually"
-            "or a path to a night plan provided!"
+            "Night plans of the same name in a batch: "
+            f"{', '.join(sorted(duplicates)) or 'duplicate paths'}!"
         )
+    return names
 
-    if output_dir is None:
-        connection = login(user_name, store_password, remove_password, server)
-    else:
-        connection, run_id = None, None
-
-    for run_key, nights in night_plan.items():
-        array = parse_array_config(run_key)
-        mode = parse_operational_mode(run_key)
-        res = parse_resolution(run_key)
-        ob_type = parse_observation_type(run_key)
-        for night in list(nights.values())[0]:
-            night.update(
-                {
-                    "array": array or night["array"],
-                    "mode": mode or night["mode"],
-                    "res": res or night["res"],
-                    "type": ob_type or night["type"],
-                }
-            )
 
-        if connection is not None:
-            run_dir = None
-            if container_id is None:
-                run_prog_id = parse_run_prog_id(run_key)
-                run_id = get_remote_run(connection, run_prog_id)
-            else:
-                run_id = container_id
+def print_batch_summary(summaries: Dict[str, Dict]) -> None:
+    """Prints the consolidated summary of a batch."""
+    columns = ["blocks", "obs", "created", "skipped", "failed", "calls", "duration"]
+    width = max([len("night plan"), *map(len, summaries)])
+    print(f"{'':-^{width + 10 * len(columns)}}")
+    print(f"{'night plan':<{width}}" + "".join(f"{key:>10}" for key in columns))
+    for name, summary in summaries.items():
+        if "error" in summary:
+            print(f"{name:<{width}}  [ERROR]: {summary['error']}")
         else:
-            run_dir = output_dir / "".join(run_key.split(",")[0].strip().split())
-            run_dir.mkdir(parents=True, exist_ok=True)
+            print(
+                f"{name:<{width}}" + "".join(f"{summary[key]:>10}" for key in columns)
+            )
+    print(f"{'':-^{width + 10 * len(columns)}}")
 
-        print(f"{'':-^50}")
-        print(f"Creating OBs for {run_key}...")
-        for night_key, night in nights.items():
-            print(f"{'':-^50}")
-            night_name = parse_night_name(night_key)
-            if night_name != "full_night":
-                print(f"Creating OBs for {night_name}")
-                print(f"{'':-^50}")
 
-            if ob_type == "vm" and run_id is not None:
-                night_id = create_remote_container(
-                    connection, night_name, run_id, "folder"
-                )
-            else:
-                night_id = run_id
+def create_obs_batch(
+    night_plans: Path | str | List[Path],
+    workers: int | None = None,
+    budget: int | None = None,
+    output_dir: Path | None = None,
+    journal_dir: Path | None = None,
+    record_dir: Path | None = None,
+    report_dir: Path | None = None,
+    trace_dir: Path | None = None,
+    user_name: str | None = None,
+    store_password: bool | None = True,
+    remove_password: bool | None = False,
+    server: str | None = "production",
+    **kwargs,
+) -> Dict[str, Dict]:
+    """Creates the OBs of many night plans in parallel (one process each).
 
-            if run_dir is not None:
-                night_dir = run_dir / night_name
-                print(f"Creating folder '{night_dir.name}...'")
-                night_dir.mkdir(parents=True, exist_ok=True)
-            else:
-                night_dir = None
+    The target queries are cached and shared by all processes
+    (see 'OPTIONS.cache.query') and all processes share the rate limit
+    and a budget of calls in flight to P2.
 
-            ids = {}
-            for block in night:
-                target = block["target"].replace(" ", "_")
-                if night_dir is not None:
-                    target_dir = night_dir / target
-                    target_dir.mkdir(parents=True, exist_ok=True)
-                else:
-                    target_dir = None
-
-                # TODO: For the imaging also change the OB mode to imaging instead of snapshot
-                if night_id is not None:
-                    if block["type"] in ["ts", "im"]:
-                        container_type = (
-                            "group" if block["type"] == "im" else "timelink"
-                        )
-                        if target not in ids:
-                            ids[target] = create_remote_container(
-                                connection, f"Image-{target}", night_id, container_type
-                            )
-
-                    image_entry = ids.get(target, None)
-
-                    # TODO: Make sure that the convention is correct (imaging runs)
-                    # TODO: Make different names for OB and SCI target
-                    # TODO: Do the same for the OB name if im run (or time series?)
-                    if image_entry is not None:
-                        container_name = f"{target}-{block['array']}"
-                    else:
-                        container_name = target
-                    # TODO: Also add time link for time series here
-
-                    # TODO: Does this need to be a folder here for visitor mode or not?
-                    # TODO: Fix this so that OBs are always created in the right group
-                    target_id = create_remote_container(
-                        connection,
-                        container_name,
-                        image_entry if image_entry is not None else night_id,
-                        "concatenation",
-                    )
-                else:
-                    target_id = None
-
-                before_ind = [
-                    i for i, cal in enumerate(block["cals"]) if cal.get("order") == "b"
-                ]
-                after_ind = [
-                    i for i, cal in enumerate(block["cals"]) if cal.get("order") == "a"
-                ]
-
-                for ind in [*before_ind, "target", *after_ind]:
-                    if ind != "target":
-                        cal, sci_name = block["cals"][ind], block["target"]
-                        target, tag, ob_kind = cal["name"], cal["tag"], "cal"
-                    else:
-                        target, sci_name, ob_kind, tag = (
-                            block["target"],
-                            None,
-                            "sci",
-                            None,
-                        )
-
-                    create_ob(
-                        target,
-                        ob_kind,
-                        block["array"],
-                        block["mode"],
-                        sci_name,
-                        tag,
-                        block["res"],
-                        connection,
-                        target_id,
-                        output_dir=target_dir,
-                    )
+    Parameters
+    ----------
+    night_plans : path or str or list of path
+        A directory containing the night plans (.txt)-files, a glob
+        pattern (e.g., "plans/*.txt") or a list of night plans.
+    workers : int, optional
+        The number of processes. Default is the number of CPUs
+        (at most one per night plan).
+    budget : int, optional
+        The number of calls to P2 in flight (across all processes).
+        Default is 'OPTIONS.p2.concurrency.max'.
+    output_dir : path, optional
+        The output directory. The (.obx)-files of each night plan are
+        created in a subdirectory named after it (see :func:`get_batch_names`,
+        as are the files in the following directories). If left at "None"
+        the OBs are uploaded.
+    journal_dir : path, optional
+        The directory of the night plans' upload journals (see the
+        'journal' parameter of :func:`create_obs`).
+    record_dir : path, optional
+        The directory of the night plans' recorded operations (see the
+        'record' parameter of :func:`create_obs`).
+    report_dir : path, optional
+        The directory of the night plans' reports (see the 'report'
+        parameter of :func:`create_obs`).
+    trace_dir : path, optional
+        The directory of the night plans' traces of the calls to P2 (see
+        the 'trace' parameter of :func:`create_obs`).
+    user_name : str, optional
+        The p2 user name.
+    server: str, optional
+        The server to connect to. Can be either "production" or "test".
+    **kwargs
+        Further arguments passed to :func:`create_obs`
+        (e.g., 'container_id' or 'sync').
 
-    # TODO: Add some color here :D
-    print("Done!")
+    Returns
+    -------
+    summaries : dict
+        The summary of each night plan by its path (see :func:`create_obs`).
+    """
+    setup_logging()
+    night_plans = get_night_plans(night_plans)
+    if not night_plans:
+        raise IOError("No night plans found!")
+    names = get_batch_names(night_plans)
+
+    # NOTE: Log in once, so the workers reuse the cached session
+    # (see 'OPTIONS.p2.session') instead of prompting
+    if output_dir is None and record_dir is None:
+        if user_name is None:
+            user_name = input("Input your ESO-username: ")
+        login(user_name, store_password, remove_password, server)
+
+    workers = min(workers or os.cpu_count() or 1, len(night_plans))
+    options = deepcopy(OPTIONS)
+    options.cache.query.active = True
+    context = multiprocessing.get_context()
+    initargs = (
+        options,
+        context.BoundedSemaphore(budget or OPTIONS.p2.concurrency.max),
+        OPTIONS.p2.rate / workers,
+        max(1, OPTIONS.p2.burst // workers),
+    )
+
+    futures = {}
+    with ProcessPoolExecutor(
+        workers, context, initializer=init_batch_worker, initargs=initargs
+    ) as executor:
+        for night_plan in night_plans:
+            plan_kwargs = {
+                **kwargs,
+                "user_name": user_name,
+                "store_password": store_password,
+                "server": server,
+            }
+            name = names[night_plan]
+            if output_dir is not None:
+                plan_kwargs["output_dir"] = Path(output_dir) / name
+            if journal_dir is not None:
+                plan_kwargs["journal"] = Path(journal_dir) / f"{name}.jsonl"
+            if record_dir is not None:
+                plan_kwargs["record"] = Path(record_dir) / f"{name}.jsonl"
+            if report_dir is not None:
+                plan_kwargs["report"] = Path(report_dir) / f"{name}.json"
+            if trace_dir is not None:
+                plan_kwargs["trace"] = Path(trace_dir) / f"{name}.json"
+            futures[str(night_plan)] = executor.submit(
+                create_obs_batch_plan, night_plan, plan_kwargs
+            )
+
+    summaries = {name: future.result() for name, future in futures.items()}
+    print_batch_summary(summaries)
+    return summaries
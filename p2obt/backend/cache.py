@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from ..config.options import OPTIONS
+
+# NOTE: The file suffixes of the serialisation formats
+SUFFIXES = {"pickle": "pkl", "json": "json"}
+
+
+def get_cache_dir(namespace: str) -> Path:
+    """Gets the directory of a cache (e.g., "queries") in 'OPTIONS.cache.path'."""
+    return OPTIONS.cache.path / namespace
+
+
+def get_cache_file(namespace: str, key: str, fmt: str = "pickle") -> Path:
+    """Gets the file of a cached value (in the cache "namespace")."""
+    return get_cache_dir(namespace) / f"{key}.{SUFFIXES[fmt]}"
+
+
+def get_cache_key(*parts) -> str:
+    """Makes a cache key from the (json-serialisable) parts."""
+    content = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def load_cached(
+    namespace: str, key: str, ttl: float | None = None, fmt: str = "pickle"
+) -> Any | None:
+    """Loads a value from the cache.
+
+    Parameters
+    ----------
+    namespace : str
+        The cache (e.g., "queries").
+    key : str
+        The value's key (see :func:`get_cache_key`).
+    ttl : float, optional
+        The time to live (in seconds) of the value. If older, it is
+        not loaded. By default the value never expires.
+    fmt : str, optional
+        The serialisation format, either "pickle" (default) or "json".
+
+    Returns
+    -------
+    value : any, optional
+        The cached value or "None" if not cached (or expired).
+    """
+    file = get_cache_file(namespace, key, fmt)
+    try:
+        if ttl is not None and time.time() - file.stat().st_mtime > ttl:
+            return None
+        if fmt == "json":
+            return json.loads(file.read_text(encoding="utf-8"))
+        with open(file, "rb") as cache_file:
+            return pickle.load(cache_file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, json.JSONDecodeError):
+        return None
+
+
+def save_cached(namespace: str, key: str, value: Any, fmt: str = "pickle") -> None:
+    """Saves a value to the cache.
+
+    The file is written atomically, so that the cache can be shared
+    by several processes (and threads).
+
+    Parameters
+    ----------
+    namespace : str
+        The cache (e.g., "queries").
+    key : str
+        The value's key (see :func:`get_cache_key`).
+    value : any
+        The (picklable or, for "json", json-serialisable) value.
+    fmt : str, optional
+        The serialisation format, either "pickle" (default) or "json".
+    """
+    file = get_cache_file(namespace, key, fmt)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    # NOTE: The temporary file is unique per call, so that threads (and
+    # processes) saving the same key do not write to the same file
+    descriptor, tmp_file = tempfile.mkstemp(
+        dir=file.parent, prefix=f"{key}.", suffix=".tmp"
+    )
+    try:
+        with open(descriptor, "wb") as cache_file:
+            if fmt == "json":
+                cache_file.write(json.dumps(value).encode("utf-8"))
+            else:
+                pickle.dump(value, cache_file)
+        os.replace(tmp_file, file)
+    except BaseException:
+        Path(tmp_file).unlink(missing_ok=True)
+        raise
+
+
+def clear_cache(namespace: str) -> None:
+    """Removes all values of a cache (e.g., "queries")."""
+    shutil.rmtree(get_cache_dir(namespace), ignore_errors=True)
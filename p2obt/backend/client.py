@@ -0,0 +1,261 @@
+import logging
+import random
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Tuple
+
+import p2api
+import requests
+
+from ..config.options import OPTIONS
+from .trace import trace_call
+
+TRANSIENT_STATUS = [408, 425, 429, 500, 502, 503, 504]
+THROTTLING_STATUS = [429, 503]
+UNAUTHORIZED_STATUS = 401
+
+
+class TokenBucket:
+    """A thread-safe token-bucket rate limiter.
+
+    Parameters
+    ----------
+    rate : float
+        The rate (tokens per second) at which the bucket refills.
+    burst : int
+        The bucket's capacity, i.e., the number of calls that can be
+        made at once.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate, self.burst = rate, burst
+        self.tokens, self.last = float(burst), time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Takes a token from the bucket if one is available.
+
+        Returns
+        -------
+        wait : float
+            Zero if a token was taken, otherwise the time (in seconds)
+            until the next token is available.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """Takes a token from the bucket and blocks until one is available."""
+        while (wait := self.try_acquire()) > 0:
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """A concurrency limiter that adapts to the server's responses.
+
+    The number of calls allowed in flight is increased additively for
+    every fast and successful call and halved (multiplicatively decreased)
+    if a call is slow or throttled by the server.
+
+    Parameters
+    ----------
+    initial : int
+        The initial number of calls in flight.
+    minimum : int
+        The minimum number of calls in flight.
+    maximum : int
+        The maximum number of calls in flight.
+    latency : float
+        The latency (in seconds) above which a call is considered slow.
+    """
+
+    def __init__(
+        self, initial: int, minimum: int, maximum: int, latency: float
+    ) -> None:
+        self.limit, self.minimum, self.maximum = float(initial), minimum, maximum
+        self.latency, self.active = latency, 0
+        self.condition = threading.Condition()
+
+    def __enter__(self) -> "AdaptiveLimiter":
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, *args) -> None:
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def try_enter(self) -> bool:
+        """Enters the limiter if another call is allowed in flight (without
+        waiting, e.g., for the calls of an event loop)."""
+        with self.condition:
+            if self.active >= int(self.limit):
+                return False
+            self.active += 1
+            return True
+
+    def update(self, latency: float, throttled: bool = False) -> None:
+        """Adapts the limit to a finished call's latency and status."""
+        with self.condition:
+            if throttled or latency > self.latency:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+_BUDGET = None
+
+
+def get_limiters() -> Tuple[TokenBucket, AdaptiveLimiter]:
+    """Gets the rate and concurrency limiters shared by all P2 connections
+    of the process (created from 'OPTIONS.p2' on first use)."""
+    with _LIMITERS_LOCK:
+        if not _LIMITERS:
+            concurrency = OPTIONS.p2.concurrency
+            _LIMITERS["rate"] = TokenBucket(OPTIONS.p2.rate, OPTIONS.p2.burst)
+            _LIMITERS["concurrency"] = AdaptiveLimiter(
+                concurrency.initial,
+                concurrency.min,
+                concurrency.max,
+                concurrency.latency,
+            )
+    return _LIMITERS["rate"], _LIMITERS["concurrency"]
+
+
+def reset_limiters() -> None:
+    """Resets the shared limiters, e.g., after 'OPTIONS.p2' was changed."""
+    with _LIMITERS_LOCK:
+        _LIMITERS.clear()
+
+
+def set_budget(budget: Any | None) -> None:
+    """Sets a concurrency budget shared with other processes (e.g., a
+    `multiprocessing.BoundedSemaphore`) that every call to P2 has to
+    acquire."""
+    global _BUDGET
+    _BUDGET = budget
+
+
+def get_budget() -> Any:
+    """Gets the concurrency budget shared with other processes (if set)."""
+    return _BUDGET if _BUDGET is not None else nullcontext()
+
+
+def is_transient(error: Exception, method: str) -> bool:
+    """Checks if a failed call can be safely retried.
+
+    Calls that create something on p2 (POST) are only retried if
+    the server did certainly not process them.
+    """
+    if isinstance(error, p2api.P2Error):
+        status = error.args[0] if error.args else None
+        if method == "POST":
+            return status in THROTTLING_STATUS
+        return status in TRANSIENT_STATUS
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    return method != "POST" and isinstance(
+        error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    )
+
+
+def get_backoff(attempt: int) -> float:
+    """Gets the exponential backoff (with full jitter) for a retry."""
+    return random.uniform(
+        0, min(OPTIONS.p2.max_backoff, OPTIONS.p2.backoff * 2**attempt)
+    )
+
+
+class P2Connection(p2api.ApiConnection):
+    """The P2 python api connection with a rate limit and a retry policy.
+
+    All calls made through any of these connections share a token-bucket
+    rate limit and an adaptive concurrency limit (see 'OPTIONS.p2').
+    Transient errors (e.g., throttling or an unavailable server) are retried
+    with an exponential backoff and jitter.
+
+    Parameters
+    ----------
+    *args, **kwargs
+        The arguments to the `p2api.ApiConnection`.
+    authenticate : callable, optional
+        A function that logs in again and returns a new access token.
+        If given, a call rejected as unauthorized (e.g., because a reused
+        session has expired) is retried once with the new token.
+    """
+
+    def __init__(
+        self, *args, authenticate: Callable[[], str] | None = None, **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.authenticate = authenticate
+        self.token_lock = threading.Lock()
+
+    def refresh_token(self, token: str) -> None:
+        """Replaces a rejected access token (unless another thread already
+        has)."""
+        with self.token_lock:
+            if self.access_token == token:
+                print("Session expired. Logging in again...")
+                self.access_token = self.authenticate()
+
+    def request(self, method: str, url: str, data=None, etag=None) -> Tuple[Any, str]:
+        """Makes a rate limited call to the P2 API and retries it if it fails
+        transiently (or, once, with a new access token if it is unauthorized)."""
+        rate_limiter, concurrency_limiter = get_limiters()
+        attempt, refreshed = 0, False
+        while True:
+            rate_limiter.acquire()
+            with concurrency_limiter, get_budget():
+                start, token = time.perf_counter(), self.access_token
+                try:
+                    response = super().request(method, url, data, etag)
+                except (p2api.P2Error, requests.exceptions.RequestException) as error:
+                    failure, latency = error, time.perf_counter() - start
+                    status = (
+                        error.args[0]
+                        if isinstance(error, p2api.P2Error) and error.args
+                        else None
+                    )
+                    concurrency_limiter.update(latency, status in THROTTLING_STATUS)
+                    trace_call(method, url, start, status, error, attempt)
+                    refresh = (
+                        status == UNAUTHORIZED_STATUS
+                        and self.authenticate is not None
+                        and not refreshed
+                    )
+                    if not refresh and (
+                        attempt >= OPTIONS.p2.retries or not is_transient(error, method)
+                    ):
+                        raise
+                else:
+                    concurrency_limiter.update(time.perf_counter() - start)
+                    trace_call(method, url, start, attempt=attempt)
+                    return response
+
+            # NOTE: The new login does not count as one of the retries
+            if refresh:
+                refreshed = True
+                self.refresh_token(token)
+                continue
+
+            backoff = get_backoff(attempt)
+            logging.warning(
+                f"Retrying {method} {url} in {backoff:.2f} s"
+                f" (attempt {attempt + 1}/{OPTIONS.p2.retries}): {failure}"
+            )
+            time.sleep(backoff)
+            attempt += 1
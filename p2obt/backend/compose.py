@@ -1,10 +1,7 @@
 from pathlib import Path
 from typing import Dict, Tuple, Union
 
-import astropy.units as u
-import numpy as np
 import toml
-from astropy.coordinates import SkyCoord
 
 from ..config.options import OPTIONS
 from .query import query
@@ -157,6 +154,9 @@ def format_ra_and_dec(target: Dict) -> Tuple[str, str]:
     if "local.RA" in target:
         return target["local.RA"], target["local.DEC"]
 
+    import astropy.units as u
+    from astropy.coordinates import SkyCoord
+
     coordinates = SkyCoord(f"{target['ra']} {target['dec']}", unit=(u.deg, u.deg))
     ra_hms = coordinates.ra.to_string(unit=u.hourangle, sep=":", pad=True, precision=3)
     dec_dms = coordinates.dec.to_string(sep=":", pad=True, precision=3)
@@ -265,6 +265,8 @@ def fill_acquisition(
     -------
     acquisition : dict
     """
+    import numpy as np
+
     acquisition = load_template(
         TEMPLATE_FILE, "acquisition", operational_mode=operational_mode
     )
@@ -356,6 +358,7 @@ def compose_ob(
     sci_name: str | None = None,
     tag: str | None = None,
     resolution: str | None = "low",
+    target: Dict | None = None,
 ) -> Dict:
     """Composes the dictionary
 
@@ -379,6 +382,10 @@ def compose_ob(
         The calibrator tag (L, N or LN).
     resolution : str, optional
         The resolution of the OB. Can be either "low", "med" or "high".
+    target : dict, optional
+        The target's already queried information (see
+        :func:`query <p2obt.backend.query.query>`). If not given,
+        the target is queried.
 
     Returns
     -------
@@ -419,7 +426,8 @@ def compose_ob(
             "Unknown resolution provided!" " Choose from 'low', 'med' or 'high'."
         )
 
-    target = query(target_name)
+    if target is None:
+        target = query(target_name)
     header = fill_header(target, ob_kind, array, sci_name, tag)
     acquisition = fill_acquisition(target, mode, array)
     observation = fill_observation(target, resolution, ob_kind, mode, array)
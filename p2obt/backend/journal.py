@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict
+
+
+class Journal:
+    """An append-only journal of the completed upload steps of a run.
+
+    Every step (e.g., a created container, OB or attached template) is
+    written as one line of json and flushed to disk (fsynced) right
+    away. When a run is restarted with the same journal, the already
+    committed steps are reused instead of being redone.
+
+    Parameters
+    ----------
+    file : path
+        The journal's (.jsonl)-file. Created if it does not exist.
+
+    Notes
+    -----
+    Steps are identified by keys built from their parameters (see
+    :meth:`key`). Identical steps are numbered by their occurrence
+    within the run, so the night plan has to be traversed in the
+    same order on a restart.
+    """
+
+    def __init__(self, file: Path) -> None:
+        self.file = Path(file)
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        self.steps, self.occurrences = {}, Counter()
+        self.lock = threading.Lock()
+
+        content = self.file.read_text(encoding="utf-8") if self.file.exists() else ""
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # NOTE: A step that was not fully written is not committed
+                continue
+            self.add_record(record)
+
+        if self.steps:
+            print(
+                f"Resuming from journal '{self.file.name}' ({len(self.steps)} steps)..."
+            )
+        self.journal_file = open(self.file, "a", encoding="utf-8")
+        if content and not content.endswith("\n"):
+            self.journal_file.write("\n")
+
+    def add_record(self, record: Dict) -> None:
+        """Adds a record to the journal's steps."""
+        step = self.steps.setdefault(record["key"], {})
+        if record["step"] == "template":
+            step.setdefault("templates", []).append(record["kind"])
+        elif record["step"] == "created":
+            step.setdefault("created", {})[record["kind"]] = record["id"]
+        elif record["step"] == "done":
+            step["done"] = True
+        else:
+            step.update(
+                {
+                    key: value
+                    for key, value in record.items()
+                    if key not in ["key", "step"]
+                }
+            )
+
+    def key(self, *parts) -> str:
+        """Makes the key for a step from its parameters and its occurrence."""
+        key = "/".join(str(part) for part in parts)
+        with self.lock:
+            self.occurrences[key] += 1
+            return f"{key}#{self.occurrences[key]}"
+
+    def get(self, key: str) -> Dict | None:
+        """Gets the committed information of a step if it exists."""
+        return self.steps.get(key)
+
+    def commit(self, key: str, step: str, **kwargs) -> None:
+        """Commits a step to the journal and syncs it to disk.
+
+        Parameters
+        ----------
+        key : str
+            The step's key.
+        step : str
+            The kind of step, e.g., "container", "ob", "created" (a template
+            without its parameters), "template" or "done".
+        """
+        record = {"key": key, "step": step, **kwargs}
+        with self.lock:
+            self.journal_file.write(json.dumps(record) + "\n")
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+            self.add_record(record)
+
+    def close(self) -> None:
+        """Closes the journal's file."""
+        self.journal_file.close()
@@ -0,0 +1,456 @@
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import p2api
+import toml
+
+from .client import P2Connection
+
+TEMPLATE_FILE = Path(__file__).parent.parent / "config" / "templates.toml"
+ROUTES = [
+    ("GET", r"/obsRuns", "get_runs"),
+    ("GET", r"/containers/(\d+)", "get_container"),
+    ("DELETE", r"/containers/(\d+)", "delete_container"),
+    ("GET", r"/containers/(\d+)/items", "get_items"),
+    ("PUT", r"/containers/(\d+)/items", "reorder_items"),
+    ("POST", r"/containers/(\d+)/items", "create_item"),
+    ("GET", r"/obsBlocks/(\d+)", "get_ob"),
+    ("PUT", r"/obsBlocks/(\d+)", "save_ob"),
+    ("DELETE", r"/obsBlocks/(\d+)", "delete_ob"),
+    ("GET", r"/obsBlocks/(\d+)/templates", "get_templates"),
+    ("POST", r"/obsBlocks/(\d+)/templates", "create_template"),
+    ("GET", r"/obsBlocks/(\d+)/templates/(\d+)", "get_template"),
+    ("PUT", r"/obsBlocks/(\d+)/templates/(\d+)", "save_template"),
+    ("DELETE", r"/obsBlocks/(\d+)/templates/(\d+)", "delete_template"),
+]
+CONTAINER_TYPES = ["Folder", "Group", "Concatenation", "TimeLink"]
+
+
+class P2StandInError(Exception):
+    """An error of the stand-in that is returned as an HTTP error."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def load_template_parameters(file: Path = TEMPLATE_FILE) -> Dict[str, Dict]:
+    """Loads the parameters of the acquisition and observation templates
+    by their template's name from the (.toml)-file of the templates."""
+    parameters = {}
+    for operational_mode in ["matisse", "gra4mat"]:
+        for template in toml.load(file)[operational_mode].values():
+            name_key = next(key for key in template if key.endswith("TEMPLATE.NAME"))
+            parameters[template[name_key]] = {
+                key: value for key, value in template.items() if key != name_key
+            }
+    return parameters
+
+
+class P2Store:
+    """The in-memory state of the stand-in (runs, containers, OBs and
+    templates) with the P2 API's versioning (ETags).
+
+    Parameters
+    ----------
+    runs : list of str, optional
+        The program ids of the runs (e.g., "110.2474.004") available.
+    """
+
+    def __init__(self, runs: List[str] | None = None) -> None:
+        self.ids = itertools.count(1000)
+        self.lock = threading.Lock()
+        self.containers, self.obs, self.templates = {}, {}, {}
+        self.versions, self.runs = {}, []
+        self.template_parameters = load_template_parameters()
+        for prog_id in runs or ["110.2474.004"]:
+            container = self.new_container("Folder", prog_id, None)
+            self.runs.append(
+                {
+                    "runId": next(self.ids),
+                    "progId": prog_id,
+                    "containerId": container["containerId"],
+                    "instrument": "MATISSE",
+                    "mode": "VM",
+                }
+            )
+
+    def version(self, key: Tuple) -> str:
+        """Gets the current version (ETag) of an entity."""
+        return self.versions.setdefault(key, uuid.uuid4().hex)
+
+    def bump(self, key: Tuple) -> str:
+        """Creates a new version (ETag) of a changed entity."""
+        self.versions[key] = uuid.uuid4().hex
+        return self.versions[key]
+
+    def check_version(self, key: Tuple, etag: str | None) -> None:
+        """Checks that a modification is based on the current version."""
+        if etag is not None and etag != self.version(key):
+            raise P2StandInError(412, "Version conflict (precondition failed)")
+
+    def new_container(self, item_type: str, name: str, parent_id: int | None) -> Dict:
+        """Creates a container."""
+        container_id = next(self.ids)
+        container = {
+            "containerId": container_id,
+            "itemType": item_type,
+            "name": name,
+            "parentContainerId": parent_id,
+            "items": [],
+        }
+        self.containers[container_id] = container
+        return container
+
+    def get_item(self, item: Tuple[str, int]) -> Dict:
+        """Gets the summary of an item of a container."""
+        kind, item_id = item
+        if kind == "ob":
+            ob = self.obs[item_id]
+            return {key: ob[key] for key in ["obId", "itemType", "name", "obStatus"]}
+        container = self.containers[item_id]
+        return {key: value for key, value in container.items() if key != "items"}
+
+    def container(self, container_id: int) -> Dict:
+        """Gets a container or raises a 404 error."""
+        if container_id not in self.containers:
+            raise P2StandInError(404, f"Container {container_id} not found")
+        return self.containers[container_id]
+
+    def ob(self, ob_id: int) -> Dict:
+        """Gets an OB or raises a 404 error."""
+        if ob_id not in self.obs:
+            raise P2StandInError(404, f"OB {ob_id} not found")
+        return self.obs[ob_id]
+
+    def template(self, ob_id: int, template_id: int) -> Dict:
+        """Gets a template or raises a 404 error."""
+        self.ob(ob_id)
+        if template_id not in self.templates.get(ob_id, {}):
+            raise P2StandInError(404, f"Template {template_id} not found")
+        return self.templates[ob_id][template_id]
+
+    def get_runs(self, data, etag) -> Tuple[Any, str | None]:
+        return self.runs, None
+
+    def get_container(self, data, etag, container_id) -> Tuple[Any, str | None]:
+        container = self.container(container_id)
+        item = self.get_item(("container", container_id))
+        return item, self.version(("container", container["containerId"]))
+
+    def delete_container(self, data, etag, container_id) -> Tuple[Any, str | None]:
+        container = self.container(container_id)
+        self.check_version(("container", container_id), etag)
+        if container["items"]:
+            raise P2StandInError(400, "The container is not empty")
+        parent = self.containers.get(container["parentContainerId"])
+        if parent is not None:
+            parent["items"].remove(("container", container_id))
+        del self.containers[container_id]
+        return None, None
+
+    def get_items(self, data, etag, container_id) -> Tuple[Any, str | None]:
+        container = self.container(container_id)
+        items = [self.get_item(item) for item in container["items"]]
+        return items, self.version(("items", container_id))
+
+    def reorder_items(self, data, etag, container_id) -> Tuple[Any, str | None]:
+        container = self.container(container_id)
+        self.check_version(("items", container_id), etag)
+        items = [
+            (
+                ("ob", item["obId"])
+                if "obId" in item
+                else ("container", item["containerId"])
+            )
+            for item in data
+        ]
+        if sorted(items) != sorted(container["items"]):
+            raise P2StandInError(400, "The items do not match the container's items")
+        container["items"] = items
+        return self.get_items(None, None, container_id)[0], self.bump(
+            ("items", container_id)
+        )
+
+    def create_item(self, data, etag, container_id) -> Tuple[Any, str | None]:
+        container = self.container(container_id)
+        item_type, name = data["itemType"], data["name"]
+        if item_type in CONTAINER_TYPES:
+            new_container = self.new_container(item_type, name, container_id)
+            container["items"].append(("container", new_container["containerId"]))
+            self.bump(("items", container_id))
+            key = ("container", new_container["containerId"])
+            return self.get_item(key), self.version(key)
+
+        if item_type != "OB":
+            raise P2StandInError(400, f"Unknown item type '{item_type}'")
+        ob_id = next(self.ids)
+        self.obs[ob_id] = {
+            "obId": ob_id,
+            "itemType": "OB",
+            "name": name,
+            "obStatus": "-",
+            "instrument": "MATISSE",
+            "ipVersion": 111.0,
+            "userPriority": 1,
+            "obsDescription": {
+                "name": name,
+                "userComments": "",
+                "instrumentComments": "",
+            },
+            "target": {
+                "name": "",
+                "ra": "00:00:00.000",
+                "dec": "00:00:00.000",
+                "equinox": "J2000",
+                "epoch": 2000.0,
+                "properMotionRa": 0.0,
+                "properMotionDec": 0.0,
+                "differentialRa": 0.0,
+                "differentialDec": 0.0,
+            },
+            "constraints": {
+                "name": "No Name",
+                "airmass": 2.0,
+                "skyTransparency": "Variable, thin cirrus",
+                "fli": 1.0,
+                "moonDistance": 30,
+                "waterVapour": 30.0,
+                "atm": "70%  (Seeing < 1.15 arcsec, t0 > 2.2 ms)",
+            },
+        }
+        self.templates[ob_id] = {}
+        container["items"].append(("ob", ob_id))
+        self.bump(("items", container_id))
+        return self.obs[ob_id], self.version(("ob", ob_id))
+
+    def get_ob(self, data, etag, ob_id) -> Tuple[Any, str | None]:
+        return self.ob(ob_id), self.version(("ob", ob_id))
+
+    def save_ob(self, data, etag, ob_id) -> Tuple[Any, str | None]:
+        ob = self.ob(ob_id)
+        self.check_version(("ob", ob_id), etag)
+        for key in ["obId", "itemType", "obStatus", "ipVersion"]:
+            data[key] = ob[key]
+        self.obs[ob_id] = data
+        return data, self.bump(("ob", ob_id))
+
+    def delete_ob(self, data, etag, ob_id) -> Tuple[Any, str | None]:
+        self.ob(ob_id)
+        self.check_version(("ob", ob_id), etag)
+        for container in self.containers.values():
+            if ("ob", ob_id) in container["items"]:
+                container["items"].remove(("ob", ob_id))
+                self.bump(("items", container["containerId"]))
+        del self.obs[ob_id], self.templates[ob_id]
+        return None, None
+
+    def get_templates(self, data, etag, ob_id) -> Tuple[Any, str | None]:
+        self.ob(ob_id)
+        templates = [
+            {key: value for key, value in template.items() if key != "parameters"}
+            for template in self.templates[ob_id].values()
+        ]
+        return templates, self.version(("templates", ob_id))
+
+    def create_template(self, data, etag, ob_id) -> Tuple[Any, str | None]:
+        self.ob(ob_id)
+        name = data["templateName"]
+        if name not in self.template_parameters:
+            raise P2StandInError(400, f"Unknown template '{name}'")
+        template_type = "acquisition" if "acq" in name else "science"
+        if template_type == "acquisition" and any(
+            template["type"] == "acquisition"
+            for template in self.templates[ob_id].values()
+        ):
+            raise P2StandInError(400, "The OB already has an acquisition template")
+
+        template_id = next(self.ids)
+        self.templates[ob_id][template_id] = {
+            "templateId": template_id,
+            "templateName": name,
+            "type": template_type,
+            "parameters": [
+                {"name": key, "type": type(value).__name__, "value": value}
+                for key, value in self.template_parameters[name].items()
+            ],
+        }
+        self.bump(("templates", ob_id))
+        key = ("template", template_id)
+        return self.templates[ob_id][template_id], self.version(key)
+
+    def get_template(self, data, etag, ob_id, template_id) -> Tuple[Any, str | None]:
+        template = self.template(ob_id, template_id)
+        return template, self.version(("template", template_id))
+
+    def save_template(self, data, etag, ob_id, template_id) -> Tuple[Any, str | None]:
+        template = self.template(ob_id, template_id)
+        self.check_version(("template", template_id), etag)
+        values = {param["name"]: param["value"] for param in data["parameters"]}
+        for param in template["parameters"]:
+            param["value"] = values.get(param["name"], param["value"])
+        return template, self.bump(("template", template_id))
+
+    def delete_template(self, data, etag, ob_id, template_id) -> Tuple[Any, str | None]:
+        self.template(ob_id, template_id)
+        self.check_version(("template", template_id), etag)
+        del self.templates[ob_id][template_id]
+        self.bump(("templates", ob_id))
+        return None, None
+
+
+class LocalP2Server(ThreadingHTTPServer):
+    """A local stand-in for the P2 API that emulates the endpoints
+    used by p2obt (in memory), e.g., for load testing and benchmarks.
+
+    Parameters
+    ----------
+    port : int, optional
+        The port to listen to. Default is a free port.
+    runs : list of str, optional
+        The program ids of the runs (e.g., "110.2474.004") available.
+    latency : float, optional
+        The latency (in seconds) added to every request.
+    jitter : float, optional
+        A random latency (in seconds) of up to this value added to
+        every request.
+    error_rate : float, optional
+        The fraction of requests that fail with the 'error_status'.
+    error_status : int, optional
+        The HTTP status of the injected errors. Default is 503.
+    seed : int, optional
+        The seed for the latency jitter and the error injection.
+
+    Examples
+    --------
+    >>> with LocalP2Server(latency=0.05, error_rate=0.01) as server:
+    ...     connection = server.connect()
+    ...     runs, _ = connection.getRuns()
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        runs: List[str] | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int | None = None,
+    ) -> None:
+        super().__init__(("127.0.0.1", port), P2RequestHandler)
+        self.store = P2Store(runs)
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.error_status = error_rate, error_status
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """The server's base url."""
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def __enter__(self) -> "LocalP2Server":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Starts serving in a background thread."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops serving and closes the server."""
+        self.shutdown()
+        self.server_close()
+
+    def connect(self, connection_class: type = P2Connection) -> p2api.ApiConnection:
+        """Creates a P2 python api connection to the stand-in.
+
+        Parameters
+        ----------
+        connection_class : type, optional
+            The class of the connection. Default is `P2Connection`.
+        """
+        connection = connection_class(
+            url=p2api.API_URL["demo"], access_token=uuid.uuid4().hex
+        )
+        connection.apiUrl = f"{self.url}/api/v1"
+        connection.loginUrl = f"{self.url}/api/login"
+        return connection
+
+    def dispatch(self, method: str, path: str, data, etag) -> Tuple[int, Any, str]:
+        """Dispatches a request to the store, after the injected latency
+        and errors."""
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if path == "/api/login" and method == "POST":
+            return 200, {"access_token": uuid.uuid4().hex}, None
+
+        path = path.removeprefix("/api/v1")
+        for route_method, pattern, handler in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                break
+        else:
+            return 404, {"error": f"Unknown endpoint {method} {path}"}, None
+
+        with self.store.lock:
+            self.stats[handler] += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return self.error_status, {"error": "Injected error"}, None
+            try:
+                args = map(int, match.groups())
+                body, etag = getattr(self.store, handler)(data, etag, *args)
+            except P2StandInError as error:
+                return error.status, {"error": str(error)}, None
+            body = json.loads(json.dumps(body))
+        return (201 if method == "POST" else 200), body, etag
+
+
+class P2RequestHandler(BaseHTTPRequestHandler):
+    """The request handler of the `LocalP2Server`."""
+
+    def handle_method(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        data = None
+        if raw and self.headers.get("Content-Type") == "application/json":
+            data = json.loads(raw)
+
+        status, body, etag = self.server.dispatch(
+            self.command, self.path, data, self.headers.get("If-Match")
+        )
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status if body is not None or status >= 400 else 204)
+        self.send_header(
+            "Content-Type", "application/json" if payload else "text/plain"
+        )
+        self.send_header("Content-Length", str(len(payload)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_method
+
+    def log_message(self, format: str, *args) -> None:
+        """Silences the default logging of every request."""
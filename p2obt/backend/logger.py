@@ -0,0 +1,164 @@
+import atexit
+import logging
+import os
+import queue
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+from ..config.options import OPTIONS
+
+LOG_CONTEXT: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+_LISTENER = None
+_HANDLER = None
+_PID = None
+
+
+class ContextFilter(logging.Filter):
+    """Adds the log context (see :func:`log_context`) to the records, both
+    as attributes (e.g., "record.target") and as a prefix ("record.context")."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = LOG_CONTEXT.get()
+        for key, value in context.items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+
+        record.context = ""
+        if context:
+            items = ", ".join(f"{key}={value}" for key, value in context.items())
+            record.context = f"[{items}] "
+        return True
+
+
+class ContextQueueHandler(QueueHandler):
+    """Puts the records (with their log context) into a queue that is
+    written by a separate thread (see :func:`setup_logging`).
+
+    Only the message is merged with its arguments in the logging thread.
+    The records are neither copied nor formatted (e.g., the tracebacks),
+    which is left to the writing thread.
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue) -> None:
+        super().__init__(log_queue)
+        self.addFilter(ContextFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+@contextmanager
+def log_context(**context: Any) -> Iterator[None]:
+    """Adds context (e.g., the run, night, target and OB name) to all
+    records logged within (in the current thread or task).
+
+    Examples
+    --------
+    >>> with log_context(target="HD 100546", ob="HD_100546_SCI"):
+    ...     logging.error("Failed uploading OB!")
+    """
+    context = {key: value for key, value in context.items() if value is not None}
+    token = LOG_CONTEXT.set({**LOG_CONTEXT.get(), **context})
+    try:
+        yield
+    finally:
+        LOG_CONTEXT.reset(token)
+
+
+def get_log_file(per_process: bool = False) -> Path:
+    """Gets the log file ("p2obt.log" or, per process, "p2obt.<pid>.log")
+    in 'OPTIONS.log.path'."""
+    name = f"p2obt.{os.getpid()}.log" if per_process else "p2obt.log"
+    return OPTIONS.log.path / name
+
+
+def get_file_handler(file: Path) -> logging.Handler:
+    """Gets the (rotating) handler that writes the log file."""
+    if OPTIONS.log.when is not None:
+        handler = TimedRotatingFileHandler(
+            file, when=OPTIONS.log.when, backupCount=OPTIONS.log.backups
+        )
+    else:
+        handler = RotatingFileHandler(
+            file, maxBytes=OPTIONS.log.max_bytes, backupCount=OPTIONS.log.backups
+        )
+    handler.setFormatter(logging.Formatter(OPTIONS.log.format))
+    handler.setLevel(OPTIONS.log.level)
+    return handler
+
+
+def setup_logging(mode: str = "w", per_process: bool = False) -> None:
+    """Sets up the log file in 'OPTIONS.log.path'.
+
+    This is done once per process, on the first use of p2obt
+    (e.g., :func:`create_obs <p2obt.automate.create_obs>`) instead of
+    on import. The records are put into a queue (which is cheap for the
+    logging thread) and written to the file by a separate thread.
+
+    Parameters
+    ----------
+    mode : str, optional
+        Either "w" to start a new log (default), rotating the previous one,
+        or "a" to append to it.
+    per_process : bool, optional
+        If 'True' the process logs to its own file "p2obt.<pid>.log" (e.g.,
+        the worker processes of :func:`create_obs_batch <p2obt.automate.create_obs_batch>`).
+    """
+    global _LISTENER, _HANDLER, _PID
+    if _PID == os.getpid():
+        return
+
+    # NOTE: The handler inherited from a forked parent process is replaced,
+    # as its writing thread does not exist in this process
+    root = logging.getLogger()
+    if _HANDLER is not None:
+        root.removeHandler(_HANDLER)
+
+    OPTIONS.log.path.mkdir(parents=True, exist_ok=True)
+    log_file = get_log_file(per_process)
+    file_handler = get_file_handler(log_file)
+    if mode == "w":
+        if log_file.exists() and log_file.stat().st_size:
+            if OPTIONS.log.backups:
+                file_handler.doRollover()
+            else:
+                log_file.write_text("")
+        print(f"Log was created in {OPTIONS.log.path}.")
+
+    log_queue = queue.SimpleQueue()
+    _HANDLER = ContextQueueHandler(log_queue)
+    root.addHandler(_HANDLER)
+    root.setLevel(OPTIONS.log.level)
+
+    _LISTENER = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _LISTENER.start()
+    _PID = os.getpid()
+
+    # NOTE: Worker processes do not call the 'atexit' functions
+    atexit.register(stop_logging)
+    Finalize(None, stop_logging, exitpriority=10)
+
+
+def stop_logging() -> None:
+    """Writes the remaining records and stops the logging (set up with
+    :func:`setup_logging`)."""
+    global _LISTENER, _HANDLER, _PID
+    if _PID != os.getpid() or _LISTENER is None:
+        return
+
+    logging.getLogger().removeHandler(_HANDLER)
+    _LISTENER.stop()
+    for handler in _LISTENER.handlers:
+        handler.close()
+    _LISTENER = _HANDLER = _PID = None
@@ -0,0 +1,135 @@
+import gc
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from ..config.options import OPTIONS
+from .metrics import observe
+
+# NOTE: The fields of an OB that are dropped once it has been created
+# (the queried target and the composed OB)
+HEAVY_FIELDS = ["query", "ob"]
+
+
+def get_rss() -> int | None:
+    """Gets the current resident set size (in bytes) of the process
+    (only on Linux, otherwise "None")."""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_peak_rss() -> int | None:
+    """Gets the peak resident set size (in bytes) of the process
+    (not on Windows, there "None")."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextmanager
+def track_memory(name: str) -> Iterator[None]:
+    """Records the change of the resident set size (in MiB) within
+    as the value "memory.<name>" (if the metrics are collected).
+
+    As the stages run concurrently, the change includes the allocations
+    of the other stages' threads in the meantime.
+    """
+    start = get_rss()
+    try:
+        yield
+    finally:
+        if start is not None:
+            observe(f"memory.{name}", (get_rss() - start) / 1024**2)
+
+
+class MemoryBudget:
+    """Tracks the memory of a run against a budget.
+
+    Until the budget is crossed, the created OBs are held (with their
+    queried targets and composed OBs). Once it is crossed, the run switches
+    to streaming, i.e., the composed OBs are dropped as soon as they have
+    been uploaded or written (see :func:`release_obs`).
+
+    Parameters
+    ----------
+    budget : int, optional
+        The budget (in bytes) of the resident set size. By default
+        'OPTIONS.memory.budget'. If "None" the memory is not limited.
+    """
+
+    def __init__(self, budget: int | None = None) -> None:
+        self.budget = budget if budget is not None else OPTIONS.memory.budget
+        self.streaming = self.budget == 0
+        self.held: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def check(self) -> bool:
+        """Checks if the budget has been crossed (and switches to streaming).
+
+        Returns
+        -------
+        streaming : bool
+            'True' if the run is streaming.
+        """
+        if self.streaming or self.budget is None:
+            return self.streaming
+
+        rss = get_rss() or get_peak_rss()
+        if rss is not None and rss > self.budget:
+            with self._lock:
+                if not self.streaming:
+                    self.streaming = True
+                    message = (
+                        f"Memory budget of {self.budget / 1024**2:.0f} MiB crossed"
+                        f" ({rss / 1024**2:.0f} MiB). Switching to streaming..."
+                    )
+                    print(f"[WARNING]: {message}")
+                    logging.warning(message)
+                    for block in self.held:
+                        release_block(block)
+                    self.held.clear()
+                    gc.collect()
+        return self.streaming
+
+    def hold(self, block: Dict) -> None:
+        """Holds a block with its created OBs (or drops them if streaming)."""
+        with self._lock:
+            if self.streaming:
+                release_block(block)
+            else:
+                self.held.append(block)
+
+    def summary(self) -> Dict[str, float | bool | None]:
+        """Gets the peak resident set size and the budget (in MiB) and
+        if the run was streaming."""
+        peak, budget = get_peak_rss(), self.budget
+        return {
+            "peak_rss": round(peak / 1024**2, 1) if peak is not None else None,
+            "budget": round(budget / 1024**2, 1) if budget is not None else None,
+            "streaming": self.streaming,
+        }
+
+
+def release_block(block: Dict) -> None:
+    """Drops the queried targets and composed OBs of a block."""
+    for ob in block["obs"]:
+        for field in HEAVY_FIELDS:
+            ob.pop(field, None)
+
+
+def release_obs(block: Dict, budget: MemoryBudget) -> Dict:
+    """Holds a block's created OBs or, if the run is streaming, drops
+    them (pipeline stage)."""
+    budget.check()
+    budget.hold(block)
+    return block
@@ -0,0 +1,197 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+
+# NOTE: The percentiles of the timings and values in the report
+PERCENTILES = [50, 95, 99]
+
+
+class Metrics:
+    """Collects the timings (e.g., of the stages "query", "compose" or
+    "upload.template"), the values (e.g., the rows returned by a catalog)
+    and the counters of a run.
+
+    The metrics are collected from all threads. Use :func:`collect_metrics`
+    to collect them and :func:`timed` to record a timing.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.timings: Dict[str, List[float]] = {}
+        self.values: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration: float) -> None:
+        """Records a timing (in seconds)."""
+        with self._lock:
+            self.timings.setdefault(name, []).append(duration)
+
+    def observe(self, name: str, value: float) -> None:
+        """Records a value (e.g., a payload's size in bytes)."""
+        with self._lock:
+            self.values.setdefault(name, []).append(value)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Increments a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarises the metrics.
+
+        Returns
+        -------
+        summary : dict
+            The wall time since the start (in seconds), the count, total,
+            mean, percentiles and maximum of each timing and value and
+            the counters.
+        """
+        with self._lock:
+            timings = {name: sorted(values) for name, values in self.timings.items()}
+            values = {name: sorted(values) for name, values in self.values.items()}
+            counters = dict(self.counters)
+
+        return {
+            "duration": time.perf_counter() - self.start,
+            "timings": {name: summarise(timings[name]) for name in sorted(timings)},
+            "values": {name: summarise(values[name]) for name in sorted(values)},
+            "counters": dict(sorted(counters.items())),
+        }
+
+
+METRICS: ContextVar[Metrics | None] = ContextVar("metrics", default=None)
+
+
+def get_percentile(values: List[float], q: float) -> float:
+    """Gets the percentile (nearest rank) of sorted values."""
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarise(values: List[float]) -> Dict[str, float]:
+    """Summarises sorted values (count, total, mean, percentiles and maximum)."""
+    return {
+        "count": len(values),
+        "total": sum(values),
+        "mean": sum(values) / len(values),
+        **{f"p{q}": get_percentile(values, q) for q in PERCENTILES},
+        "max": values[-1],
+    }
+
+
+def get_metrics() -> Metrics | None:
+    """Gets the metrics collected in the current context (if any)."""
+    return METRICS.get()
+
+
+@contextmanager
+def collect_metrics() -> Iterator[Metrics]:
+    """Collects the metrics of everything run within (including the
+    threads of the pipeline, see :func:`run_pipeline <p2obt.backend.pipeline.run_pipeline>`).
+
+    Examples
+    --------
+    >>> with collect_metrics() as metrics:
+    ...     create_ob("HD 142666", "sci", "UTs", output_dir="obs")
+    >>> print_report(metrics.summary())
+    """
+    token = METRICS.set(Metrics())
+    try:
+        yield METRICS.get()
+    finally:
+        METRICS.reset(token)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Records the time taken within (if the metrics are collected).
+
+    If an error is raised within, the counter "<name>.errors" is incremented.
+    """
+    metrics = METRICS.get()
+    if metrics is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        metrics.increment(f"{name}.errors")
+        raise
+    finally:
+        metrics.record(name, time.perf_counter() - start)
+
+
+def observe(name: str, value: float) -> None:
+    """Records a value (if the metrics are collected)."""
+    if (metrics := METRICS.get()) is not None:
+        metrics.observe(name, value)
+
+
+def increment(name: str, value: int = 1) -> None:
+    """Increments a counter (if the metrics are collected)."""
+    if (metrics := METRICS.get()) is not None:
+        metrics.increment(name, value)
+
+
+def timed_iter(iterable: Iterable, name: str) -> Iterator:
+    """Records the time taken to get each item of an iterable
+    (e.g., of a night plan that is parsed while it is processed)."""
+    iterator = iter(iterable)
+    while True:
+        with timed(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    """Formats the timings, values and counters of the metrics' summary
+    as tables."""
+    names = [*summary["timings"], *summary.get("values", {}), *summary["counters"]]
+    width = max([len("stage"), *map(len, names)])
+    percentiles = [f"p{q}" for q in PERCENTILES]
+    lines = []
+
+    def add_table(title: str, columns: List[str], rows: Dict, scale: float) -> None:
+        lines.append(f"{title:<{width}}" + "".join(f"{key:>12}" for key in columns))
+        lines.append(f"{'':-^{width + 12 * len(columns)}}")
+        for name, row in rows.items():
+            values = [f"{row['count']:>12}", f"{row['total']:>12.3f}"]
+            values.extend(f"{row[key] * scale:>12.1f}" for key in [*percentiles, "max"])
+            lines.append(f"{name:<{width}}" + "".join(values))
+
+    columns = ["count", "total [s]", *(f"{key} [ms]" for key in percentiles)]
+    add_table("stage", [*columns, "max [ms]"], summary["timings"], 1e3)
+    if summary.get("values"):
+        lines.append("")
+        columns = ["count", "total", *percentiles, "max"]
+        add_table("value", columns, summary["values"], 1)
+    if summary["counters"]:
+        lines.append("")
+        for name, value in summary["counters"].items():
+            lines.append(f"{name:<{width}}{value:>12}")
+    lines.append(f"Wall time: {summary['duration']:.3f} s")
+    return "\n".join(lines)
+
+
+def print_report(summary: Dict[str, Any]) -> None:
+    """Prints the metrics' summary as a table (see :func:`format_report`)."""
+    print(f"{'':-^50}")
+    print(format_report(summary))
+    print(f"{'':-^50}")
+
+
+def save_report(report: Dict[str, Any], file: Path) -> None:
+    """Saves a run's report (e.g., the summary and metrics) as a (.json)-file."""
+    file = Path(file)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    file.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
@@ -1,7 +1,125 @@
+import hashlib
 import re
+from collections import Counter
+from copy import deepcopy
 from datetime import datetime
+from glob import glob
 from pathlib import Path
-from typing import Dict, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Tuple
+
+from ..config.options import OPTIONS
+from .cache import get_cache_key, load_cached, save_cached
+
+# NOTE: Numpy, pandas and astropy are only imported for night plan tables
+if TYPE_CHECKING:
+    import pandas as pd
+    from astropy.table import Table
+
+# NOTE: The keywords (substrings of a lowercased line) of each setting in order
+# of their precedence
+KEYWORDS = {
+    "mode": {"gra4mat": "gr", "matisse": "st", "both": "both"},
+    "array": {
+        "uts": "UTs",
+        "small": "small",
+        "medium": "medium",
+        "large": "large",
+        "extended": "extended",
+    },
+    "res": {
+        "lr": "LOW",
+        "low": "LOW",
+        "mr": "MED",
+        "med": "MED",
+        "medium": "MED",
+        "hr": "HIGH",
+        "high": "HIGH",
+    },
+    "type": {
+        "sm": "sm",
+        "servicemode": "sm",
+        "service-mode": "sm",
+        "service mode": "sm",
+        "im": "im",
+        "imaging": "im",
+        "image": "im",
+        "ts": "ts",
+        "timeseries": "ts",
+        "time-series": "ts",
+        "time series": "ts",
+        "vm": "vm",
+        "visitormode": "vm",
+        "visitor-mode": "vm",
+        "visitor mode": "vm",
+    },
+}
+
+
+HEADER_SETTINGS = ("mode", "array", "res")
+PROG_ID_PATTERN = re.compile(r"\b[\w\d]+\.[\w\d]+\.[\w\d]+\b")
+# NOTE: Increase if the parsed structure changes (invalidates the cached night plans)
+PARSER_VERSION = 1
+PLAN_CACHE = "plans"
+# NOTE: The columns of a night plan table (and their defaults) and their aliases
+TABLE_COLUMNS = {
+    "run": "full_run",
+    "night": "full_night",
+    "target": None,
+    "calibrators": None,
+    "order": "b",
+    "tag": "LN",
+    "resolution": "low",
+    "configuration": "",
+    "mode": "gr",
+    "type": "",
+}
+TABLE_ALIASES = {
+    "targets": "target",
+    "calibrator": "calibrators",
+    "orders": "order",
+    "tags": "tag",
+    "res": "resolution",
+    "array": "configuration",
+    "configurations": "configuration",
+    "modes": "mode",
+}
+TABLE_SETTINGS = {
+    "resolution": "res",
+    "configuration": "array",
+    "mode": "mode",
+    "type": "type",
+}
+CELL_SEPARATOR = re.compile(r"\s*[,;]\s*")
+NIGHT_PATTERN = re.compile(
+    r"(?i)night\s+(\d+).*?((\d{1,2}\s+(?:\w{3}|\w+))|(\w+\s+\d{1,2}))"
+)
+
+
+def get_setting(line: str, setting: str) -> str:
+    """Gets the value of a setting with the highest precedence from the
+    keywords in a (lowercased) line."""
+    for keyword, value in KEYWORDS[setting].items():
+        if keyword in line:
+            return value
+    return ""
+
+
+def parse_header(line: str) -> Dict[str, str]:
+    """Parses the operational mode, the array configuration and the
+    resolution from a (header) line in one scan.
+
+    Parameters
+    ----------
+    line : str
+        The line.
+
+    Returns
+    -------
+    settings : dict
+        The "mode", "array" and "res" ("" if not found).
+    """
+    line = line.lower()
+    return {setting: get_setting(line, setting) for setting in HEADER_SETTINGS}
 
 
 def parse_operational_mode(line: str) -> str:
@@ -18,14 +136,7 @@ def parse_operational_mode(line: str) -> str:
     operational_mode : str
         Either "MATISSE" or "GRA4MAT".
     """
-    line = line.lower()
-    if "gra4mat" in line:
-        return "gr"
-    if "matisse" in line:
-        return "st"
-    if "both" in line:
-        return "both"
-    return ""
+    return get_setting(line.lower(), "mode")
 
 
 def parse_array_config(line: str | None = None) -> str:
@@ -41,21 +152,9 @@ def parse_array_config(line: str | None = None) -> str:
     array_configuration : str
         Either "UTs", "small", "medium", "large" or "extended".
     """
-    at_configs = ["ATs", "small", "medium", "large", "extended"]
-    if line is not None:
-        line = line.lower()
-        if "uts" in line:
-            return "UTs"
-        if any(config in line for config in at_configs):
-            if "small" in line:
-                return "small"
-            if "medium" in line:
-                return "medium"
-            if "large" in line:
-                return "large"
-            if "extended" in line:
-                return "extended"
-    return ""
+    if line is None:
+        return ""
+    return get_setting(line.lower(), "array")
 
 
 def parse_resolution(line: str) -> str:
@@ -71,14 +170,7 @@ def parse_resolution(line: str) -> str:
     resolution : str
         Either "LOW", "MED" or "HIGH".
     """
-    line = line.lower()
-    if any(res in line for res in ["lr", "low"]):
-        return "LOW"
-    if any(res in line for res in ["mr", "med", "medium"]):
-        return "MED"
-    if any(res in line for res in ["hr", "high"]):
-        return "HIGH"
-    return ""
+    return get_setting(line.lower(), "res")
 
 
 def parse_observation_type(line: str) -> str:
@@ -94,16 +186,7 @@ def parse_observation_type(line: str) -> str:
     resolution : str
         Either "LOW", "MED" or "HIGH".
     """
-    line = line.lower()
-    if any(res in line for res in ["sm", "servicemode", "service-mode", "service mode"]):
-        return "sm"
-    if any(res in line for res in ["im", "imaging", "image"]):
-        return "im"
-    if any(res in line for res in ["ts", "timeseries", "time-series", "time series"]):
-        return "ts"
-    if any(res in line for res in ["vm", "visitormode", "visitor-mode", "visitor mode"]):
-        return "vm"
-    return ""
+    return get_setting(line.lower(), "type")
 
 
 def parse_run_prog_id(run_name: str) -> str:
@@ -123,8 +206,7 @@ def parse_run_prog_id(run_name: str) -> str:
         The run's program id in the form of
         <period>.<program>.<run> (e.g., 110.2474.004).
     """
-    pattern = r"\b[\w\d]+\.[\w\d]+\.[\w\d]+\b"
-    run_prog_id = re.findall(pattern, run_name)[0]
+    run_prog_id = PROG_ID_PATTERN.findall(run_name)[0]
 
     if not run_prog_id:
         print("Run's program id could not be automatically detected!")
@@ -153,10 +235,9 @@ def parse_night_name(night_name: str) -> str:
     """
     if "full" in night_name:
         return night_name
-    regex = r"(?i)night\s+(\d+).*?((\d{1,2}\s+(?:\w{3}|\w+))|(\w+\s+\d{1,2}))"
     day_month, month_day = "%d %b", "%B %d"
 
-    match = re.search(regex, night_name)
+    match = NIGHT_PATTERN.search(night_name)
     night = match.group(1) if match else None
     date_str = match.group(2) if match else None
 
@@ -201,97 +282,288 @@ def parse_line(parts: str) -> str:
     return " ".join(parts[1:target_name_cutoff])
 
 
-def parse_groups(section: List) -> Dict:
-    """Parses any combination of a calibrator-science target block
-    into a dictionary containing the individual blocks' information.
+class GroupParser:
+    """Parses the lines of a section of a night plan (a run or a night of
+    a run) one at a time into calibrator-science target groups.
 
-    Parameters
-    ----------
-    section : list
-        A section of a night plan (either a run or a night of a run).
-
-    Returns
-    -------
-    data : dict
-        The individual science target/calibrator group within a section.
-        Can be for instance, "SCI-CAL" or "CAL-SCI-CAL" or any combination.
+    A group is complete at the next empty line. The operational mode,
+    array configuration and resolution of the last header line (a line that
+    does not start with a digit) are assigned to the next science target.
     """
-    data, mode, array, res, ob_type = [], "", "", "", ""
-    calibrator_labels = ["name", "order", "tag"]
-    current_group = {"cals": []}
 
-    for line in section:
-        parts = line.strip().split()
+    def __init__(self) -> None:
+        self.group, self.settings = {"cals": []}, {}
 
+    def feed(self, line: str) -> Dict | None:
+        """Parses a line and returns a completed group (with calibrators)."""
+        parts = line.split()
         if not parts:
-            if current_group.get("target", None) is not None:
-                data.append(current_group)
-
-            current_group = {"cals": []}
-            continue
+            group, self.group = self.group, {"cals": []}
+            if group.get("target") is not None and group["cals"]:
+                return group
+            return None
 
         if line.startswith("#") or not line[0].isdigit():
-            mode = parse_operational_mode(line)
-            array = parse_array_config(line)
-            res = parse_resolution(line)
-            continue
+            self.settings = parse_header(line)
+            return None
 
         obj_name = parse_line(parts)
         if obj_name.startswith("cal_"):
-            tag = obj_name.split("_")[1]
-            order = "b" if current_group.get("target", None) is None else "a"
-            calibrator = dict(
-                zip(calibrator_labels, [obj_name.split("_")[2], order, tag])
-            )
-            current_group["cals"].append(calibrator)
+            _, tag, name = obj_name.split("_")[:3]
+            order = "b" if self.group.get("target") is None else "a"
+            self.group["cals"].append({"name": name, "order": order, "tag": tag})
+        else:
+            self.group["target"] = obj_name
+            self.group["mode"] = self.settings.get("mode", "")
+            self.group["array"] = self.settings.get("array", "")
+            self.group["res"] = self.settings.get("res", "")
+            self.group["type"] = ""
+            self.settings = {}
+        return None
+
+
+def tokenize_night_plan(
+    lines: Iterable[str],
+    run_identifier: str | None = "run",
+    night_identifier: str | None = "night",
+) -> Iterator[Tuple[str, Any]]:
+    """Tokenizes the lines of a night plan in a single pass.
+
+    Every line is classified once (as a run, a night or a line of a group)
+    and the runs, nights and groups are emitted as soon as they are known.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        The lines of the night plan.
+    run_identifier : str, optional
+        The run-identifier by which the night plan is split into
+        individual runs.
+    night_identifier : str, optional
+        The night-identifier by which the runs are split into the
+        individual nights.
+
+    Yields
+    ------
+    token : tuple
+        Either ("run", run_key), ("night", night_key) or ("block", group).
+
+    Notes
+    -----
+    The lines before the first run are only part of a run "full_<run>"
+    if there is no run at all, and the lines of a run before its first night
+    are only part of a night "full_<night>" if the run has no nights. These
+    lines' tokens are held back until this is known.
+    """
+    in_run, in_night = False, False
+    preamble, prenight = [], []
+    parser = GroupParser()
+
+    def close_run() -> List[Tuple[str, Any]]:
+        """Gets the tokens of the run's night "full_<night>" (if it has no
+        nights)."""
+        if in_night:
+            return []
+        return [("night", f"full_{night_identifier}"), *prenight]
+
+    for line in lines:
+        lowered = line.lower()
+        if lowered.startswith(run_identifier):
+            if in_run:
+                yield from close_run()
+            yield ("run", line.strip())
+            in_run, in_night, preamble, prenight = True, False, None, []
+            parser = GroupParser()
+        elif lowered.startswith(night_identifier):
+            token = ("night", line.strip())
+            if in_run:
+                yield token
+            else:
+                preamble.append(token)
+            in_night, prenight = True, []
+            parser = GroupParser()
+
+        group = parser.feed(line)
+        if group is None:
+            continue
+
+        token = ("block", group)
+        if not in_night:
+            prenight.append(token)
+        elif in_run:
+            yield token
+        else:
+            preamble.append(token)
+
+    if in_run:
+        yield from close_run()
+    else:
+        yield ("run", f"full_{run_identifier}")
+        yield from preamble + close_run()
+
+
+def collect_night_plan(tokens: Iterable[Tuple[str, Any]]) -> Dict[str, Dict]:
+    """Collects the tokens of a night plan (see :func:`tokenize_night_plan`)
+    into its runs, their nights and in those the individual blocks.
+
+    Runs or nights that are repeated replace the earlier ones
+    (at their position) and empty nights are dropped.
+    """
+    runs, nights, blocks = {}, {}, []
+    for kind, token in tokens:
+        if kind == "run":
+            runs[token] = nights = {}
+        elif kind == "night":
+            nights[token] = blocks = []
         else:
-            current_group["target"] = obj_name
-            current_group["mode"] = mode
-            current_group["array"] = array
-            current_group["res"] = res
-            current_group["type"] = ob_type
-            mode, array, res, ob_type = "", "", "", ""
+            blocks.append(token)
 
-    return [entry for entry in data if entry["cals"]]
+    return {
+        run_key: {night_key: night for night_key, night in nights.items() if night}
+        for run_key, nights in runs.items()
+    }
 
 
-def parse_file_section(lines: List, identifier: str) -> Dict:
-    """Parses the section of a file that corresponds to the given identifier
-    and returns a dict with the keys being the match to the identifier and
-    the values being a subset of the lines list.
+def get_night_plan_key(
+    night_plan: Path,
+    run_identifier: str | None = "run",
+    night_identifier: str | None = "night",
+) -> str:
+    """Gets the cache key of a night plan from the hash of its content
+    (and the identifiers by which it is parsed)."""
+    content_hash = hashlib.sha1(Path(night_plan).read_bytes()).hexdigest()
+    return get_cache_key(PARSER_VERSION, content_hash, run_identifier, night_identifier)
+
+
+def load_night_plan(
+    night_plan: Path,
+    run_identifier: str | None = "run",
+    night_identifier: str | None = "night",
+) -> Dict[str, Dict] | None:
+    """Loads the parsed night plan (see :func:`parse_night_plan_to_dict`)
+    from the cache, without parsing it.
 
     Parameters
     ----------
-    lines : list
-        The lines read from a file.
-    identifier : str
-        The identifier by which they should be split into subsets.
+    night_plan : path
+        The path to the night plan.
+    run_identifier : str, optional
+        The run-identifier by which the night plan is split into
+        individual runs.
+    night_identifier : str, optional
+        The night-identifier by which the runs are split into the
+        individual nights.
 
     Returns
-    --------
-    subset : dict
-        A dict that contains a subsets of the original lines.
+    -------
+    night_dict : dict, optional
+        The parsed night plan or "None" if it has not been parsed
+        before (or its content has changed since).
     """
-    indices, labels = [], []
-    for index, line in enumerate(lines):
-        if line.lower().startswith(identifier):
-            indices.append(index)
-            labels.append(line.strip())
+    key = get_night_plan_key(night_plan, run_identifier, night_identifier)
+    return load_cached(PLAN_CACHE, key, fmt="json")
+
 
-    if not indices:
-        indices, labels = [0], ["full_" + identifier]
+def iter_night_plan(
+    night_plan: Path,
+    run_identifier: str | None = "run",
+    night_identifier: str | None = "night",
+    cache: bool | None = None,
+) -> Iterator[Tuple[str, str, Dict]]:
+    """Parses the night plan created with `calibrator_find.pro` while it is
+    read and yields its blocks one at a time.
+
+    Parameters
+    ----------
+    night_plan : path
+        The path to the night plan, a (.txt)-file containing
+        the observations for one or more runs.
+    run_identifier : str, optional
+        The run-identifier by which the night plan is split into
+        individual runs.
+    night_identifier : str, optional
+        The night-identifier by which the runs are split into the
+        individual nights.
+    cache : bool, optional
+        If the blocks are loaded from (or, once all of them have been
+        yielded, saved to) the cache. Default is 'OPTIONS.cache.plans.active'.
+
+    Yields
+    ------
+    run_key : str
+        The run of the block.
+    night_key : str
+        The night of the block.
+    block : dict
+        The science target and its associated calibrators.
+
+    Notes
+    -----
+    Contrary to :func:`parse_night_plan_to_dict`, a run or night that is
+    repeated in the night plan does not replace the earlier one, but its
+    blocks are yielded again. The cache therefore keeps the yielded blocks
+    (not the parsed night plan).
+    """
+    night_plan = Path(night_plan)
+    if not night_plan.exists():
+        raise FileNotFoundError(f"File {night_plan.name} was not found/does not exist!")
 
-    sections = [
-        lines[index:] if index == indices[~0] else lines[index : indices[i + 1]]
-        for i, index in enumerate(indices)
-    ]
-    return dict(zip(labels, sections))
+    cache = OPTIONS.cache.plans.active if cache is None else cache
+    if cache:
+        key = get_cache_key(
+            get_night_plan_key(night_plan, run_identifier, night_identifier), "blocks"
+        )
+        cached_blocks = load_cached(PLAN_CACHE, key, fmt="json")
+        if cached_blocks is not None:
+            return (tuple(block) for block in cached_blocks)
+
+    def iter_blocks() -> Iterator[Tuple[str, str, Dict]]:
+        run_key = night_key = None
+        cached_blocks = []
+        with open(night_plan, "r", encoding="utf-8") as lines:
+            tokens = tokenize_night_plan(lines, run_identifier, night_identifier)
+            for kind, token in tokens:
+                if kind == "run":
+                    run_key = token
+                elif kind == "night":
+                    night_key = token
+                else:
+                    # NOTE: Copied, as the yielded blocks are updated by the caller
+                    if cache:
+                        cached_blocks.append((run_key, night_key, deepcopy(token)))
+                    yield run_key, night_key, token
+
+        if cache:
+            save_cached(PLAN_CACHE, key, cached_blocks, fmt="json")
+
+    # NOTE: The file is checked right away, but only read once iterated over
+    return iter_blocks()
+
+
+def get_night_plans(night_plans: Path | str | List[Path]) -> List[Path]:
+    """Gets the night plans from a directory (all (.txt)-files),
+    a glob pattern or a list of paths."""
+    if isinstance(night_plans, (list, tuple)):
+        return [Path(night_plan) for night_plan in night_plans]
+    if Path(night_plans).is_dir():
+        return sorted(Path(night_plans).glob("*.txt"))
+    return sorted(Path(path) for path in glob(str(night_plans)))
+
+
+def iter_night_plan_dict(night_plan: Dict) -> Iterator[Tuple[str, str, Dict]]:
+    """Yields the blocks of a parsed night plan (see
+    :func:`iter_night_plan`)."""
+    for run_key, nights in night_plan.items():
+        for night_key, night in nights.items():
+            for block in night:
+                yield run_key, night_key, block
 
 
 def parse_night_plan_to_dict(
     night_plan: Path,
     run_identifier: str | None = "run",
     night_identifier: str | None = "night",
+    cache: bool | None = None,
 ) -> Dict[str, Dict]:
     """Parses the night plan created with `calibrator_find.pro` into the
     individual runs as key of a dictionary.
@@ -315,6 +587,10 @@ def parse_night_plan_to_dict(
     night_identifier : str, optional
         The night-identifier by which the runs are split into the
         individual nights.
+    cache : bool, optional
+        If the parsed night plan is loaded from (or saved to) the cache,
+        where it is kept (as json) by the hash of the night plan's content.
+        Default is 'OPTIONS.cache.plans.active'.
 
     Returns
     -------
@@ -324,21 +600,262 @@ def parse_night_plan_to_dict(
         with their associated calibrators.
     """
     night_plan = Path(night_plan)
-    if night_plan.exists():
-        with open(night_plan, "r+", encoding="utf-8") as night_plan:
-            lines = night_plan.readlines()
-    else:
+    if not night_plan.exists():
         raise FileNotFoundError(f"File {night_plan.name} was not found/does not exist!")
 
-    runs = {}
-    for run_id, run in parse_file_section(lines, run_identifier).items():
-        nights = {}
-        for night_id, night in parse_file_section(run, night_identifier).items():
-            night_content = parse_groups(night)
+    cache = OPTIONS.cache.plans.active if cache is None else cache
+    if cache:
+        key = get_night_plan_key(night_plan, run_identifier, night_identifier)
+        night_dict = load_cached(PLAN_CACHE, key, fmt="json")
+        if night_dict is not None:
+            return night_dict
 
-            if night_content:
-                nights[night_id] = night_content
+    with open(night_plan, "r", encoding="utf-8") as lines:
+        tokens = tokenize_night_plan(lines, run_identifier, night_identifier)
+        night_dict = collect_night_plan(tokens)
 
-        runs[run_id] = nights
     # TODO: Raise error here if the parsed night plan is empty and suggest adding a white line at the end
-    return runs
+    if cache:
+        save_cached(PLAN_CACHE, key, night_dict, fmt="json")
+    return night_dict
+
+
+def diff_night_plans(
+    old_night_plan: Path | Dict,
+    new_night_plan: Path | Dict,
+    run_identifier: str | None = "run",
+    night_identifier: str | None = "night",
+) -> Dict[str, List]:
+    """Compares two revisions of a night plan block by block.
+
+    The blocks are matched by their run, night and science target (and,
+    if the target is observed several times in a night, its occurrence).
+    The order of the blocks within a night is not compared.
+
+    Parameters
+    ----------
+    old_night_plan : path or dict
+        The earlier night plan (or its parsed dictionary).
+    new_night_plan : path or dict
+        The later night plan (or its parsed dictionary).
+    run_identifier : str, optional
+        The run-identifier by which the night plans are split into
+        individual runs.
+    night_identifier : str, optional
+        The night-identifier by which the runs are split into the
+        individual nights.
+
+    Returns
+    -------
+    diff : dict
+        The "added" and "removed" blocks as (run_key, night_key, block)
+        and the "changed" blocks as (run_key, night_key, old_block, new_block).
+    """
+
+    def index_blocks(night_plan: Path | Dict) -> Dict[Tuple, Dict]:
+        """Indexes the blocks of a night plan by their run, night and target."""
+        if not isinstance(night_plan, dict):
+            night_plan = parse_night_plan_to_dict(
+                night_plan, run_identifier, night_identifier
+            )
+
+        blocks, occurrences = {}, Counter()
+        for run_key, night_key, block in iter_night_plan_dict(night_plan):
+            block_key = (run_key, night_key, block["target"])
+            blocks[(*block_key, occurrences[block_key])] = block
+            occurrences[block_key] += 1
+        return blocks
+
+    old_blocks = index_blocks(old_night_plan)
+    new_blocks = index_blocks(new_night_plan)
+    return {
+        "added": [
+            (*key[:2], block)
+            for key, block in new_blocks.items()
+            if key not in old_blocks
+        ],
+        "removed": [
+            (*key[:2], block)
+            for key, block in old_blocks.items()
+            if key not in new_blocks
+        ],
+        "changed": [
+            (*key[:2], old_blocks[key], block)
+            for key, block in new_blocks.items()
+            if key in old_blocks and old_blocks[key] != block
+        ],
+    }
+
+
+def split_cell(cell: Any) -> List[str]:
+    """Splits a cell of a night plan table into its values (either
+    a sequence or a string separated by "," or ";")."""
+    if not isinstance(cell, str) and isinstance(cell, Iterable):
+        return [str(value).strip() for value in cell]
+    # NOTE: Empty cells are either "None" or "NaN" (which is not equal to itself)
+    if cell is None or cell != cell:
+        return []
+    return [value for value in CELL_SEPARATOR.split(str(cell).strip()) if value]
+
+
+def normalize_setting(column: "pd.Series", setting: str) -> "pd.Series":
+    """Normalizes the values of a column to those of a setting (see
+    :data:`KEYWORDS`), which is done once for each unique value."""
+    values = set(KEYWORDS[setting].values())
+    mapping = {
+        value: value if value in values else get_setting(value.lower(), setting)
+        for value in column.unique()
+    }
+    normalized = column.map(mapping)
+    invalid = column[(normalized == "") & (column != "")].unique()
+    if invalid.size:
+        raise IOError(f"Unknown {setting} in night plan table: {', '.join(invalid)}!")
+    return normalized
+
+
+def read_night_plan_table(
+    table: "pd.DataFrame | Table | Path",
+) -> "pd.DataFrame":
+    """Reads a night plan table and fills in the defaults of its columns
+    (see :data:`TABLE_COLUMNS`).
+
+    Parameters
+    ----------
+    table : pandas.DataFrame or astropy.table.Table or path
+        The night plan table or a (.csv)-file containing it.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        The table with all columns.
+    """
+    import pandas as pd
+    from astropy.table import Table
+
+    if isinstance(table, Table):
+        table = pd.DataFrame({name: table[name].tolist() for name in table.colnames})
+    elif not isinstance(table, pd.DataFrame):
+        table = pd.read_csv(table, dtype=str, keep_default_na=False, comment="#")
+
+    table = table.rename(columns=lambda name: str(name).strip().lower())
+    table = table.rename(columns=TABLE_ALIASES).reset_index(drop=True)
+    for column in ("target", "calibrators"):
+        if column not in table:
+            raise IOError(f"The night plan table has no '{column}' column!")
+
+    for column, default in TABLE_COLUMNS.items():
+        if column not in table:
+            table[column] = default
+        elif column in TABLE_SETTINGS or column in ("run", "night"):
+            values = table[column].fillna("").astype(str).str.strip()
+            table[column] = values.mask(values == "", default)
+    return table
+
+
+def parse_night_plan_table(
+    table: "pd.DataFrame | Table | Path",
+) -> Dict[str, Dict]:
+    """Parses a night plan table into the individual runs, their nights
+    and in those the individual blocks (see :func:`parse_night_plan_to_dict`).
+
+    Each row is a science target with its calibrators. The calibrators'
+    orders ("b"/"before" or "a"/"after") and tags are given either for
+    each calibrator or once for all of them. The settings of the targets
+    are broadcast from the columns.
+
+    Parameters
+    ----------
+    table : pandas.DataFrame or astropy.table.Table or path
+        The night plan table or a (.csv)-file containing it. It has the
+        columns "target", "calibrators" and optionally "order", "tag",
+        "resolution", "configuration", "mode", "type", "run" and "night"
+        (see :data:`TABLE_COLUMNS` for the defaults). Multiple calibrators
+        (and their orders and tags) are given as lists or separated by
+        "," or ";".
+
+    Returns
+    -------
+    night_dict : dict
+        A dictionary containing the individual runs, their nights
+        and in those the individual observing blocks for the science targets
+        with their associated calibrators.
+    """
+    import numpy as np
+    import pandas as pd
+
+    table = read_night_plan_table(table)
+    targets = table["target"].fillna("").astype(str).str.strip()
+    if (targets == "").any():
+        raise IOError("All rows of the night plan table need a target!")
+
+    calibrators = table["calibrators"].map(split_cell)
+    counts = calibrators.map(len).to_numpy()
+    if (counts == 0).any():
+        missing = ", ".join(targets[counts == 0])
+        raise IOError(f"Please input the calibrators (of {missing})!")
+
+    cals = {}
+    for column in ("order", "tag"):
+        default = TABLE_COLUMNS[column]
+        cells = table[column].map(lambda cell: split_cell(cell) or [default])
+        lengths = cells.map(len).to_numpy()
+        if ((lengths != 1) & (lengths != counts)).any():
+            mismatched = ", ".join(targets[(lengths != 1) & (lengths != counts)])
+            raise IOError(f"The {column}s do not match the calibrators ({mismatched})!")
+
+        values = pd.Series(
+            np.concatenate(
+                [
+                    np.repeat(cell, count) if len(cell) == 1 else cell
+                    for cell, count in zip(cells, counts)
+                ]
+            )
+        )
+        if column == "order":
+            values = values.str.lower().str[0]
+            if not values.isin(["a", "b"]).all():
+                raise IOError("The orders of the calibrators must be 'b' or 'a'!")
+        cals[column] = values.to_numpy()
+
+    settings = {
+        column: normalize_setting(table[column], setting)
+        for column, setting in TABLE_SETTINGS.items()
+    }
+    run_array = table["run"].map(parse_array_config)
+    missing = (settings["configuration"] == "") & (run_array == "")
+    if missing.any():
+        raise IOError(
+            "Please input the array configuration"
+            f" (of {', '.join(targets[missing])})!"
+        )
+
+    names = np.concatenate(calibrators.to_list())
+    bounds = np.cumsum(counts)[:-1]
+    blocks = zip(
+        np.split(names, bounds),
+        np.split(cals["order"], bounds),
+        np.split(cals["tag"], bounds),
+        targets,
+        settings["mode"],
+        settings["configuration"],
+        settings["resolution"],
+        settings["type"],
+    )
+
+    night_plan = {}
+    for run_key, night_key, block in zip(table["run"], table["night"], blocks):
+        names, orders, tags, target, mode, array, res, ob_type = block
+        night_plan.setdefault(run_key, {}).setdefault(night_key, []).append(
+            {
+                "cals": [
+                    {"name": str(name), "order": str(order), "tag": str(tag)}
+                    for name, order, tag in zip(names, orders, tags)
+                ],
+                "target": target,
+                "mode": mode,
+                "array": array,
+                "res": res,
+                "type": ob_type,
+            }
+        )
+    return night_plan
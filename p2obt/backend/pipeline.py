@@ -0,0 +1,164 @@
+import logging
+import queue
+import threading
+from contextvars import copy_context
+from typing import Any, Callable, Iterable, List
+
+from .memory import track_memory
+from .profiling import profile_thread, snapshot_memory
+
+DONE = object()
+
+
+class Stage:
+    """A stage of a pipeline that applies a function to each item with its
+    own worker threads.
+
+    Parameters
+    ----------
+    name : str
+        The stage's name.
+    function : callable
+        The function applied to each item. It returns the (processed) item
+        that is then passed on to the next stage or "None" to drop it.
+    workers : int, optional
+        The number of worker threads. Default is 1.
+    """
+
+    def __init__(self, name: str, function: Callable, workers: int = 1) -> None:
+        self.name, self.function, self.workers = name, function, max(1, workers)
+
+
+def run_pipeline(
+    source: Iterable, stages: List[Stage], queue_size: int = 16
+) -> List[Any]:
+    """Runs the items of a source through a pipeline of stages.
+
+    All stages run concurrently and are connected by bounded queues, so
+    that a slow stage applies backpressure to the previous ones instead
+    of letting items pile up. The source is consumed in the calling
+    thread. If any stage raises an error, the pipeline is stopped and
+    the error is re-raised.
+
+    Parameters
+    ----------
+    source : iterable
+        The items to process (e.g., a generator).
+    stages : list of Stage
+        The stages, in order.
+    queue_size : int, optional
+        The maximum number of items waiting in front of each stage.
+
+    Returns
+    -------
+    results : list
+        The items that passed through all the stages. The order
+        can differ from the source's order for stages with more than
+        one worker.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    results, errors = [], []
+    stop = threading.Event()
+
+    def put(output_queue: queue.Queue, item: Any) -> bool:
+        """Puts an item into a queue unless the pipeline has been stopped."""
+        while not stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def process(stage: Stage, input_queue: queue.Queue, output_queue: queue.Queue):
+        while True:
+            item = input_queue.get()
+            if item is DONE:
+                # NOTE: Pass on the sentinel to the other workers of this stage
+                input_queue.put(DONE)
+                break
+            if stop.is_set():
+                continue
+            try:
+                with track_memory(stage.name):
+                    item = stage.function(item)
+            except BaseException as error:
+                logging.error(f"Stage '{stage.name}' failed!", exc_info=True)
+                errors.append(error)
+                stop.set()
+                continue
+            if item is not None:
+                put(output_queue, item)
+
+    def work(stage: Stage, input_queue: queue.Queue, output_queue: queue.Queue):
+        try:
+            profile_thread(process)(stage, input_queue, output_queue)
+        except BaseException as error:
+            logging.error(f"Worker of stage '{stage.name}' failed!", exc_info=True)
+            errors.append(error)
+            stop.set()
+            # NOTE: Drain the input, so that the previous stage never blocks
+            while input_queue.get() is not DONE:
+                continue
+            input_queue.put(DONE)
+        finally:
+            with lock:
+                remaining[stage.name] -= 1
+                if remaining[stage.name] == 0:
+                    snapshot_memory(stage.name)
+                    output_queue.put(DONE)
+
+    def collect():
+        while (item := queues[-1].get()) is not DONE:
+            results.append(item)
+
+    # NOTE: The workers run in a copy of the caller's context (e.g., the log
+    # context) and are profiled with it (if the run is profiled)
+    lock = threading.Lock()
+    remaining = {stage.name: stage.workers for stage in stages}
+    threads = [threading.Thread(target=collect, daemon=True)]
+    for index, stage in enumerate(stages):
+        for worker in range(stage.workers):
+            threads.append(
+                threading.Thread(
+                    target=copy_context().run,
+                    args=(
+                        work,
+                        stage,
+                        queues[index],
+                        queues[index + 1],
+                    ),
+                    name=f"{stage.name}-{worker}",
+                    daemon=True,
+                )
+            )
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in source:
+            if not put(queues[0], item):
+                break
+    except BaseException as error:
+        errors.append(error)
+        stop.set()
+    finally:
+        queues[0].put(DONE)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def run_stages(item: Any, stages: List[Stage]) -> Any:
+    """Runs a single item through the stages sequentially (in the
+    calling thread)."""
+    for stage in stages:
+        item = stage.function(item)
+        snapshot_memory(stage.name)
+        if item is None:
+            break
+    return item
@@ -0,0 +1,257 @@
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, Tuple
+
+from ..config.options import OPTIONS
+
+# NOTE: The environment variable that enables the profiling (e.g.,
+# "P2OBT_PROFILE=sample") without changing the code
+PROFILE_ENV = "P2OBT_PROFILE"
+PROFILERS = ["cprofile", "sample"]
+
+
+class Profiler:
+    """Profiles a run (of all its threads) and saves the results.
+
+    Parameters
+    ----------
+    kind : str
+        Either "cprofile" for a deterministic profile (saved as a (.pstats)-file)
+        or "sample" for a sampling profiler (saved as collapsed stacks,
+        a (.collapsed)-file, for flamegraphs).
+    directory : path
+        The directory in which the results are saved.
+    interval : float, optional
+        The interval (in seconds) between the samples of the sampling profiler.
+        Default is 'OPTIONS.profile.interval'.
+    memory : bool, optional
+        If 'True' the allocations are traced (with `tracemalloc`) and
+        snapshots are saved at the start, after each stage and at the end.
+        Default is 'OPTIONS.profile.memory'.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        directory: Path,
+        interval: float | None = None,
+        memory: bool | None = None,
+    ) -> None:
+        if kind not in PROFILERS:
+            raise IOError(
+                f"Unknown profiler '{kind}'! Choose from {', '.join(PROFILERS)}."
+            )
+        self.kind, self.directory = kind, Path(directory)
+        self.interval = interval or OPTIONS.profile.interval
+        self.memory = OPTIONS.profile.memory if memory is None else memory
+        self.profiles, self.stacks = [], Counter()
+        self.snapshots: List[Tuple[str, tracemalloc.Snapshot]] = []
+        self._stop = threading.Event()
+        self._sampler = self._profile = None
+        self._tracing = False
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Starts profiling (the calling thread and, for "sample", all threads)."""
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(OPTIONS.profile.frames)
+                self._tracing = True
+            self.snapshot("start")
+
+        if self.kind == "cprofile":
+            import cProfile
+
+            self._profile = cProfile.Profile()
+            self.profiles.append(self._profile)
+            self._profile.enable()
+        else:
+            self._sampler = threading.Thread(
+                target=self.sample, name="p2obt-sampler", daemon=True
+            )
+            self._sampler.start()
+
+    def stop(self) -> None:
+        """Stops profiling."""
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        if self.memory:
+            self.snapshot("end")
+            if self._tracing:
+                tracemalloc.stop()
+
+    def sample(self) -> None:
+        """Samples the stacks of all (other) threads until stopped."""
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == threading.get_ident():
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    module = Path(code.co_filename).stem
+                    stack.append(f"{code.co_name} ({module}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def wrap(self, function: Callable) -> Callable:
+        """Wraps a function that is run in another thread (e.g., a pipeline's
+        worker), so that it is profiled as well (for "cprofile")."""
+        # NOTE: From Python 3.12 on, `cProfile` uses `sys.monitoring`, which is
+        # global to the interpreter. The profile enabled in `start` then sees all
+        # threads and enabling another one raises a "ValueError"
+        if self.kind != "cprofile" or sys.version_info >= (3, 12):
+            return function
+
+        def profiled(*args, **kwargs):
+            import cProfile
+
+            profile = cProfile.Profile()
+            with self._lock:
+                self.profiles.append(profile)
+            profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.disable()
+
+        return profiled
+
+    def snapshot(self, name: str) -> None:
+        """Takes a snapshot of the traced allocations (if 'memory' is set)."""
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)]
+            )
+            with self._lock:
+                self.snapshots.append((name, snapshot))
+
+    def save(self) -> List[Path]:
+        """Saves the results to the directory.
+
+        Returns
+        -------
+        files : list of path
+            The saved files. For "cprofile" a (.pstats)-file (e.g., for
+            `snakeviz` or `pstats`) and the top functions as text, for "sample"
+            the collapsed stacks (e.g., for `flamegraph.pl` or `speedscope`).
+            If 'memory' is set, the snapshots (see `tracemalloc.Snapshot.load`)
+            and the largest allocations between them as text.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        if self.kind == "cprofile":
+            import pstats
+
+            stats = pstats.Stats(*self.profiles)
+            files.append(self.directory / "p2obt.pstats")
+            stats.dump_stats(files[-1])
+            files.append(self.directory / "p2obt.txt")
+            with open(files[-1], "w", encoding="utf-8") as text_file:
+                stats.stream = text_file
+                stats.sort_stats("cumulative").print_stats(50)
+        else:
+            files.append(self.directory / "p2obt.collapsed")
+            lines = (f"{stack} {count}" for stack, count in self.stacks.items())
+            files[-1].write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+        if self.snapshots:
+            lines = []
+            for index, (name, snapshot) in enumerate(self.snapshots):
+                files.append(self.directory / f"{index:02d}_{name}.tracemalloc")
+                snapshot.dump(str(files[-1]))
+                if index == 0:
+                    continue
+
+                previous_name, previous = self.snapshots[index - 1]
+                statistics = snapshot.compare_to(previous, "lineno")
+                size = sum(stat.size_diff for stat in statistics)
+                lines.append(f"{previous_name} -> {name}: {size / 1024**2:+.2f} MiB")
+                lines.extend(f"    {stat}" for stat in statistics[:10])
+            files.append(self.directory / "memory.txt")
+            files[-1].write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return files
+
+
+PROFILER: ContextVar[Profiler | None] = ContextVar("profiler", default=None)
+
+
+def get_profile_kind(profile: str | bool | None) -> str | None:
+    """Gets the profiler to use from the 'profile' argument or, if not
+    given, the environment variable "P2OBT_PROFILE" ("1" is "cprofile"
+    and "0" disables the profiling)."""
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV)
+    if isinstance(profile, str):
+        profile = profile.strip().lower()
+    if profile in [True, "1", "true", "yes"]:
+        return "cprofile"
+    if profile in [None, False, "", "0", "false", "no"]:
+        return None
+    return profile
+
+
+@contextmanager
+def profile_run(
+    profile: str | bool | None, output_dir: Path | None = None
+) -> Iterator[Profiler | None]:
+    """Profiles everything run within (including the threads of the pipeline)
+    if a profiler is requested (see :func:`get_profile_kind`).
+
+    The results are saved to "profiles/<time>" in the output directory
+    (or, if not given, in 'OPTIONS.log.path').
+
+    Parameters
+    ----------
+    profile : str or bool, optional
+        The profiler, either "cprofile" (or 'True') or "sample" (see
+        :class:`Profiler`). If "None", the environment variable
+        "P2OBT_PROFILE" is used.
+    output_dir : path, optional
+        The output directory.
+    """
+    kind = get_profile_kind(profile)
+    if kind is None:
+        yield None
+        return
+
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    directory = Path(output_dir or OPTIONS.log.path) / "profiles" / timestamp
+    profiler = Profiler(kind, directory)
+    token = PROFILER.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        PROFILER.reset(token)
+        profiler.save()
+        print(f"Profile was saved in {directory}.")
+
+
+def profile_thread(function: Callable) -> Callable:
+    """Wraps a function that is run in another thread, so that it is
+    profiled (if a run is profiled, see :func:`profile_run`)."""
+    profiler = PROFILER.get()
+    return function if profiler is None else profiler.wrap(function)
+
+
+def snapshot_memory(name: str) -> None:
+    """Takes a snapshot of the allocations (if a run is profiled with
+    'OPTIONS.profile.memory', see :class:`Profiler`)."""
+    if (profiler := PROFILER.get()) is not None:
+        profiler.snapshot(name)
@@ -1,16 +1,18 @@
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List
-
-import astropy.units as u
-import pandas as pd
-from astropy.table import Table
-from astroquery.ipac.irsa.irsa_dust import IrsaDust
-from astroquery.simbad import Simbad
-from astroquery.vizier import Vizier
+from typing import TYPE_CHECKING, Any, Dict, List
 
 from ..config.options import OPTIONS
+from .cache import get_cache_key, load_cached, save_cached
+from .logger import setup_logging
+from .metrics import increment, observe, timed
 from .utils import add_space, remove_parenthesis
 
+# NOTE: Astropy and astroquery are only imported once a target is queried
+if TYPE_CHECKING:
+    import astropy.units as u
+    from astropy.table import Table
+
 TARGET_INFO_FILE = list((Path(__file__).parent.parent / "config").glob("*.xlsx"))[0]
 TARGET_INFO_MAPPING = {
     "local.RA": "RA [hms]",
@@ -35,6 +37,66 @@ TARGET_INFO_MAPPING = {
 }
 
 
+def record_result(catalog: str, table: "Table | None") -> None:
+    """Records the rows and the size (in bytes) of a catalog's result and
+    if it is empty (see :func:`get_catalog_telemetry`)."""
+    rows = len(table) if table else 0
+    size = sum(column.nbytes for column in table.itercols()) if rows else 0
+    observe(f"query.{catalog}.rows", rows)
+    observe(f"query.{catalog}.bytes", size)
+    if not rows:
+        increment(f"query.{catalog}.empty")
+
+
+def get_catalog_telemetry(summary: Dict[str, Any]) -> Dict[str, Dict]:
+    """Gets the telemetry of the catalogs from the metrics of a run.
+
+    Parameters
+    ----------
+    summary : dict
+        The metrics' summary (see :meth:`Metrics.summary <p2obt.backend.metrics.Metrics.summary>`),
+        e.g., "summary['metrics']" as returned by :func:`create_obs <p2obt.automate.create_obs>`.
+
+    Returns
+    -------
+    telemetry : dict
+        For each catalog (and the dust extinction), the number of queries,
+        the total time (in seconds) and the percentiles of the latency,
+        the mean rows and bytes returned, the empty results and errors.
+        The query cache's hits and misses are under "cache".
+    """
+    timings, values = summary["timings"], summary.get("values", {})
+    counters = summary["counters"]
+    telemetry = {}
+    for name, timing in timings.items():
+        catalog = name.split(".", 1)[-1]
+        if not name.startswith("query.") or "." in catalog:
+            continue
+        rows = values.get(f"{name}.rows", {})
+        size = values.get(f"{name}.bytes", {})
+        telemetry[catalog] = {
+            "queries": timing["count"],
+            "time": timing["total"],
+            "p50": timing["p50"],
+            "p95": timing["p95"],
+            "p99": timing["p99"],
+            "rows": rows.get("mean", 0),
+            "bytes": size.get("mean", 0),
+            "empty": counters.get(f"{name}.empty", 0),
+            "errors": counters.get(f"{name}.errors", 0),
+        }
+
+    hits = counters.get("query.cache.hits", 0)
+    misses = counters.get("query.cache.misses", 0)
+    if hits or misses:
+        telemetry["cache"] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses),
+        }
+    return telemetry
+
+
 def query_dust_extinction(name: str) -> Dict:
     """Queries the dust extinctions for the specified target.
 
@@ -48,14 +110,38 @@ def query_dust_extinction(name: str) -> Dict:
     target : dict
         The target's queried information.
     """
+    from astroquery.ipac.irsa.irsa_dust import IrsaDust
+
     extinctions = {}
-    table = IrsaDust.get_extinction_table(name)
+    with timed("query.extinction"):
+        table = IrsaDust.get_extinction_table(name)
+    record_result("extinction", table)
     for band in OPTIONS.catalogs.irsa.query:
         extinction = table[OPTIONS.catalogs.irsa.fields][table["Filter_name"] == band]
         extinctions[f"A_{band[-1]}"] = extinction[0][0]
     return extinctions
 
 
+@lru_cache(maxsize=None)
+def load_local_catalog(sheet_name: str) -> "Table":
+    """Loads a sheet of the local catalog (once per process, as reading
+    the excel sheet is slow). Changes to the file need a restart."""
+    import pandas as pd
+    from astropy.table import Table
+
+    return Table.from_pandas(pd.read_excel(TARGET_INFO_FILE, sheet_name=sheet_name))
+
+
+def get_local_sheet() -> str | None:
+    """Gets the sheet of the local catalog that is active
+    (see 'OPTIONS.catalogs.local')."""
+    if OPTIONS.catalogs.local.active == "standard":
+        return OPTIONS.catalogs.local.standard
+    elif OPTIONS.catalogs.local.active == "ciao":
+        return OPTIONS.catalogs.local.ciao
+    return None
+
+
 # TODO: Implement match statement here
 def query_local_catalog(name: str):
     """
@@ -69,22 +155,19 @@ def query_local_catalog(name: str):
     -------
     target : Dict
     """
-    if OPTIONS.catalogs.local.active == "standard":
-        sheet_name = OPTIONS.catalogs.local.standard
-    elif OPTIONS.catalogs.local.active == "ciao":
-        sheet_name = OPTIONS.catalogs.local.ciao
-
-    catalog = pd.read_excel(TARGET_INFO_FILE, sheet_name=sheet_name)
-    catalog = Table.from_pandas(catalog)
+    with timed("query.local"):
+        catalog = load_local_catalog(get_local_sheet())
     if not any(
         name in catalog[column_name] for column_name in ["Target Name", "Other Names"]
     ):
+        record_result("local", None)
         return {}
 
     if name in catalog["Target Name"]:
         row = catalog[catalog["Target Name"] == name]
     elif name in catalog["Other Names"]:
         row = catalog[catalog["Other Names"] == name]
+    record_result("local", row)
 
     target = {}
     for query_key, query_mapping in TARGET_INFO_MAPPING.items():
@@ -94,7 +177,7 @@ def query_local_catalog(name: str):
 
 
 # TODO: Add query of the magnitude from Simbad?
-def get_best_match(target: Dict, catalog: str, catalog_table: Table) -> Table:
+def get_best_match(target: Dict, catalog: str, catalog_table: "Table") -> "Table":
     """Gets the best match from the catalog entries
 
     Parameters
@@ -138,7 +221,7 @@ def get_best_match(target: Dict, catalog: str, catalog_table: Table) -> Table:
     return best_matches
 
 
-def get_catalog(name: str, catalog: str, match_radius: u.arcsec = 5.0):
+def get_catalog(name: str, catalog: str, match_radius: "u.arcsec" = 5.0):
     """Queries the specified catalog.
 
     Parameters
@@ -156,6 +239,10 @@ def get_catalog(name: str, catalog: str, match_radius: u.arcsec = 5.0):
     catalog_table : Table
         The table containing the queried catalog's results.
     """
+    import astropy.units as u
+    from astroquery.simbad import Simbad
+    from astroquery.vizier import Vizier
+
     if not isinstance(match_radius, u.Quantity):
         match_radius *= u.arcsec
     else:
@@ -164,22 +251,59 @@ def get_catalog(name: str, catalog: str, match_radius: u.arcsec = 5.0):
                 "The match radius has to be in" " astropy.units.arcsecond."
             )
 
-    if catalog == "simbad":
-        query_site = Simbad()
-        simbad_fields = OPTIONS.catalogs.simbad.fields
-        query_site.add_votable_fields(*simbad_fields)
-        catalog_table = query_site.query_object(name)
-    else:
-        data = getattr(OPTIONS.catalogs, catalog)
-        query_site = Vizier(catalog=data.catalog, columns=data.fields)
-        catalog_table = query_site.query_object(name, radius=match_radius)
-
-        # NOTE: Only get table from TableList if not empty
-        if catalog_table:
-            catalog_table = catalog_table[0]
+    with timed(f"query.{catalog}"):
+        if catalog == "simbad":
+            query_site = Simbad()
+            simbad_fields = OPTIONS.catalogs.simbad.fields
+            query_site.add_votable_fields(*simbad_fields)
+            catalog_table = query_site.query_object(name)
+        else:
+            data = getattr(OPTIONS.catalogs, catalog)
+            query_site = Vizier(catalog=data.catalog, columns=data.fields)
+            catalog_table = query_site.query_object(name, radius=match_radius)
+
+            # NOTE: Only get table from TableList if not empty
+            if catalog_table:
+                catalog_table = catalog_table[0]
+    record_result(catalog, catalog_table)
     return catalog_table
 
 
+def get_catalogs(
+    catalogs: List | None = None, exclude_catalogs: List | None = None
+) -> List[str]:
+    """Gets the catalogs to query (by default 'OPTIONS.catalogs.available')
+    without the excluded ones."""
+    if catalogs is None:
+        catalogs = OPTIONS.catalogs.available
+    return [catalog for catalog in catalogs if catalog not in (exclude_catalogs or [])]
+
+
+def get_query_key(
+    target_name: str,
+    catalogs: List | None = None,
+    exclude_catalogs: List | None = None,
+    match_radius: float | None = 5.0,
+    query_exinction: bool | None = False,
+) -> str:
+    """Gets the key of a target's query in the cache (see :func:`query`).
+
+    The key is made from the resolved catalogs (with the options in effect,
+    see :func:`get_catalogs`) and, if the local catalog is queried, its
+    active sheet, so that a query with other catalog options does not
+    reuse the cached result.
+    """
+    catalogs = get_catalogs(catalogs, exclude_catalogs)
+    return get_cache_key(
+        target_name,
+        catalogs,
+        sorted(exclude_catalogs or []),
+        match_radius,
+        query_exinction,
+        get_local_sheet() if "local" in catalogs else None,
+    )
+
+
 # TODO: Make a pretty print built in functionality for the dictionary.
 def query(
     target_name: str,
@@ -209,14 +333,31 @@ def query(
     -------
     target : dict
         The target's queried information.
+
+    Notes
+    -----
+    If 'OPTIONS.cache.query.active' is set, the results are cached
+    (in 'OPTIONS.cache.path') and reused until they expire. If
+    'OPTIONS.cache.query.offline' is set, only the cached results are used
+    and a target that is not cached raises a `KeyError`.
     """
+    setup_logging()
+    cache = OPTIONS.cache.query
+    if cache.active or cache.offline:
+        cache_key = get_query_key(
+            target_name, catalogs, exclude_catalogs, match_radius, query_exinction
+        )
+        ttl = None if cache.offline else cache.ttl
+        cached_target = load_cached("queries", cache_key, ttl)
+        increment(f"query.cache.{'misses' if cached_target is None else 'hits'}")
+        if cached_target is not None:
+            return cached_target
+        if cache.offline:
+            raise KeyError(f"Target '{target_name}' is not cached (offline)!")
+
     target_name = add_space(target_name)
     target = {"name": target_name}
-    if catalogs is None:
-        catalogs = OPTIONS.catalogs.available[:]
-
-    if exclude_catalogs is not None:
-        catalogs = [catalog for catalog in catalogs if catalog not in exclude_catalogs]
+    catalogs = get_catalogs(catalogs, exclude_catalogs)
     if "local" in catalogs:
         local_target = query_local_catalog(target_name)
         catalogs.remove("local")
@@ -230,4 +371,7 @@ def query(
 
     target["name"] = remove_parenthesis(target["name"])
     dust_target = query_dust_extinction(target["name"]) if query_exinction else {}
-    return {**target, **local_target, **dust_target}
+    target = {**target, **local_target, **dust_target}
+    if cache.active:
+        save_cached("queries", cache_key, target)
+    return target
@@ -0,0 +1,308 @@
+import copy
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import p2api
+
+from ..config.options import OPTIONS
+from .upload import create_remote_container
+
+CONTAINER_TYPES = {
+    "Folder": "folder",
+    "Group": "group",
+    "TimeLink": "timelink",
+    "Concatenation": "concatenation",
+}
+
+
+def to_serializable(value: Any) -> Any:
+    """Converts (numpy) values that json cannot serialise by default."""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class RecordingConnection:
+    """A stand-in for the P2 python api connection that records the
+    intended operations instead of calling p2 (offline).
+
+    Created items get symbolic references (e.g., "$3") and the runs are
+    referenced by their program id (e.g., "run:110.2474.004"), which are
+    resolved when the operations are replayed (see :func:`replay`).
+
+    Parameters
+    ----------
+    runs : list of str, optional
+        The program ids of the runs that can be looked up.
+    """
+
+    def __init__(self, runs: List[str] | None = None) -> None:
+        self.runs = runs or []
+        self.operations, self.count = [], 0
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def record(self, op: str, **kwargs) -> str:
+        """Records an operation and returns its symbolic reference."""
+        with self.lock:
+            self.count += 1
+            self.request_count += 1
+            reference = f"${self.count}"
+            self.operations.append({"op": op, "ref": reference, **kwargs})
+        return reference
+
+    def getRuns(self) -> Tuple[List[Dict], None]:
+        return [
+            {"progId": prog_id, "containerId": f"run:{prog_id}"}
+            for prog_id in self.runs
+        ], None
+
+    def createItem(self, itemType: str, containerId: int | str, name: str):
+        if itemType == "OB":
+            return self.createOB(containerId, name)
+        reference = self.record(
+            "container", parent=containerId, type=itemType, name=name
+        )
+        return {"containerId": reference, "itemType": itemType, "name": name}, None
+
+    def createFolder(self, containerId: int | str, name: str):
+        return self.createItem("Folder", containerId, name)
+
+    def createGroup(self, containerId: int | str, name: str):
+        return self.createItem("Group", containerId, name)
+
+    def createConcatenation(self, containerId: int | str, name: str):
+        return self.createItem("Concatenation", containerId, name)
+
+    def createTimeLink(self, containerId: int | str, name: str):
+        return self.createItem("TimeLink", containerId, name)
+
+    def createOB(self, containerId: int | str, name: str):
+        reference = self.record("ob", parent=containerId, name=name)
+        ob = {
+            "obId": reference,
+            "name": name,
+            "obsDescription": {},
+            "target": {},
+            "constraints": {},
+        }
+        return ob, None
+
+    def saveOB(self, ob: Dict, version: None):
+        fields = {
+            key: value
+            for key, value in ob.items()
+            if key not in ["obId", "name"] and value
+        }
+        self.record("save_ob", ob=ob["obId"], fields=fields)
+        return ob, None
+
+    def createTemplate(self, obId: str, name: str):
+        reference = self.record("template", ob=obId, name=name)
+        return {"templateId": reference, "templateName": name}, None
+
+    def setTemplateParams(self, obId: str, template: Dict, params: Dict, version):
+        self.record(
+            "template_params", ob=obId, template=template["templateId"], params=params
+        )
+        return template, None
+
+    def save(self, file: Path) -> None:
+        """Saves the recorded operations as a (.jsonl)-file."""
+        file = Path(file)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        with open(file, "w", encoding="utf-8") as log_file:
+            for operation in self.operations:
+                log_file.write(
+                    json.dumps(
+                        operation, default=to_serializable, separators=(",", ":")
+                    )
+                    + "\n"
+                )
+        print(f"Recorded {len(self.operations)} operations to '{file}'.")
+
+
+def load_operations(file: Path) -> List[Dict]:
+    """Loads the recorded operations from a (.jsonl)-file."""
+    with open(file, "r", encoding="utf-8") as log_file:
+        return [json.loads(line) for line in log_file if line.strip()]
+
+
+def update_nested(content: Dict, fields: Dict) -> None:
+    """Updates a (nested) dictionary with the (nested) fields."""
+    for key, value in fields.items():
+        if isinstance(value, dict) and isinstance(content.get(key), dict):
+            update_nested(content[key], value)
+        else:
+            content[key] = value
+
+
+def replay(
+    file: Path,
+    connection: p2api.p2api.ApiConnection,
+    workers: int | None = None,
+) -> Dict[str, int]:
+    """Replays recorded operations (see :class:`RecordingConnection`) to p2.
+
+    The items of different containers are created concurrently, while
+    the items within a container are created in their recorded order
+    (as the order within a container on p2 is the order of creation).
+
+    Parameters
+    ----------
+    file : path
+        The (.jsonl)-file with the recorded operations.
+    connection : p2api.p2api.ApiConnection
+        The P2 python api connection.
+    workers : int, optional
+        The number of containers that are filled concurrently.
+        Default is 'OPTIONS.pipeline.workers.upload'.
+
+    Returns
+    -------
+    summary : dict
+        The number of replayed and failed operations.
+    """
+    operations = load_operations(file)
+    lanes, ob_operations = {}, {}
+    for operation in operations:
+        if operation["op"] in ["container", "ob"]:
+            lanes.setdefault(str(operation["parent"]), []).append(operation)
+        else:
+            ob_operations.setdefault(operation["ob"], []).append(operation)
+
+    created = {operation["ref"] for operation in operations}
+    references, runs = {}, {}
+    summary = {"operations": 0, "failed": 0}
+    lock, pending, finished = threading.Lock(), [0], threading.Event()
+    futures = []
+    executor = ThreadPoolExecutor(
+        max_workers=workers or OPTIONS.pipeline.workers.upload
+    )
+
+    def resolve(reference: int | str) -> int:
+        """Resolves a symbolic reference to the id on p2."""
+        if isinstance(reference, int) or str(reference).isdigit():
+            return int(reference)
+        if reference.startswith("run:"):
+            with lock:
+                if not runs:
+                    runs.update(
+                        {
+                            run["progId"]: run["containerId"]
+                            for run in connection.getRuns()[0]
+                        }
+                    )
+            return runs[reference.removeprefix("run:")]
+        return references[reference]
+
+    def get_size(reference: str) -> int:
+        """Gets the number of operations of an item (including the ones
+        on its OB or of its contained items)."""
+        return (
+            1
+            + len(ob_operations.get(reference, []))
+            + sum(get_size(operation["ref"]) for operation in lanes.get(reference, []))
+        )
+
+    def count(key: str, number: int = 1) -> None:
+        with lock:
+            summary[key] += number
+
+    def fail(name: str, number: int) -> None:
+        """Reports a failed operation and counts it (and the operations
+        depending on it) as failed."""
+        print(f"[ERROR]: Failed replaying '{name}'! See 'p2obt.log'.")
+        logging.error(f"[ERROR]: Failed replaying '{name}'!", exc_info=True)
+        count("failed", number)
+
+    def replay_ob(reference: str, name: str, ob: Dict, version: str) -> None:
+        """Replays the operations on an OB in order."""
+        ob_id, templates = ob["obId"], {}
+        operations = ob_operations.get(reference, [])
+        for index, operation in enumerate(operations):
+            try:
+                if operation["op"] == "save_ob":
+                    update_nested(ob, operation["fields"])
+                    ob, version = connection.saveOB(ob, version)
+                elif operation["op"] == "template":
+                    print(f"\t\tAdding template '{operation['name']}'...")
+                    templates[operation["ref"]] = connection.createTemplate(
+                        ob_id, operation["name"]
+                    )
+                elif operation["op"] == "template_params":
+                    template, template_version = templates[operation["template"]]
+                    connection.setTemplateParams(
+                        ob_id, template, operation["params"], template_version
+                    )
+            except Exception:
+                fail(name, len(operations) - index)
+                return
+            count("operations")
+
+    def replay_lane(parent: str) -> None:
+        """Replays the creation of the items of a container in order."""
+        try:
+            try:
+                parent_id = resolve(parent)
+            except Exception:
+                fail(parent, sum(get_size(op["ref"]) for op in lanes[parent]))
+                return
+
+            for operation in lanes[parent]:
+                try:
+                    if operation["op"] == "container":
+                        item_id = create_remote_container(
+                            connection,
+                            operation["name"],
+                            parent_id,
+                            CONTAINER_TYPES[operation["type"]],
+                        )
+                    else:
+                        print(f"\tCreating OB '{operation['name']}'...")
+                        ob, version = connection.createOB(parent_id, operation["name"])
+                        item_id = ob["obId"]
+                except Exception:
+                    fail(operation["name"], get_size(operation["ref"]))
+                    continue
+
+                references[operation["ref"]] = item_id
+                count("operations")
+                if operation["op"] == "container":
+                    if operation["ref"] in lanes:
+                        submit(operation["ref"])
+                else:
+                    replay_ob(
+                        operation["ref"], operation["name"], copy.deepcopy(ob), version
+                    )
+        finally:
+            with lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    finished.set()
+
+    def submit(parent: str) -> None:
+        with lock:
+            pending[0] += 1
+            futures.append(executor.submit(copy_context().run, replay_lane, parent))
+
+    roots = [parent for parent in lanes if parent not in created]
+    try:
+        if roots:
+            for parent in roots:
+                submit(parent)
+            finished.wait()
+        # NOTE: Re-raises the errors that were not handled in a lane
+        for future in list(futures):
+            future.result()
+    finally:
+        executor.shutdown()
+
+    print(
+        f"Replayed {summary['operations']} of {len(operations)} operations"
+        f" ({summary['failed']} failed)."
+    )
+    return summary
@@ -0,0 +1,125 @@
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from ..config.options import OPTIONS
+
+# NOTE: Tokens that expire within this margin (in seconds) are not reused
+EXPIRY_MARGIN = 60
+
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session_file() -> Path:
+    """Gets the file in which the P2 sessions are cached."""
+    return OPTIONS.cache.path / "sessions.json"
+
+
+def get_token_expiry(token: str) -> float:
+    """Gets the time (unix timestamp) at which an access token expires.
+
+    This is the expiry claim of the token (if it is a JSON web token),
+    but at most the session's time to live (see 'OPTIONS.p2.session.ttl').
+    """
+    expiry = time.time() + OPTIONS.p2.session.ttl
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        expiry = min(expiry, float(claims["exp"]))
+    except (IndexError, KeyError, TypeError, ValueError):
+        pass
+    return expiry
+
+
+def load_sessions(file: Path | None = None) -> Dict[str, Dict]:
+    """Loads the cached sessions (that have not yet expired)."""
+    file = Path(file or get_session_file())
+    try:
+        sessions = json.loads(file.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    now = time.time()
+    return {
+        key: session
+        for key, session in sessions.items()
+        if session.get("expires", 0) - EXPIRY_MARGIN > now
+    }
+
+
+def save_sessions(sessions: Dict[str, Dict], file: Path | None = None) -> None:
+    """Saves the sessions to a file only readable by the user."""
+    file = Path(file or get_session_file())
+    file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # NOTE: The temporary file is created only readable by the user (and
+    # unique, so that concurrent saves do not write to the same file)
+    descriptor, tmp_file = tempfile.mkstemp(
+        dir=file.parent, prefix=f"{file.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as session_file:
+            json.dump(sessions, session_file, indent=2)
+        os.replace(tmp_file, file)
+    except BaseException:
+        Path(tmp_file).unlink(missing_ok=True)
+        raise
+
+
+def load_token(server: str, user_name: str, file: Path | None = None) -> str | None:
+    """Loads a cached access token that is still valid.
+
+    Parameters
+    ----------
+    server : str
+        The P2 environment (e.g., "demo" or "production").
+    user_name : str
+        The p2 user name.
+    file : path, optional
+        The session file. Default is "sessions.json" in 'OPTIONS.cache.path'.
+
+    Returns
+    -------
+    access_token : str, optional
+        The access token or "None" if none is cached or it has expired.
+    """
+    session = load_sessions(file).get(f"{server}/{user_name}")
+    return None if session is None else session["access_token"]
+
+
+def save_token(
+    server: str, user_name: str, token: str, file: Path | None = None
+) -> None:
+    """Caches an access token (until it expires).
+
+    Parameters
+    ----------
+    server : str
+        The P2 environment (e.g., "demo" or "production").
+    user_name : str
+        The p2 user name.
+    token : str
+        The access token.
+    file : path, optional
+        The session file. Default is "sessions.json" in 'OPTIONS.cache.path'.
+    """
+    with _SESSIONS_LOCK:
+        sessions = load_sessions(file)
+        sessions[f"{server}/{user_name}"] = {
+            "access_token": token,
+            "expires": get_token_expiry(token),
+        }
+        save_sessions(sessions, file)
+
+
+def remove_token(server: str, user_name: str, file: Path | None = None) -> None:
+    """Removes a cached access token (e.g., after it has been rejected)."""
+    with _SESSIONS_LOCK:
+        sessions = load_sessions(file)
+        if sessions.pop(f"{server}/{user_name}", None) is not None:
+            save_sessions(sessions, file)
@@ -0,0 +1,305 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+import p2api
+
+from ..config.options import OPTIONS
+from .upload import (
+    TEMPLATE_MAPPING,
+    add_template,
+    apply_mapping,
+    create_remote_container,
+    set_ob_header,
+    upload_ob,
+)
+
+CONTAINER_TYPES = {
+    "folder": "Folder",
+    "group": "Group",
+    "timelink": "TimeLink",
+    "concatenation": "Concatenation",
+}
+
+
+def fingerprint_ob(ob: Dict) -> str:
+    """Computes a fingerprint of the OB's content.
+
+    Parameters
+    ----------
+    ob : dict
+        The composed OB.
+
+    Returns
+    -------
+    fingerprint : str
+    """
+    content = json.dumps(ob, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def load_sync_state(file: Path) -> Dict[str, str]:
+    """Loads the fingerprints of the last synchronised OBs (by their ids)."""
+    if not Path(file).exists():
+        return {}
+    with open(file, "r", encoding="utf-8") as state_file:
+        return json.load(state_file)
+
+
+def save_sync_state(file: Path, state: Dict[str, str]) -> None:
+    """Saves the fingerprints of the synchronised OBs (by their ids)."""
+    file = Path(file)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = file.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file)
+    tmp_file.replace(file)
+
+
+def get_item_id(item: Dict) -> int:
+    """Gets the id of an item (OB or container) of a container."""
+    return item["obId"] if "obId" in item else item["containerId"]
+
+
+def update_remote_ob(
+    connection: p2api.p2api.ApiConnection, ob_id: int, ob: Dict
+) -> bool:
+    """Diffs an existing OB on p2 against a composed OB and updates the
+    parts (header, templates) that differ.
+
+    Parameters
+    ----------
+    connection : p2api.p2api.ApiConnection
+        The P2 python api connection.
+    ob_id : int
+        The id that specifies the ob on p2.
+    ob : dict
+        The composed OB.
+
+    Returns
+    -------
+    updated : bool
+        'True' if the remote OB was changed, otherwise 'False'.
+    """
+    changed = False
+    remote_ob, version = connection.getOB(ob_id)
+    updated_ob = copy.deepcopy(remote_ob)
+    set_ob_header(updated_ob, ob["header"])
+    if updated_ob != remote_ob:
+        connection.saveOB(updated_ob, version)
+        changed = True
+
+    contents = {}
+    for template_kind in ["acquisition", "observation"]:
+        content = copy.deepcopy(ob[template_kind])
+        apply_mapping(content, TEMPLATE_MAPPING)
+        template_name = "TEMPLATE.NAME"
+        if template_kind == "acquisition":
+            template_name = f"ACQUISITION.{template_name}"
+        contents[content[template_name]] = template_kind, content
+
+    templates, _ = connection.getTemplates(ob_id)
+    remote_templates = {}
+    for template in templates:
+        if template["templateName"] in contents:
+            remote_templates[template["templateName"]] = template["templateId"]
+            continue
+
+        print(f"\t\tRemoving template '{template['templateName']}'...")
+        _, template_version = connection.getTemplate(ob_id, template["templateId"])
+        connection.deleteTemplate(ob_id, template["templateId"], template_version)
+        changed = True
+
+    for template_name, (template_kind, content) in contents.items():
+        if template_name not in remote_templates:
+            add_template(connection, ob_id, ob, template_kind)
+            changed = True
+            continue
+
+        template, template_version = connection.getTemplate(
+            ob_id, remote_templates[template_name]
+        )
+        if any(
+            param["name"] in content and param["value"] != content[param["name"]]
+            for param in template["parameters"]
+        ):
+            print(f"\t\tUpdating template '{template_name}'...")
+            connection.setTemplateParams(ob_id, template, content, template_version)
+            changed = True
+    return changed
+
+
+class RemoteSync:
+    """Synchronises composed OBs and their containers with p2.
+
+    The contents of every container are fetched once and diffed
+    by name and content against the composed OBs. Each item is then
+    either created, updated or skipped. Items on p2 that are not part
+    of the night plan are left untouched.
+
+    Parameters
+    ----------
+    connection : p2api.p2api.ApiConnection
+        The P2 python api connection.
+    state_file : path, optional
+        The file containing the fingerprints of the last synchronised OBs.
+        Default is "sync.json" in the 'OPTIONS.cache.path' directory.
+
+    Notes
+    -----
+    An OB whose fingerprint matches the one of its last synchronisation
+    is skipped without any further call to p2. Otherwise, the remote OB
+    is fetched and only the differing parts are updated.
+    """
+
+    def __init__(
+        self,
+        connection: p2api.p2api.ApiConnection,
+        state_file: Path | None = None,
+    ) -> None:
+        self.connection = connection
+        self.state_file = Path(state_file or OPTIONS.cache.path / "sync.json")
+        self.fingerprints = load_sync_state(self.state_file)
+        self.items, self.order, self.appended = {}, {}, set()
+        self.stats = {"created": 0, "updated": 0, "skipped": 0}
+        self.start_count = getattr(connection, "request_count", 0)
+        self.lock = threading.Lock()
+
+    def get_items(self, container_id: int) -> Dict[str, List[Dict]]:
+        """Gets the (not yet matched) items of a container by their name.
+
+        The items are only fetched from p2 once per container.
+        """
+        if container_id not in self.items:
+            items, _ = self.connection.getItems(container_id)
+            self.items[container_id] = {}
+            for item in items:
+                self.items[container_id].setdefault(item["name"], []).append(item)
+        return self.items[container_id]
+
+    def add_item(self, container_id: int, item_id: int, status: str) -> None:
+        """Keeps track of the items' order within a container and
+        of the sync's statistics."""
+        with self.lock:
+            self.order.setdefault(container_id, []).append(item_id)
+            self.stats[status] += 1
+            if status == "created" and any(self.items[container_id].values()):
+                self.appended.add(container_id)
+
+    def container(
+        self, name: str, container_id: int, container_type: str = "concatenation"
+    ) -> int:
+        """Gets or creates a container on p2.
+
+        Parameters
+        ----------
+        name: str
+            The container's name.
+        container_id : int
+            The id that specifies the parent container on p2.
+        container_type : str
+            Container type. Either "folder", "concatenation", "timelink"
+            or "group". Default is "concatenation".
+
+        Returns
+        -------
+        container_id : int
+            The existing or created container's id.
+        """
+        items = self.get_items(container_id)
+        item_type = CONTAINER_TYPES.get(container_type, "Concatenation")
+        for item in items.get(name, []):
+            if item["itemType"] == item_type:
+                items[name].remove(item)
+                self.add_item(container_id, item["containerId"], "skipped")
+                print(f"Found container '{name}' on p2...")
+                return item["containerId"]
+
+        new_container_id = create_remote_container(
+            self.connection, name, container_id, container_type
+        )
+        self.items[new_container_id] = {}
+        self.add_item(container_id, new_container_id, "created")
+        return new_container_id
+
+    def upload_ob(self, ob: Dict, container_id: int | None = None) -> int | None:
+        """Creates, updates or skips an OB on p2.
+
+        Parameters
+        ----------
+        ob : dict
+            The composed OB.
+        container_id : int
+            The id that specifies the container on p2.
+
+        Returns
+        -------
+        ob_id : int, optional
+            The OB's id. If the upload failed "None".
+        """
+        if container_id is None:
+            return None
+
+        ob_name = ob["header"]["user"]["name"]
+        fingerprint = fingerprint_ob(ob)
+        items = self.get_items(container_id)
+        matches = [item for item in items.get(ob_name, []) if item["itemType"] == "OB"]
+        if not matches:
+            ob_id = upload_ob(self.connection, ob, container_id)
+            if ob_id is not None:
+                self.add_item(container_id, ob_id, "created")
+                self.fingerprints[str(ob_id)] = fingerprint
+            return ob_id
+
+        items[ob_name].remove(matches[0])
+        ob_id, status = matches[0]["obId"], "skipped"
+        if self.fingerprints.get(str(ob_id)) != fingerprint:
+            print(f"\tSynchronising OB '{ob_name}'...")
+            try:
+                if update_remote_ob(self.connection, ob_id, ob):
+                    status = "updated"
+            except p2api.P2Error:
+                print(f"[ERROR]: Failed updating OB '{ob_name}'! See 'p2obt.log'.")
+                logging.error(
+                    f"[ERROR]: Failed updating OB '{ob_name}'!", exc_info=True
+                )
+                self.order.setdefault(container_id, []).append(ob_id)
+                return None
+        else:
+            print(f"\tOB '{ob_name}' is up to date...")
+
+        self.add_item(container_id, ob_id, status)
+        self.fingerprints[str(ob_id)] = fingerprint
+        return ob_id
+
+    def save(self) -> None:
+        """Saves the sync state (e.g., of an interrupted sync, so that the
+        OBs synchronised so far are skipped when run again)."""
+        save_sync_state(self.state_file, self.fingerprints)
+
+    def finish(self) -> Dict[str, int]:
+        """Saves the sync state, restores the order of the containers that had
+        new items appended and returns the sync's statistics."""
+        self.save()
+        for container_id in self.appended:
+            items, version = self.connection.getItems(container_id)
+            order = {
+                item_id: index for index, item_id in enumerate(self.order[container_id])
+            }
+            ordered_items = sorted(
+                items, key=lambda item: order.get(get_item_id(item), len(order))
+            )
+            if ordered_items != items:
+                self.connection.reorderItems(container_id, ordered_items, version)
+
+        calls = getattr(self.connection, "request_count", 0) - self.start_count
+        print(
+            f"Synchronised with p2: {self.stats['created']} created,"
+            f" {self.stats['updated']} updated, {self.stats['skipped']} skipped"
+            f" ({calls} calls)."
+        )
+        return {**self.stats, "calls": calls}
@@ -0,0 +1,201 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from .logger import LOG_CONTEXT
+from .metrics import get_metrics, summarise
+
+# NOTE: The ids in the P2 API's urls (e.g., "/containers/123/items")
+ID_PATTERN = re.compile(r"/(\w+)/(\d+)(?=/|$)")
+CONFLICT_STATUS = 412
+
+
+def get_endpoint(url: str) -> str:
+    """Gets the endpoint of a url (e.g., "/containers/{id}/items")."""
+    return ID_PATTERN.sub(r"/\1/{id}", url)
+
+
+def get_ids(url: str) -> Dict[str, int]:
+    """Gets the ids in a url (e.g., {"containers": 123})."""
+    return {name: int(value) for name, value in ID_PATTERN.findall(url)}
+
+
+class Tracer:
+    """Records the calls to the P2 API (of all threads), see :func:`trace_calls`.
+
+    Each call (i.e., every attempt of a retried call) is recorded with
+    its endpoint, the ids of its container and OB, its start and latency
+    (in seconds), its status and error, as well as the run, night,
+    container and OB that it was made for (see
+    :func:`log_context <p2obt.backend.logger.log_context>`).
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        start: float,
+        status: int | None = None,
+        error: str | None = None,
+        attempt: int = 0,
+    ) -> None:
+        """Records a call that was started at 'start' (see
+        `time.perf_counter`) and has just finished."""
+        duration = time.perf_counter() - start
+        ids, context = get_ids(url), LOG_CONTEXT.get()
+        call = {
+            "method": method,
+            "endpoint": get_endpoint(url),
+            "container_id": ids.get("containers"),
+            "ob_id": ids.get("obsBlocks"),
+            "start": start - self.start,
+            "duration": duration,
+            "status": status,
+            "error": error,
+            "attempt": attempt,
+            "thread": threading.current_thread().name,
+            **{key: context.get(key) for key in ["run", "night", "container", "ob"]},
+        }
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregates the calls.
+
+        Returns
+        -------
+        summary : dict
+            The number of calls, their total time (in seconds), version
+            conflicts and errors as well as the calls, their time and
+            latency (percentiles) per endpoint, per OB, per container and
+            per run.
+        """
+        with self._lock:
+            calls = list(self.calls)
+
+        def aggregate(key) -> Dict[str, Dict]:
+            groups = {}
+            for call in calls:
+                if (name := key(call)) is not None:
+                    groups.setdefault(str(name), []).append(call)
+            return {
+                name: {
+                    "calls": len(group),
+                    "time": sum(call["duration"] for call in group),
+                    "conflicts": sum(
+                        call["status"] == CONFLICT_STATUS for call in group
+                    ),
+                    "errors": sum(call["error"] is not None for call in group),
+                    "latency": summarise(sorted(call["duration"] for call in group)),
+                }
+                for name, group in sorted(groups.items())
+            }
+
+        return {
+            "calls": len(calls),
+            "time": sum(call["duration"] for call in calls),
+            "conflicts": sum(call["status"] == CONFLICT_STATUS for call in calls),
+            "errors": sum(call["error"] is not None for call in calls),
+            "endpoints": aggregate(lambda call: f"{call['method']} {call['endpoint']}"),
+            "obs": aggregate(lambda call: call["ob"]),
+            "containers": aggregate(
+                lambda call: call["container"] or call["container_id"]
+            ),
+            "runs": aggregate(lambda call: call["run"]),
+        }
+
+    def save(self, file: Path) -> None:
+        """Saves the calls as a trace (.json)-file (in the Trace Event Format),
+        which can be viewed on a timeline, e.g., with https://ui.perfetto.dev
+        or "chrome://tracing"."""
+        with self._lock:
+            calls = list(self.calls)
+
+        pid, threads, events = os.getpid(), {}, []
+        for call in calls:
+            tid = threads.setdefault(call["thread"], len(threads) + 1)
+            args = {
+                key: value
+                for key, value in call.items()
+                if key not in ["method", "endpoint", "start", "duration", "thread"]
+                and value is not None
+            }
+            events.append(
+                {
+                    "name": f"{call['method']} {call['endpoint']}",
+                    "cat": "error" if call["error"] is not None else "p2",
+                    "ph": "X",
+                    "ts": call["start"] * 1e6,
+                    "dur": call["duration"] * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+        for name, tid in threads.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+
+        file = Path(file)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+        file.write_text(json.dumps(trace), encoding="utf-8")
+
+
+TRACER: ContextVar[Tracer | None] = ContextVar("tracer", default=None)
+
+
+@contextmanager
+def trace_calls() -> Iterator[Tracer]:
+    """Traces the calls to the P2 API made within (including the threads
+    of the pipeline).
+
+    Examples
+    --------
+    >>> with trace_calls() as tracer:
+    ...     create_ob("HD 142666", "sci", "UTs", container_id=3001786)
+    >>> tracer.save("trace.json")
+    """
+    token = TRACER.set(Tracer())
+    try:
+        yield TRACER.get()
+    finally:
+        TRACER.reset(token)
+
+
+def trace_call(
+    method: str,
+    url: str,
+    start: float,
+    status: int | None = None,
+    error: Exception | None = None,
+    attempt: int = 0,
+) -> None:
+    """Records a finished call to the P2 API (if the calls are traced) and
+    its latency as a timing "p2 <method> <endpoint>" of the metrics (if
+    they are collected)."""
+    tracer, metrics = TRACER.get(), get_metrics()
+    if tracer is not None:
+        error = f"{type(error).__name__}: {error}" if error is not None else None
+        tracer.record(method, url, start, status, error, attempt)
+    if metrics is not None:
+        name = f"p2 {method} {get_endpoint(url)}"
+        metrics.record(name, time.perf_counter() - start)
@@ -1,11 +1,15 @@
 import getpass
 import logging
-from typing import Dict
+from typing import Dict, Tuple
 
-import keyring
-import numpy as np
 import p2api
 
+from ..config.options import OPTIONS
+from .client import P2Connection
+from .journal import Journal
+from .metrics import timed
+from .session import load_token, remove_token, save_token
+
 TARGET_MAPPING = {
     "TARGET.NAME": "name",
     "ra": "ra",
@@ -84,11 +88,7 @@ def apply_mapping(content: Dict, mapping: Dict) -> None:
             if mapping[key] == list:
                 value = [value]
             elif mapping[key] == float:
-                if isinstance(value, (np.float32, np.float64)):
-                    value = value.item()
-                else:
-                    value = float(value)
-                value = round(value, 2)
+                value = round(float(value), 2)
             elif mapping[key] == str:
                 value = str(value)
             elif mapping[key] == bool:
@@ -96,13 +96,14 @@ def apply_mapping(content: Dict, mapping: Dict) -> None:
         content[key] = value
 
 
-def login(
+def get_credentials(
     user_name: str | None = None,
     store_password: bool | None = False,
     remove_password: bool | None = False,
     server: str | None = "demo",
-):
-    """Login to the p2 API with the given username. Return the API connection.
+) -> Tuple[str, str]:
+    """Gets the p2 user name and password (from the keyring or a prompt).
+
     Parameters
     ----------
     username : str, optional
@@ -114,7 +115,14 @@ def login(
         If 'True' the password will be stored in the keyring.
     remove_password: bool, optional
         If 'True' the password will be removed from the keyring.
+
+    Returns
+    -------
+    user_name : str
+    password : str
     """
+    import keyring
+
     api_url = f"https://www.eso.org/p2{'demo' if server == 'demo' else ''}"
     if user_name is None:
         user_name = input("Input your ESO-username: ")
@@ -132,8 +140,69 @@ def login(
             print("Password stored in keyring.")
     else:
         print("Password retrieved from keyring.")
+    return user_name, password
 
-    return p2api.ApiConnection(server, user_name, password)
+
+def login(
+    user_name: str | None = None,
+    store_password: bool | None = False,
+    remove_password: bool | None = False,
+    server: str | None = "demo",
+):
+    """Login to the p2 API with the given username. Return the API connection.
+
+    If 'OPTIONS.p2.session.reuse' is set, the session's access token is
+    cached on disk and reused by later logins (also from other processes)
+    until it expires, so that the password is only needed to log in again.
+
+    Parameters
+    ----------
+    username : str, optional
+        The p2 user name.
+    server: str, optional
+        Either "demo", "production" for paranal or "production_lasilla" for la
+        silla.
+    store_password: bool, optional
+        If 'True' the password will be stored in the keyring.
+    remove_password: bool, optional
+        If 'True' the password will be removed from the keyring
+        (and the cached session discarded).
+
+    Returns
+    -------
+    connection : P2Connection
+        The P2 python api connection (rate limited and with retries
+        for transient errors, see 'OPTIONS.p2').
+    """
+    if user_name is None:
+        user_name = input("Input your ESO-username: ")
+
+    def authenticate(remove_password: bool = False) -> str:
+        """Logs in with the password and returns (and caches) the token."""
+        _, password = get_credentials(
+            user_name, store_password, remove_password, server
+        )
+        access_token = P2Connection(server, user_name, password).access_token
+        if OPTIONS.p2.session.reuse:
+            save_token(server, user_name, access_token)
+        return access_token
+
+    access_token = None
+    if remove_password:
+        remove_token(server, user_name)
+    elif OPTIONS.p2.session.reuse:
+        access_token = load_token(server, user_name)
+
+    if access_token is None:
+        access_token = authenticate(remove_password)
+    else:
+        print("Session reused from cache.")
+
+    return P2Connection(
+        url=p2api.p2api.API_URL[server],
+        access_token=access_token,
+        authenticate=authenticate,
+    )
 
 
 def get_remote_run(connection: p2api.p2api.ApiConnection, run_id: str) -> int | None:
@@ -188,7 +257,7 @@ def create_remote_container(
     connection: p2api.p2api.ApiConnection,
     name: str,
     container_id: int,
-    container_type: str = "concatenation"
+    container_type: str = "concatenation",
 ) -> int:
     """Creates a container on p2.
 
@@ -211,35 +280,29 @@ def create_remote_container(
         The created container's id.
     """
     print(f"Creating container '{name}' on p2...")
-    match container_type:
-        case "folder":
-            return connection.createFolder(container_id, name)[0]["containerId"]
-        case "group":
-            return connection.createGroup(container_id, name)[0]["containerId"]
-        case "timelink":
-            return connection.createTimeLink(container_id, name)[0]["containerId"]
-        case _:
-            return connection.createConcatenation(container_id, name)[0]["containerId"]
-
-
-def create_ob(
-    connection: p2api.p2api.ApiConnection, container_id: int, header: Dict
-) -> int:
-    """Creates an OB on p2.
+    with timed("upload.container"):
+        match container_type:
+            case "folder":
+                container, _ = connection.createFolder(container_id, name)
+            case "group":
+                container, _ = connection.createGroup(container_id, name)
+            case "timelink":
+                container, _ = connection.createTimeLink(container_id, name)
+            case _:
+                container, _ = connection.createConcatenation(container_id, name)
+    return container["containerId"]
+
+
+def set_ob_header(ob: Dict, header: Dict) -> None:
+    """Sets the OB's header information on a remote OB.
 
     Parameters
     ----------
-    connection : p2api.p2api.ApiConnection
-        The P2 python api connection.
-    container_id : int
-        The id that specifies the container on p2.
-    header : Dict
+    ob : dict
+        The remote OB as returned by the p2api.
+    header : dict
         The header of the OB.
-
-    Returns
-    -------
     """
-    ob, version = connection.createOB(container_id, header["user"]["name"])
     ob["instrument"] = header["observation"]["instrument"]
     ob["obsDescription"]["name"] = header["user"]["name"]
     ob["obsDescription"]["userComments"] = header["user"]["userComments"]
@@ -255,12 +318,41 @@ def create_ob(
                 if sub_key not in mapping:
                     continue
                 ob[key][mapping[sub_key]] = sub_value
-    ob, version = connection.saveOB(ob, version)
+
+
+def create_ob(
+    connection: p2api.p2api.ApiConnection, container_id: int, header: Dict
+) -> int:
+    """Creates an OB on p2.
+
+    Parameters
+    ----------
+    connection : p2api.p2api.ApiConnection
+        The P2 python api connection.
+    container_id : int
+        The id that specifies the container on p2.
+    header : Dict
+        The header of the OB.
+
+    Returns
+    -------
+    ob_id : int
+        The created OB's id.
+    """
+    with timed("upload.ob"):
+        ob, version = connection.createOB(container_id, header["user"]["name"])
+        set_ob_header(ob, header)
+        ob, version = connection.saveOB(ob, version)
     return ob["obId"]
 
 
 def add_template(
-    connection: p2api.p2api.ApiConnection, ob_id: int, ob: Dict, template_kind: str
+    connection: p2api.p2api.ApiConnection,
+    ob_id: int,
+    ob: Dict,
+    template_kind: str,
+    journal: Journal | None = None,
+    journal_key: str | None = None,
 ) -> None:
     """Adds template to an (.obx)-file on the p2.
 
@@ -272,6 +364,11 @@ def add_template(
         The id that specifies the ob on p2.
     ob : dict
     template_kind : str
+    journal : Journal, optional
+        If given, the created template is committed to the journal (before
+        its parameters are set) and reused if it already has been created.
+    journal_key : str, optional
+        The OB's key in the journal.
     """
     template_name = "TEMPLATE.NAME"
     if template_kind == "acquisition":
@@ -279,14 +376,31 @@ def add_template(
     content = ob[template_kind]
     apply_mapping(content, TEMPLATE_MAPPING)
     print(f"\t\tAdding template '{content[template_name]}'...")
-    template, version = connection.createTemplate(ob_id, content[template_name])
-    template, version = connection.setTemplateParams(ob_id, template, content, version)
+    step = (journal.get(journal_key) or {}) if journal is not None else {}
+    with timed("upload.template"):
+        template_id = step.get("created", {}).get(template_kind)
+        if template_id is None:
+            template, version = connection.createTemplate(ob_id, content[template_name])
+            if journal is not None:
+                journal.commit(
+                    journal_key,
+                    "created",
+                    kind=template_kind,
+                    id=template["templateId"],
+                )
+        else:
+            template, version = connection.getTemplate(ob_id, template_id)
+        connection.setTemplateParams(ob_id, template, content, version)
 
 
 def upload_ob(
-    connection: p2api.p2api.ApiConnection, ob: Dict, container_id: int | None = None
-) -> None:
-    """
+    connection: p2api.p2api.ApiConnection,
+    ob: Dict,
+    container_id: int | None = None,
+    journal: Journal | None = None,
+    journal_key: str | None = None,
+) -> int | None:
+    """Uploads an OB to p2.
 
     Parameters
     ----------
@@ -295,16 +409,52 @@ def upload_ob(
     ob : dict
     container_id : int
         The id that specifies the container on p2.
+    journal : Journal, optional
+        If given, every completed step of the upload is committed to the
+        journal and steps already committed are skipped.
+    journal_key : str, optional
+        The OB's key in the journal. By default made from the container id
+        and the OB's name.
+
+    Returns
+    -------
+    ob_id : int, optional
+        The uploaded OB's id. If the upload failed "None".
     """
     if connection is None or container_id is None:
-        return
+        return None
 
     ob_name = ob["header"]["user"]["name"]
-    print(f"\tCreating OB '{ob_name}'...")
+    step = {}
+    if journal is not None:
+        if journal_key is None:
+            journal_key = journal.key("ob", container_id, ob_name)
+        step = journal.get(journal_key) or {}
+        if step.get("done"):
+            print(f"\tOB '{ob_name}' already uploaded (journal)...")
+            return step["id"]
+
     try:
-        ob_id = create_ob(connection, container_id, ob["header"])
-        add_template(connection, ob_id, ob, "acquisition")
-        add_template(connection, ob_id, ob, "observation")
+        if "id" in step:
+            ob_id = step["id"]
+            print(f"\tResuming OB '{ob_name}'...")
+        else:
+            print(f"\tCreating OB '{ob_name}'...")
+            ob_id = create_ob(connection, container_id, ob["header"])
+            if journal is not None:
+                journal.commit(journal_key, "ob", id=ob_id, name=ob_name)
+
+        for template_kind in ["acquisition", "observation"]:
+            if template_kind in step.get("templates", []):
+                continue
+            add_template(connection, ob_id, ob, template_kind, journal, journal_key)
+            if journal is not None:
+                journal.commit(journal_key, "template", kind=template_kind)
+
+        if journal is not None:
+            journal.commit(journal_key, "done")
     except p2api.P2Error:
         print(f"[ERROR]: Failed uploading OB '{ob_name}'! See 'p2obt.log'.")
         logging.error(f"[ERROR]: Failed uploading OB '{ob_name}'!", exc_info=True)
+        return None
+    return ob_id
@@ -1,23 +1,12 @@
 import re
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
-import astropy.units as u
+from .parse import parse_night_plan_table
 
+if TYPE_CHECKING:
+    import astropy.units as u
 
-def replace_elements(
-    nested_list: List[List], fill: Any | None = None, default: Any | None = None
-) -> List[List]:
-    """Replaces all elements in a nested list with a fill value."""
-    value = fill if fill is not None and not isinstance(fill, (list, dict)) else default
-    for i, item in enumerate(nested_list):
-        if isinstance(item, list):
-            replace_elements(item, value, default)
-        else:
-            nested_list[i] = value
-    return nested_list
 
-
-# TODO: Finish this
 def create_night_plan_dict(
     targets: List[str] | None = None,
     calibrators: List[List[str] | str] | None = None,
@@ -26,9 +15,14 @@ def create_night_plan_dict(
     resolution: Dict[str, str] | List[str] | str | None = None,
     configuration: Dict[str, str] | List[str] | str | None = None,
     modes: Dict[str, str] | List[str] | str | None = None,
-):
+) -> Dict[str, Dict] | None:
     """Creates a night plan dictionary for the observations.
 
+    The inputs are the columns of a night plan table (see
+    :func:`parse_night_plan_table <p2obt.backend.parse.parse_night_plan_table>`).
+
+    Parameters
+    ----------
     targets : list, optional
         A list of targets. If no night plan is given, this list
         and the calibrators must be given.
@@ -52,26 +46,39 @@ def create_night_plan_dict(
         A dictionary containing the operational mode for each target or a list
         of operational modes for all targets or a single operational mode for all targets.
         Will only be used if no night plan is given.
+
+    Returns
+    -------
+    night_dict : dict, optional
+        The night plan or "None" if no targets are given.
     """
-    # night_plan = {"run1": }
-    if calibrators is None:
-        raise IOError("Please input the calibrators.")
+    import pandas as pd
 
-    ords = replace_elements(calibrators.copy(), orders, "a")
-    tgs = replace_elements(calibrators.copy(), tags, "LN")
-    res = replace_elements(targets.copy(), resolution, "low")
-    mode = replace_elements(targets.copy(), modes, "gr")
+    if not targets:
+        return None
 
-    if isinstance(configuration, str):
-        confgs = replace_elements(targets.copy(), configuration)
-    else:
-        raise IOError("Please input the array configuration.")
+    if calibrators is None:
+        raise IOError("Please input the calibrators.")
 
-    for index, target in enumerate(targets):
-        # cals = 
-        block = {"name": target.replace(" ", "_"), "mode": mode[index],}
-        breakpoint()
-    return
+    columns = {
+        "target": targets,
+        "calibrators": calibrators,
+        "order": orders,
+        "tag": tags,
+        "resolution": resolution,
+        "configuration": configuration,
+        "mode": modes,
+    }
+    table = pd.DataFrame(index=range(len(targets)))
+    for column, values in columns.items():
+        if isinstance(values, dict):
+            values = [values.get(target) for target in targets]
+        elif values is None or isinstance(values, str):
+            values = [values] * len(targets)
+        elif len(values) != len(targets):
+            raise IOError(f"The number of {column}s does not match the targets!")
+        table[column] = pd.Series(list(values), dtype=object)
+    return parse_night_plan_table(table)
 
 
 def add_space(input_str: str) -> str:
@@ -137,11 +144,15 @@ def contains_element(list_to_search: List, element_to_search: str) -> bool:
     return any(element_to_search in element for element in list_to_search)
 
 
-def convert_proper_motions(*proper_motions: u.mas, rfloat: bool | None = True) -> Tuple:
+def convert_proper_motions(
+    *proper_motions: "u.mas", rfloat: bool | None = True
+) -> Tuple:
     """Converts the proper motions from [mas/yr] to [arcsec/yr].
 
     Input is assumed to be in [mas], if given as float.
     """
+    import astropy.units as u
+
     if all(not isinstance(x, u.Quantity) for x in proper_motions):
         proper_motions = map(lambda x: x * u.mas, proper_motions)
     else:
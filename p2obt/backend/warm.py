@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+from typing import Dict, List
+
+from ..config.options import OPTIONS, options_scope
+from .cache import get_cache_file, save_cached
+from .client import TokenBucket
+from .parse import get_night_plans, iter_night_plan
+from .query import get_query_key, query
+
+# NOTE: The states of a target after warming
+WARM_STATES = ["cached", "queried", "refreshed", "failed"]
+
+
+def get_targets(night_plans: Path | str | List[Path | str]) -> List[str]:
+    """Gets the (unique) science targets and calibrators of night plans.
+
+    Parameters
+    ----------
+    night_plans : path or str or list of path or str
+        Night plans, directories containing night plans (.txt)-files
+        or glob patterns (see :func:`get_night_plans
+        <p2obt.backend.parse.get_night_plans>`).
+
+    Returns
+    -------
+    targets : list of str
+        The targets in the order of the night plans.
+    """
+    if not isinstance(night_plans, (list, tuple)):
+        night_plans = [night_plans]
+
+    targets = {}
+    for entry in night_plans:
+        for night_plan in get_night_plans(entry):
+            try:
+                for _, _, block in iter_night_plan(night_plan):
+                    names = [block["target"], *(cal["name"] for cal in block["cals"])]
+                    for name in names:
+                        targets.setdefault(name, None)
+            except Exception:
+                print(f"Failed parsing '{night_plan.name}'! See 'p2obt.log'.")
+                logging.error(f"Failed parsing '{night_plan}'!", exc_info=True)
+    return list(targets)
+
+
+def get_cache_age(name: str) -> float | None:
+    """Gets the age (in seconds) of a target's cached query (as made by
+    :func:`create_obs <p2obt.automate.create_obs>`) or "None" if it is not cached."""
+    try:
+        modified = get_cache_file("queries", get_query_key(name)).stat().st_mtime
+    except FileNotFoundError:
+        return None
+    return time.time() - modified
+
+
+def warm_target(name: str, refresh: float, bucket: TokenBucket) -> str:
+    """Queries a target into the cache if it is not cached or its cached
+    query is older than 'refresh' (in seconds).
+
+    Returns
+    -------
+    state : str
+        Either "cached" (left as is), "queried" (was not cached or had
+        expired) or "refreshed" (was about to expire).
+    """
+    age = get_cache_age(name)
+    if age is not None and age < refresh:
+        return "cached"
+
+    bucket.acquire()
+    # NOTE: The query bypasses the cache and its result is saved under the
+    # key of the query made for the OBs
+    with options_scope({"cache.query.active": False, "cache.query.offline": False}):
+        target = query(name)
+    save_cached("queries", get_query_key(name), target)
+    return "queried" if age is None or age > OPTIONS.cache.query.ttl else "refreshed"
+
+
+def warm_cache(
+    night_plans: Path | str | List[Path | str],
+    refresh: float | None = None,
+    rate: float | None = None,
+    workers: int | None = None,
+) -> Dict[str, int]:
+    """Queries the targets of pending night plans into the query cache
+    (see 'OPTIONS.cache.query'), so that the OB creation finds them cached.
+
+    The targets that are already cached are skipped, unless their cached
+    query is about to expire. The queries are throttled, so as not to
+    overload the catalogs (e.g., CDS).
+
+    Parameters
+    ----------
+    night_plans : path or str or list of path or str
+        Night plans, directories containing night plans (.txt)-files
+        or glob patterns.
+    refresh : float, optional
+        The fraction of the time to live after which a cached query is
+        refreshed. Default is 'OPTIONS.cache.warm.refresh'.
+    rate : float, optional
+        The targets queried per second. Default is 'OPTIONS.cache.warm.rate'.
+    workers : int, optional
+        The concurrent queries. Default is 'OPTIONS.cache.warm.workers'.
+
+    Returns
+    -------
+    summary : dict
+        The number of targets that were cached, queried, refreshed
+        or that failed.
+    """
+    warm = OPTIONS.cache.warm
+    refresh = OPTIONS.cache.query.ttl * (warm.refresh if refresh is None else refresh)
+    rate = rate or warm.rate
+    bucket = TokenBucket(rate, 1)
+
+    def run(name: str) -> str:
+        try:
+            return warm_target(name, refresh, bucket)
+        except Exception:
+            print(f"Failed querying '{name}'! See 'p2obt.log'.")
+            logging.error(f"Failed warming the query of '{name}'!", exc_info=True)
+            return "failed"
+
+    targets = get_targets(night_plans)
+    print(f"Warming the queries of {len(targets)} targets...")
+    with ThreadPoolExecutor(workers or warm.workers) as executor:
+        futures = [executor.submit(copy_context().run, run, name) for name in targets]
+        states = [future.result() for future in futures]
+
+    summary = {state: states.count(state) for state in WARM_STATES}
+    print(", ".join(f"{count} {state}" for state, count in summary.items()) + ".")
+    return summary
+
+
+def watch(
+    night_plans: Path | str | List[Path | str],
+    interval: float | None = None,
+    stop: threading.Event | None = None,
+    **kwargs,
+) -> None:
+    """Warms the query cache for the pending night plans (see :func:`warm_cache`)
+    every interval until stopped (e.g., in a background thread).
+
+    Parameters
+    ----------
+    night_plans : path or str or list of path or str
+        Night plans, directories containing night plans (.txt)-files
+        or glob patterns, which are scanned again every interval.
+    interval : float, optional
+        The interval (in seconds). Default is 'OPTIONS.cache.warm.interval'.
+    stop : threading.Event, optional
+        If given, the warming stops once it is set.
+    **kwargs
+        Further arguments passed to :func:`warm_cache`.
+    """
+    stop = stop or threading.Event()
+    while True:
+        try:
+            warm_cache(night_plans, **kwargs)
+        except Exception:
+            logging.error("Failed warming the query cache!", exc_info=True)
+        if stop.wait(interval or OPTIONS.cache.warm.interval):
+            return
@@ -0,0 +1,480 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+from . import __version__
+from .config.options import OPTIONS
+
+# NOTE: Only the options and argparse are imported here. The dependencies of
+# each command (e.g., p2api, astropy) are imported when it is run
+
+
+class UsageError(Exception):
+    """An error of the user's input (shown without a traceback)."""
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the arguments for the workers of the stages, the rate of the
+    calls to P2 and the run's deadline (see 'OPTIONS.pipeline')."""
+    group = parser.add_argument_group("pipeline")
+    for stage in ["query", "compose", "write", "upload"]:
+        group.add_argument(
+            f"--{stage}-workers",
+            type=int,
+            metavar="N",
+            help=f"The workers of the {stage} stage"
+            f" (default: {getattr(OPTIONS.pipeline.workers, stage)}).",
+        )
+    group.add_argument(
+        "--queue-size",
+        type=int,
+        metavar="N",
+        help="The blocks waiting in front of each stage"
+        f" (default: {OPTIONS.pipeline.queue_size}).",
+    )
+    group.add_argument(
+        "--rate",
+        type=float,
+        help=f"The calls to P2 per second (default: {OPTIONS.p2.rate}).",
+    )
+    group.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="The time after which no further blocks are started.",
+    )
+
+
+def add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the arguments for the report, the trace and the profile of a run."""
+    group = parser.add_argument_group("output")
+    group.add_argument(
+        "--report", type=Path, metavar="FILE", help="Saves the run's report (.json)."
+    )
+    group.add_argument(
+        "--trace",
+        type=Path,
+        metavar="FILE",
+        help="Saves the calls to P2 as a trace (.json).",
+    )
+    group.add_argument(
+        "--profile",
+        choices=["cprofile", "sample"],
+        help="Profiles the run (see 'P2OBT_PROFILE').",
+    )
+
+
+def add_p2_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the arguments for the login to P2 and the container."""
+    group = parser.add_argument_group("p2")
+    group.add_argument("-u", "--user", dest="user_name", help="The p2 user name.")
+    group.add_argument(
+        "--server",
+        default="production",
+        help="The P2 environment (default: production).",
+    )
+    group.add_argument(
+        "-c",
+        "--container-id",
+        type=int,
+        help="The container on P2 (by default the runs of the night plan).",
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """Gets the parser of the command line interface."""
+    common = argparse.ArgumentParser(add_help=False)
+    group = common.add_argument_group("cache")
+    group.add_argument(
+        "--cache-dir",
+        type=Path,
+        metavar="DIR",
+        help=f"The directory of the caches (default: {OPTIONS.cache.path}).",
+    )
+    group.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        help="Caches the target queries (see 'OPTIONS.cache.query').",
+    )
+    group.add_argument(
+        "--cache-ttl",
+        type=float,
+        metavar="SECONDS",
+        help="The time to live of the cached queries"
+        f" (default: {OPTIONS.cache.query.ttl:.0f}).",
+    )
+    group.add_argument(
+        "--offline",
+        action="store_true",
+        help="Uses only the cached queries (e.g., after 'p2obt prefetch').",
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="p2obt", description="The Phase 2 OB tools for MATISSE."
+    )
+    parser.add_argument("--version", action="version", version=__version__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parse = commands.add_parser(
+        "parse", parents=[common], help="Parses a night plan and shows its blocks."
+    )
+    parse.add_argument("night_plan", type=Path)
+    parse.add_argument("--json", action="store_true", help="Prints it as json.")
+
+    prefetch = commands.add_parser(
+        "prefetch",
+        parents=[common],
+        help="Queries the targets of pending night plans into the query cache.",
+    )
+    prefetch.add_argument(
+        "night_plans", nargs="+", help="Night plans, directories or glob patterns."
+    )
+    # NOTE: The warmer's own destinations, so that they do not set the
+    # options of the pipeline (see `set_options`)
+    prefetch.add_argument(
+        "--query-workers",
+        dest="warm_workers",
+        type=int,
+        metavar="N",
+        help=f"The concurrent queries (default: {OPTIONS.cache.warm.workers}).",
+    )
+    prefetch.add_argument(
+        "--rate",
+        dest="warm_rate",
+        type=float,
+        help=f"The targets queried per second (default: {OPTIONS.cache.warm.rate}).",
+    )
+    prefetch.add_argument(
+        "--refresh",
+        type=float,
+        metavar="FRACTION",
+        help="The fraction of the time to live after which cached queries are"
+        f" refreshed (default: {OPTIONS.cache.warm.refresh}).",
+    )
+    prefetch.add_argument(
+        "--watch",
+        type=float,
+        metavar="SECONDS",
+        help="Scans the night plans again every interval (until interrupted).",
+    )
+
+    compose = commands.add_parser(
+        "compose",
+        parents=[common],
+        help="Composes the OBs and records the operations on P2 (a dry run).",
+    )
+    compose.add_argument("night_plan", type=Path)
+    compose.add_argument(
+        "-o",
+        "--record",
+        type=Path,
+        metavar="FILE",
+        help="The recorded operations (default: '<night plan>.jsonl'),"
+        " see 'p2obt upload --replay'.",
+    )
+    compose.add_argument(
+        "-c",
+        "--container-id",
+        type=int,
+        help="The container on P2 (by default the runs of the night plan).",
+    )
+    add_pipeline_arguments(compose)
+    add_output_arguments(compose)
+
+    write = commands.add_parser(
+        "write", parents=[common], help="Writes the OBs to (.obx)-files."
+    )
+    write.add_argument("night_plan", type=Path)
+    write.add_argument(
+        "-o", "--output-dir", type=Path, required=True, help="The output directory."
+    )
+    add_pipeline_arguments(write)
+    add_output_arguments(write)
+
+    upload = commands.add_parser(
+        "upload", parents=[common], help="Uploads the OBs to P2."
+    )
+    upload.add_argument("night_plan", type=Path, nargs="?")
+    upload.add_argument(
+        "--journal",
+        type=Path,
+        metavar="FILE",
+        help="Journals the upload, so that it can be resumed.",
+    )
+    upload.add_argument(
+        "--replay",
+        type=Path,
+        metavar="FILE",
+        help="Pushes recorded operations (see 'p2obt compose') instead.",
+    )
+    upload.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Records the operations instead (see 'p2obt compose').",
+    )
+    add_p2_arguments(upload)
+    add_pipeline_arguments(upload)
+    add_output_arguments(upload)
+
+    sync = commands.add_parser(
+        "sync",
+        parents=[common],
+        help="Uploads only the new or changed OBs to P2 (no duplicates).",
+    )
+    sync.add_argument("night_plan", type=Path)
+    add_p2_arguments(sync)
+    add_pipeline_arguments(sync)
+    add_output_arguments(sync)
+
+    serve = commands.add_parser(
+        "serve", parents=[common], help="Runs the service (see 'p2obt.service')."
+    )
+    serve.add_argument(
+        "--host",
+        help=f"The host to listen to (default: {OPTIONS.service.host}).",
+    )
+    serve.add_argument(
+        "--port",
+        type=int,
+        help=f"The port to listen to (default: {OPTIONS.service.port}).",
+    )
+    serve.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help=f"The worker processes (default: {OPTIONS.service.workers}).",
+    )
+    serve.add_argument(
+        "--warm",
+        metavar="DIR",
+        help="Warms the query cache for the pending night plans in the background.",
+    )
+    serve.add_argument("-u", "--user", dest="user_name", help="The p2 user name.")
+    serve.add_argument(
+        "--server",
+        default="production",
+        help="The P2 environment (default: production).",
+    )
+
+    submit = commands.add_parser("submit", help="Submits a night plan to the service.")
+    submit.add_argument("night_plan", type=Path)
+    submit.add_argument("--priority", type=int, default=0)
+    submit.add_argument(
+        "-o", "--output-dir", type=Path, help="The output directory (in its root)."
+    )
+    submit.add_argument("-c", "--container-id", type=int, help="The container on P2.")
+    submit.add_argument("--url", help="The service's url.")
+    submit.add_argument(
+        "--wait", action="store_true", help="Waits for the job and prints it."
+    )
+    return parser
+
+
+def set_options(args: argparse.Namespace) -> None:
+    """Sets the options from the command line arguments."""
+    if getattr(args, "cache_dir", None) is not None:
+        OPTIONS.cache.path = args.cache_dir
+    if getattr(args, "cache", None) is not None:
+        OPTIONS.cache.query.active = args.cache
+    if getattr(args, "cache_ttl", None) is not None:
+        OPTIONS.cache.query.ttl = args.cache_ttl
+    if getattr(args, "offline", False):
+        OPTIONS.cache.query.offline = True
+    for stage in ["query", "compose", "write", "upload"]:
+        if (workers := getattr(args, f"{stage}_workers", None)) is not None:
+            setattr(OPTIONS.pipeline.workers, stage, workers)
+    if getattr(args, "queue_size", None) is not None:
+        OPTIONS.pipeline.queue_size = args.queue_size
+    if getattr(args, "rate", None) is not None:
+        OPTIONS.p2.rate = args.rate
+
+
+def get_run_arguments(args: argparse.Namespace) -> Dict[str, Any]:
+    """Gets the arguments of :func:`create_obs <p2obt.automate.create_obs>`
+    shared by the commands."""
+    return {
+        "report": args.report,
+        "trace": args.trace,
+        "profile": args.profile,
+        "deadline": args.deadline,
+    }
+
+
+def run_parse(args: argparse.Namespace) -> int:
+    from .backend.parse import parse_night_plan_to_dict
+
+    night_plan = parse_night_plan_to_dict(args.night_plan)
+    if args.json:
+        print(json.dumps(night_plan, indent=2))
+        return 0
+
+    for run_key, nights in night_plan.items():
+        print(run_key)
+        for night_key, blocks in nights.items():
+            print(f"  {night_key} ({len(blocks)} blocks)")
+            for block in blocks:
+                cals = ", ".join(
+                    f"{cal['name']} ({cal['tag']})" for cal in block["cals"]
+                )
+                print(f"    {block['target']}: {cals}")
+    return 0
+
+
+def run_prefetch(args: argparse.Namespace) -> int:
+    from .backend.warm import warm_cache, watch
+
+    kwargs = {
+        "refresh": args.refresh,
+        "rate": args.warm_rate,
+        "workers": args.warm_workers,
+    }
+    if args.watch is not None:
+        try:
+            watch(args.night_plans, args.watch, **kwargs)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    summary = warm_cache(args.night_plans, **kwargs)
+    print(f"The queries are cached in '{OPTIONS.cache.path}'.")
+    return 1 if summary["failed"] else 0
+
+
+def get_exit_code(summary: Dict[str, Any]) -> int:
+    """Gets the exit code of a run (non-zero if any OB failed)."""
+    return 1 if summary.get("failed") else 0
+
+
+def run_compose(args: argparse.Namespace) -> int:
+    from .automate import create_obs
+
+    record = args.record or Path(f"{args.night_plan.stem}.jsonl")
+    summary = create_obs(
+        args.night_plan,
+        container_id=args.container_id,
+        record=record,
+        **get_run_arguments(args),
+    )
+    print(f"Recorded the operations in '{record}'.")
+    return get_exit_code(summary)
+
+
+def run_write(args: argparse.Namespace) -> int:
+    from .automate import create_obs
+
+    summary = create_obs(
+        args.night_plan, output_dir=args.output_dir, **get_run_arguments(args)
+    )
+    return get_exit_code(summary)
+
+
+def run_upload(args: argparse.Namespace) -> int:
+    if args.replay is not None:
+        from .automate import replay_obs
+
+        replay_obs(args.replay, args.user_name, server=args.server)
+        return 0
+
+    if args.night_plan is None:
+        raise UsageError("Either a night plan or '--replay' is needed!")
+    if args.dry_run:
+        if args.journal is not None:
+            raise UsageError("'--dry-run' can not be combined with '--journal'!")
+        args.record = None
+        return run_compose(args)
+
+    from .automate import create_obs
+
+    summary = create_obs(
+        args.night_plan,
+        container_id=args.container_id,
+        user_name=args.user_name,
+        server=args.server,
+        journal=args.journal,
+        **get_run_arguments(args),
+    )
+    return get_exit_code(summary)
+
+
+def run_sync(args: argparse.Namespace) -> int:
+    from .automate import create_obs
+
+    summary = create_obs(
+        args.night_plan,
+        container_id=args.container_id,
+        user_name=args.user_name,
+        server=args.server,
+        sync=True,
+        **get_run_arguments(args),
+    )
+    return get_exit_code(summary)
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    from .service import serve
+
+    serve(
+        args.host,
+        args.port,
+        args.workers,
+        args.user_name,
+        server=args.server,
+        warm=args.warm,
+    )
+    return 0
+
+
+def run_submit(args: argparse.Namespace) -> int:
+    from .service import ServiceError, submit_job, wait_for_job
+
+    arguments = {}
+    if args.output_dir is not None:
+        arguments["output_dir"] = str(args.output_dir.resolve())
+    if args.container_id is not None:
+        arguments["container_id"] = args.container_id
+    try:
+        job = submit_job(args.night_plan, args.priority, url=args.url, **arguments)
+        print(f"Submitted job {job['id']}.")
+        if args.wait:
+            job = wait_for_job(job["id"], url=args.url)
+            print(json.dumps(job, indent=2))
+            return 1 if job["status"] != "done" else 0
+    except ServiceError as error:
+        raise UsageError(f"{error} ({error.status})") from error
+    return 0
+
+
+COMMANDS = {
+    "parse": run_parse,
+    "prefetch": run_prefetch,
+    "compose": run_compose,
+    "write": run_write,
+    "upload": run_upload,
+    "sync": run_sync,
+    "serve": run_serve,
+    "submit": run_submit,
+}
+
+
+def main(argv: List[str] | None = None) -> int:
+    """Runs the command line interface ("p2obt <command>", see "p2obt --help")."""
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    set_options(args)
+    # NOTE: Only the errors of the user's input (e.g., a missing night plan)
+    # and of the service (see `run_submit`) are shown as usage errors, any
+    # other error is raised with its traceback
+    try:
+        night_plan = getattr(args, "night_plan", None)
+        if night_plan is not None and not night_plan.exists():
+            raise UsageError(f"The night plan '{night_plan}' does not exist!")
+        return COMMANDS[args.command](args)
+    except UsageError as error:
+        parser.exit(2, f"p2obt: error: {error}\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
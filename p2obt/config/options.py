@@ -1,14 +1,85 @@
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import deepcopy
 from pathlib import Path
 from types import SimpleNamespace
+from typing import Any, Dict, Iterator
 
-# NOTE: General settings for the logging
+# NOTE: General settings for the logging (set up on the first use of p2obt,
+# see 'p2obt.backend.logger.setup_logging'). The log is rotated once it exceeds
+# 'max_bytes' (or, if 'when' is set, e.g., to "midnight", at that time) and
+# on every new start, keeping 'backups' old logs
 log = SimpleNamespace(
     path=Path.home() / "Documents" / "logs",
     level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    format="%(asctime)s - %(name)s - %(levelname)s - %(context)s%(message)s",
+    max_bytes=10 * 1024**2,
+    when=None,
+    backups=5,
 )
 
+# NOTE: The directory for the local state of p2obt (e.g., the sync state)
+# and if the target queries are cached (shared by all processes) as well as
+# their time to live (in seconds). If offline, only the cached queries are
+# used (regardless of their age) and the catalogs are never queried. Parsed
+# night plans are cached (as json) by the hash of their content. The cache
+# warmer queries the targets of pending night plans ahead of time (at a rate
+# of targets per second with its workers) and refreshes the cached queries
+# older than a fraction of their time to live, every interval (in seconds)
+cache = SimpleNamespace(
+    path=Path.home() / ".cache" / "p2obt",
+    query=SimpleNamespace(active=False, ttl=7 * 24 * 3600.0, offline=False),
+    plans=SimpleNamespace(active=True),
+    warm=SimpleNamespace(rate=0.5, workers=2, refresh=0.8, interval=600.0),
+)
+
+# NOTE: The settings for the calls to the P2 API (shared by all connections).
+# The rate (calls per second) and burst of the rate limit, the retries and
+# the exponential backoff (in seconds) for transient errors as well as the
+# adaptive concurrency (calls in flight) and its latency target (in seconds).
+# If the session is reused, the access token is cached (in 'cache.path')
+# for at most its time to live (in seconds) and reused across invocations
+p2 = SimpleNamespace(
+    rate=10.0,
+    burst=20,
+    retries=5,
+    backoff=0.5,
+    max_backoff=30.0,
+    concurrency=SimpleNamespace(initial=4, min=1, max=16, latency=2.0),
+    session=SimpleNamespace(reuse=True, ttl=3600.0),
+)
+
+# NOTE: The settings for the pipeline of `create_obs`. The number of blocks
+# (of a science target and its calibrators) waiting in front of each stage
+# and the number of workers of each stage
+pipeline = SimpleNamespace(
+    queue_size=8,
+    workers=SimpleNamespace(query=8, compose=1, write=1, upload=4),
+)
+
+# NOTE: The memory budget (in bytes) of the resident set size of `create_obs`.
+# Once it is crossed, the composed OBs are dropped as soon as they have been
+# uploaded or written (streaming) instead of being held. If "0" it always
+# streams and if "None" the memory is not limited
+memory = SimpleNamespace(budget=None)
+
+# NOTE: The settings of the service (see `p2obt.service.serve`). The address
+# it listens to (only local by default), the number of its worker processes
+# and the interval (in seconds) in which idle workers poll the job queue. The
+# file of the secret token that authenticates the requests and the directory
+# to which the jobs' files are restricted (if "None", "token" and "jobs" in
+# the service's directory)
+service = SimpleNamespace(
+    host="127.0.0.1", port=8470, workers=2, poll=0.5, token=None, root=None
+)
+
+# NOTE: The settings of the profiling (see the 'profile' argument of `create_obs`
+# or the environment variable "P2OBT_PROFILE"). The interval (in seconds) of
+# the sampling profiler and if the allocations are traced (with the number
+# of frames kept per allocation), which slows down the run considerably
+profile = SimpleNamespace(interval=0.005, memory=True, frames=10)
+
 # NOTE: The settings for the `create_obs` and `create_ob`-scripts.
 # NOTE: Set the photometry
 photometry = SimpleNamespace(
@@ -98,8 +169,16 @@ catalogs = SimpleNamespace(
 )
 
 
-OPTIONS = SimpleNamespace(
+# NOTE: The global options. Use 'OPTIONS', which resolves to the options of
+# the current scope (see `options_scope`) or, outside of one, to these
+_OPTIONS = SimpleNamespace(
     log=log,
+    cache=cache,
+    p2=p2,
+    pipeline=pipeline,
+    memory=memory,
+    profile=profile,
+    service=service,
     photometry=photometry,
     wl0=wl0,
     dit=dit,
@@ -107,15 +186,91 @@ OPTIONS = SimpleNamespace(
     catalogs=catalogs,
 )
 
+_SCOPE: ContextVar[SimpleNamespace | None] = ContextVar("options", default=None)
 
-OPTIONS.log.path.mkdir(parents=True, exist_ok=True)
-with open(OPTIONS.log.path / "p2obt.log", "w+") as log_file:
-    log_file.write("Start of log:")
 
-print(f"Log was created in {OPTIONS.log.path}.")
-logging.basicConfig(
-    filename=OPTIONS.log.path / "p2obt.log",
-    filemode="w",
-    level=OPTIONS.log.level,
-    format=OPTIONS.log.format,
-)
+def get_options() -> SimpleNamespace:
+    """Gets the options of the current scope (see :func:`options_scope`)
+    or, outside of one, the global options."""
+    options = _SCOPE.get()
+    return _OPTIONS if options is None else options
+
+
+def set_option(options: SimpleNamespace, key: str, value: Any) -> None:
+    """Sets an option by its dotted key (e.g., "catalogs.local.active")."""
+    *path, name = key.split(".")
+    namespace = options
+    for part in path:
+        namespace = getattr(namespace, part, None)
+    if not isinstance(namespace, SimpleNamespace) or not hasattr(namespace, name):
+        raise AttributeError(f"Unknown option '{key}'!")
+    setattr(namespace, name, value)
+
+
+@contextmanager
+def options_scope(
+    overrides: Dict[str, Any] | None = None, options: SimpleNamespace | None = None
+) -> Iterator[SimpleNamespace]:
+    """Overlays the options within (in the current thread or task and the
+    threads of its pipeline) without changing them anywhere else.
+
+    On entry the options are copied (so later changes to the global
+    options do not affect the scope) and the overrides applied. Changes
+    made within only affect the scope.
+
+    Parameters
+    ----------
+    overrides : dict, optional
+        The options to change by their dotted keys
+        (e.g., {"catalogs.local.active": "ciao"}).
+    options : types.SimpleNamespace, optional
+        The options to start from. Default are the current options.
+
+    Examples
+    --------
+    >>> with options_scope({"catalogs.local.active": "ciao"}):
+    ...     create_obs("night_plan.txt", output_dir="obs")
+    """
+    scoped = deepcopy(get_options() if options is None else options)
+    for key, value in (overrides or {}).items():
+        set_option(scoped, key, value)
+
+    token = _SCOPE.set(scoped)
+    try:
+        yield scoped
+    finally:
+        _SCOPE.reset(token)
+
+
+class ContextOptions:
+    """The options, which resolve to those of the current scope (see
+    :func:`options_scope`) or, outside of one, to the global options.
+
+    Getting or setting an option (e.g., 'OPTIONS.catalogs.local.active')
+    therefore only affects the current scope, so that concurrent jobs
+    (e.g., in threads) can use different options.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_options(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_options(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(get_options(), name)
+
+    def __dir__(self):
+        return dir(get_options())
+
+    def __repr__(self) -> str:
+        return repr(get_options())
+
+    def __deepcopy__(self, memo: Dict) -> SimpleNamespace:
+        return deepcopy(get_options(), memo)
+
+    def __reduce__(self):
+        return SimpleNamespace, (), vars(get_options())
+
+
+OPTIONS = ContextOptions()
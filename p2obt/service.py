@@ -0,0 +1,829 @@
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import re
+import secrets
+import signal
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from contextvars import copy_context
+from copy import deepcopy
+from functools import reduce
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .automate import create_obs_batch_plan, init_batch_worker
+from .backend.logger import log_context, setup_logging
+from .backend.upload import login
+from .backend.warm import watch
+from .config.options import OPTIONS, options_scope
+
+# NOTE: A job is "partial" if some of its OBs failed and "failed" if all did
+JOB_STATES = ["queued", "running", "done", "partial", "failed", "cancelled"]
+
+# NOTE: The arguments of `create_obs` that a job can set (as json) and its
+# "options" (by their dotted keys, see `options_scope`). The credentials and
+# the server are the service's own
+JOB_ARGUMENTS = [
+    "options",
+    "container_id",
+    "resolution",
+    "configuration",
+    "modes",
+    "output_dir",
+    "sync",
+    "journal",
+    "record",
+    "report",
+    "trace",
+    "profile",
+    "deadline",
+]
+# NOTE: The arguments that are files written by a job. They are restricted
+# to the service's root (see `get_job_root`)
+PATH_ARGUMENTS = ["output_dir", "journal", "record", "report", "trace"]
+JOB_COLUMNS = [
+    "id",
+    "night_plan",
+    "arguments",
+    "priority",
+    "status",
+    "submitted",
+    "started",
+    "finished",
+    "worker",
+    "summary",
+    "error",
+]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    night_plan TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker INTEGER,
+    summary TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, id);
+"""
+
+
+class ServiceError(IOError):
+    """An error of a request to the service that is returned as an HTTP error."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def get_service_dir() -> Path:
+    """Gets the directory of the service's job queue and submitted night plans."""
+    return OPTIONS.cache.path / "service"
+
+
+def get_token_file() -> Path:
+    """Gets the file of the service's secret token (see 'OPTIONS.service.token')."""
+    return Path(OPTIONS.service.token or get_service_dir() / "token")
+
+
+def get_token(create: bool = False) -> str:
+    """Gets the secret token that authenticates the requests to the service.
+
+    The token is kept in a file that is only readable by the user, so
+    that other (local) users can not submit jobs under the user's P2 session.
+
+    Parameters
+    ----------
+    create : bool, optional
+        If 'True' a new token is created if there is none.
+
+    Raises
+    ------
+    IOError
+        If there is no token (and it is not created) or its file can be
+        read by other users.
+    """
+    file = get_token_file()
+    if create and not file.exists():
+        file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        try:
+            descriptor = os.open(file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as token_file:
+                token_file.write(secrets.token_urlsafe(32))
+
+    try:
+        if file.stat().st_mode & 0o077:
+            raise IOError(
+                f"The service's token '{file}' must only be readable by its owner"
+                " (chmod 600)!"
+            )
+        return file.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        raise IOError(f"No token of the service in '{file}' (not started?)!") from None
+
+
+def get_job_root() -> Path:
+    """Gets the directory to which the files written by the jobs are
+    restricted (see 'OPTIONS.service.root')."""
+    return Path(OPTIONS.service.root or get_service_dir() / "jobs").resolve()
+
+
+def resolve_job_path(path: str) -> str:
+    """Resolves a file written by a job (relative to the service's root)
+    and checks that it is within the root."""
+    if not isinstance(path, str):
+        raise ServiceError(400, f"Expected a path, not '{path}'")
+    root = get_job_root()
+    resolved = (root / Path(path).expanduser()).resolve()
+    if not resolved.is_relative_to(root):
+        raise ServiceError(400, f"The path '{path}' is outside of '{root}'")
+    return str(resolved)
+
+
+class JobQueue:
+    """A persistent priority queue of night-plan jobs (in a sqlite database).
+
+    The jobs survive a restart of the service and are shared by its
+    worker processes, each of which claims the queued job of the highest
+    priority (and, among those, the oldest) in a transaction.
+
+    Parameters
+    ----------
+    file : path, optional
+        The database. Default is "jobs.sqlite" in the service's directory
+        (see :func:`get_service_dir`).
+    """
+
+    def __init__(self, file: Path | None = None) -> None:
+        self.file = Path(file or get_service_dir() / "jobs.sqlite")
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        database = sqlite3.connect(self.file, timeout=30)
+        try:
+            # NOTE: The write-ahead log lets the workers read while one writes
+            database.execute("PRAGMA journal_mode=WAL")
+            database.executescript(SCHEMA)
+        finally:
+            database.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Opens a connection and runs everything within in one (write)
+        transaction, which is rolled back on an error."""
+        database = sqlite3.connect(self.file, timeout=30, isolation_level=None)
+        try:
+            database.execute("BEGIN IMMEDIATE")
+            yield database
+            database.execute("COMMIT")
+        except BaseException:
+            database.execute("ROLLBACK")
+            raise
+        finally:
+            database.close()
+
+    @staticmethod
+    def to_job(row: Tuple | None) -> Dict[str, Any] | None:
+        """Converts a row of the database to a job."""
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row))
+        for key in ["arguments", "summary"]:
+            job[key] = json.loads(job[key]) if job[key] is not None else None
+        return job
+
+    def submit(
+        self, night_plan: Path, arguments: Dict | None = None, priority: int = 0
+    ) -> Dict[str, Any]:
+        """Queues a night plan.
+
+        Parameters
+        ----------
+        night_plan : path
+            The night plan (readable by the service).
+        arguments : dict, optional
+            The arguments passed to :func:`create_obs <p2obt.automate.create_obs>`
+            (see 'JOB_ARGUMENTS').
+        priority : int, optional
+            The job's priority. Jobs of a higher priority are run first.
+
+        Returns
+        -------
+        job : dict
+        """
+        arguments = arguments or {}
+        if isinstance(priority, str) and re.fullmatch(r"[+-]?\d+", priority.strip()):
+            priority = int(priority)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ServiceError(
+                400, f"The priority must be an integer, not {priority!r}"
+            )
+        if unknown := set(arguments) - set(JOB_ARGUMENTS):
+            raise ServiceError(400, f"Unknown arguments: {', '.join(sorted(unknown))}")
+        try:
+            with options_scope(arguments.get("options")):
+                pass
+        except AttributeError as error:
+            raise ServiceError(400, str(error)) from None
+
+        with self.transaction() as database:
+            cursor = database.execute(
+                "INSERT INTO jobs (night_plan, arguments, priority, submitted)"
+                " VALUES (?, ?, ?, ?)",
+                (str(night_plan), json.dumps(arguments), priority, time.time()),
+            )
+            return self.get(cursor.lastrowid, database)
+
+    def get(
+        self, job_id: int, database: sqlite3.Connection | None = None
+    ) -> Dict[str, Any] | None:
+        """Gets a job (or "None" if it does not exist)."""
+        if database is None:
+            with self.transaction() as database:
+                return self.get(job_id, database)
+
+        columns = ", ".join(JOB_COLUMNS)
+        row = database.execute(
+            f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self.to_job(row)
+
+    def list(self, status: str | None = None) -> List[Dict[str, Any]]:
+        """Lists the jobs (without their summaries), optionally by status."""
+        columns = ", ".join(
+            column if column != "summary" else "NULL" for column in JOB_COLUMNS
+        )
+        query, parameters = f"SELECT {columns} FROM jobs", ()
+        if status is not None:
+            query, parameters = f"{query} WHERE status = ?", (status,)
+        with self.transaction() as database:
+            rows = database.execute(f"{query} ORDER BY id", parameters).fetchall()
+        return [self.to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Counts the jobs by status."""
+        with self.transaction() as database:
+            rows = database.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATES}
+
+    def claim(self, worker: int | None = None) -> Dict[str, Any] | None:
+        """Claims the next queued job (marks it as running) or returns
+        "None" if there is none."""
+        with self.transaction() as database:
+            row = database.execute(
+                "SELECT id FROM jobs WHERE status = 'queued'"
+                " ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            database.execute(
+                "UPDATE jobs SET status = 'running', started = ?, worker = ?"
+                " WHERE id = ?",
+                (time.time(), worker, row[0]),
+            )
+            return self.get(row[0], database)
+
+    @staticmethod
+    def get_status(summary: Dict[str, Any]) -> Tuple[str, str | None]:
+        """Gets a finished job's status and error from its summary."""
+        if summary.get("error") is not None:
+            return "failed", summary["error"]
+        if failed := summary.get("failed", 0):
+            error = f"{failed} of {summary['obs']} OB(s) failed"
+            return ("failed" if not summary.get("created") else "partial"), error
+        return "done", None
+
+    def finish(self, job_id: int, summary: Dict[str, Any]) -> None:
+        """Stores a job's summary (see :func:`create_obs <p2obt.automate.create_obs>`)
+        and marks it as done, partial (some OBs failed) or failed (it contains
+        an error or all OBs failed)."""
+        status, error = self.get_status(summary)
+        with self.transaction() as database:
+            database.execute(
+                "UPDATE jobs SET status = ?, finished = ?, summary = ?, error = ?"
+                " WHERE id = ?",
+                (
+                    status,
+                    time.time(),
+                    json.dumps(summary, default=str),
+                    error,
+                    job_id,
+                ),
+            )
+
+    def cancel(self, job_id: int) -> Dict[str, Any]:
+        """Cancels a queued job (running jobs can not be cancelled)."""
+        with self.transaction() as database:
+            job = self.get(job_id, database)
+            if job is None:
+                raise ServiceError(404, f"Job {job_id} not found")
+            if job["status"] != "queued":
+                raise ServiceError(409, f"Job {job_id} is already {job['status']}")
+            database.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+            return self.get(job_id, database)
+
+    def recover(self, worker: int | None = None) -> int:
+        """Queues the jobs again that were running when the service stopped
+        (or, if given, when a worker process died).
+
+        Parameters
+        ----------
+        worker : int, optional
+            The process id of the worker.
+
+        Returns
+        -------
+        recovered : int
+            The number of jobs queued again.
+        """
+        query, parameters = "WHERE status = 'running'", ()
+        if worker is not None:
+            query, parameters = f"{query} AND worker = ?", (worker,)
+        with self.transaction() as database:
+            cursor = database.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, worker = NULL"
+                f" {query}",
+                parameters,
+            )
+            return cursor.rowcount
+
+
+def warm_up() -> None:
+    """Imports the catalogs' clients and loads the local catalog (if it
+    is used), so that the first job does not pay for it."""
+    from astroquery.ipac.irsa.irsa_dust import IrsaDust  # noqa: F401
+    from astroquery.simbad import Simbad  # noqa: F401
+    from astroquery.vizier import Vizier  # noqa: F401
+
+    from .backend.query import load_local_catalog
+
+    if "local" in OPTIONS.catalogs.available:
+        local = OPTIONS.catalogs.local
+        load_local_catalog(getattr(local, local.active))
+
+
+def run_job(job: Dict[str, Any], credentials: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs a job (in a worker process) with its options and returns its summary."""
+    arguments = dict(job["arguments"])
+    overrides = arguments.pop("options", None)
+    if arguments.get("output_dir") is None and arguments.get("record") is None:
+        if credentials["user_name"] is None:
+            return {"error": "The service was started without a user name!"}
+
+    print(f"Running job {job['id']} ('{Path(job['night_plan']).name}')...")
+    with log_context(job=job["id"]), options_scope(overrides):
+        return create_obs_batch_plan(job["night_plan"], {**arguments, **credentials})
+
+
+def run_worker(
+    file: Path,
+    credentials: Dict[str, Any],
+    stop: Any,
+    initargs: Tuple,
+) -> None:
+    """Runs the queued jobs until stopped (in a worker process of the service).
+
+    The worker keeps its imports, the local catalog and the query cache
+    warm between the jobs and reuses the service's P2 session.
+    """
+    # NOTE: An interrupt stops the service, which then stops the workers
+    # after their running jobs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_batch_worker(*initargs)
+    try:
+        warm_up()
+    except Exception:
+        logging.error("Failed warming up the worker!", exc_info=True)
+
+    jobs = JobQueue(file)
+    while not stop.is_set():
+        job = jobs.claim(os.getpid())
+        if job is None:
+            stop.wait(OPTIONS.service.poll)
+            continue
+        jobs.finish(job["id"], run_job(job, credentials))
+
+
+class JobServer(ThreadingHTTPServer):
+    """A long-running service that creates the OBs of the night plans
+    submitted to its (local) HTTP endpoint with warm worker processes.
+
+    The endpoints are:
+
+    * ``POST /jobs``: Submits a job, either the path of a night plan
+      (``{"night_plan": ...}``) or its content (``{"content": ...}``), with
+      an optional ``"priority"`` and ``"arguments"`` (see 'JOB_ARGUMENTS').
+    * ``GET /jobs`` (optionally ``?status=queued``): Lists the jobs.
+    * ``GET /jobs/<id>``: Gets a job's status and summary.
+    * ``DELETE /jobs/<id>``: Cancels a queued job.
+    * ``GET /status``: Gets the service's workers and number of jobs.
+
+    Every request needs the service's secret token (see :func:`get_token`)
+    as ``Authorization: Bearer <token>`` and the files written by a job
+    are restricted to the service's root (see :func:`get_job_root`).
+
+    Parameters
+    ----------
+    host : str, optional
+        The host to listen to. Default is 'OPTIONS.service.host'.
+    port : int, optional
+        The port to listen to. Default is 'OPTIONS.service.port'.
+    workers : int, optional
+        The number of worker processes. Default is 'OPTIONS.service.workers'.
+    file : path, optional
+        The database of the job queue (see :class:`JobQueue`).
+    user_name : str, optional
+        The p2 user name. If not given, only jobs with an 'output_dir'
+        (or 'record') can be run.
+    store_password : bool, optional
+        If 'True' the password will be stored in the keyring.
+    server : str, optional
+        The server to connect to. Can be either "production" or "demo".
+    warm : path or str, optional
+        Pending night plans (e.g., a directory) for which the query cache
+        is warmed in the background (see :func:`watch <p2obt.backend.warm.watch>`).
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str | None = None,
+        port: int | None = None,
+        workers: int | None = None,
+        file: Path | None = None,
+        user_name: str | None = None,
+        store_password: bool | None = True,
+        server: str | None = "production",
+        warm: Path | str | None = None,
+    ) -> None:
+        host = host or OPTIONS.service.host
+        port = OPTIONS.service.port if port is None else port
+        super().__init__((host, port), JobRequestHandler)
+        self.jobs = JobQueue(file)
+        self.workers = workers or OPTIONS.service.workers
+        self.credentials = {
+            "user_name": user_name,
+            "store_password": store_password,
+            "server": server,
+        }
+        self.started = time.time()
+        self.context = multiprocessing.get_context()
+        self.stop_event = self.context.Event()
+        self.processes, self.warm, self.initargs = [], warm, None
+        self.token = get_token(create=True)
+
+    @property
+    def url(self) -> str:
+        """The service's base url."""
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def authorize(self, header: str | None) -> bool:
+        """Checks the (bearer) token of a request's 'Authorization' header."""
+        scheme, _, token = (header or "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            token.strip().encode("utf-8"), self.token.encode("utf-8")
+        )
+
+    def start_worker(self, index: int) -> None:
+        """Starts a worker process (in the slot 'index')."""
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.jobs.file, self.credentials, self.stop_event, self.initargs),
+            name=f"p2obt-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        if index < len(self.processes):
+            self.processes[index] = process
+        else:
+            self.processes.append(process)
+
+    def monitor_workers(self) -> None:
+        """Replaces the worker processes that died (e.g., were killed) until
+        the service stops and queues their running jobs again."""
+        while not self.stop_event.wait(OPTIONS.service.poll):
+            for index, process in enumerate(list(self.processes)):
+                if process.is_alive() or self.stop_event.is_set():
+                    continue
+                recovered = self.jobs.recover(process.pid)
+                print(
+                    f"[ERROR]: Worker {process.pid} died (exit code {process.exitcode})!"
+                    f" Queued {recovered} job(s) again."
+                )
+                logging.error(
+                    f"Worker {process.pid} died with exit code {process.exitcode}!"
+                )
+                self.start_worker(index)
+
+    def start_workers(self) -> None:
+        """Logs in to P2 (once, so the workers reuse the cached session) and
+        starts the worker processes (which are replaced if they die)."""
+        if (recovered := self.jobs.recover()) > 0:
+            print(f"Queued {recovered} interrupted job(s) again.")
+        if self.credentials["user_name"] is not None:
+            login(
+                self.credentials["user_name"],
+                self.credentials["store_password"],
+                False,
+                self.credentials["server"],
+            )
+
+        options = deepcopy(OPTIONS)
+        options.cache.query.active = True
+        self.initargs = (
+            options,
+            self.context.BoundedSemaphore(OPTIONS.p2.concurrency.max),
+            OPTIONS.p2.rate / self.workers,
+            max(1, OPTIONS.p2.burst // self.workers),
+        )
+        for index in range(self.workers):
+            self.start_worker(index)
+        threading.Thread(
+            target=copy_context().run,
+            args=(self.monitor_workers,),
+            name="p2obt-monitor",
+            daemon=True,
+        ).start()
+
+        if self.warm is not None:
+            threading.Thread(
+                target=copy_context().run,
+                args=(watch, self.warm, None, self.stop_event),
+                name="p2obt-warmer",
+                daemon=True,
+            ).start()
+
+    def stop_workers(self, timeout: float | None = None) -> None:
+        """Stops the worker processes (after they have finished their jobs)."""
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes.clear()
+
+    def status(self) -> Dict[str, Any]:
+        """Gets the service's workers, uptime (in seconds) and number of jobs."""
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started,
+            "workers": [
+                {"name": process.name, "pid": process.pid, "alive": process.is_alive()}
+                for process in self.processes
+            ],
+            "jobs": self.jobs.counts(),
+        }
+
+    def submit(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Submits a job from the data of a request."""
+        if not isinstance(data, dict):
+            raise ServiceError(400, "Expected a json object")
+        if data.get("content") is not None:
+            night_plan = get_service_dir() / "plans" / f"{uuid.uuid4().hex}.txt"
+            night_plan.parent.mkdir(parents=True, exist_ok=True)
+            night_plan.write_text(data["content"], encoding="utf-8")
+        elif data.get("night_plan") is not None:
+            night_plan = Path(data["night_plan"]).expanduser().resolve()
+            if not night_plan.exists():
+                raise ServiceError(400, f"Night plan '{night_plan}' not found")
+        else:
+            raise ServiceError(400, "Either 'night_plan' or 'content' is needed")
+        arguments = data.get("arguments") or {}
+        if not isinstance(arguments, dict):
+            raise ServiceError(400, "The arguments must be a json object")
+        arguments = {
+            key: (
+                resolve_job_path(value)
+                if key in PATH_ARGUMENTS and value is not None
+                else value
+            )
+            for key, value in arguments.items()
+        }
+        # NOTE: Options that are paths (e.g., 'cache.path' or 'log.path')
+        # would let a job write outside of the root
+        for key in arguments.get("options") or {}:
+            try:
+                value = reduce(getattr, key.split("."), OPTIONS)
+            except AttributeError:
+                continue
+            if isinstance(value, Path) or key.rsplit(".", 1)[-1] in (
+                "path",
+                "token",
+                "root",
+            ):
+                raise ServiceError(400, f"The option '{key}' can not be set by a job")
+
+        priority = data.get("priority")
+        return self.jobs.submit(
+            night_plan, arguments, 0 if priority is None else priority
+        )
+
+    def dispatch(self, method: str, path: str, data: Any) -> Tuple[int, Any]:
+        """Dispatches a request to the job queue."""
+        url = urlsplit(path)
+        match = re.fullmatch(r"/jobs/(\d+)", url.path)
+        try:
+            if url.path == "/status" and method == "GET":
+                return 200, self.status()
+            if url.path == "/jobs" and method == "GET":
+                status = parse_qs(url.query).get("status", [None])[0]
+                return 200, self.jobs.list(status)
+            if url.path == "/jobs" and method == "POST":
+                return 201, self.submit(data)
+            if match and method == "GET":
+                job = self.jobs.get(int(match.group(1)))
+                if job is None:
+                    raise ServiceError(404, f"Job {match.group(1)} not found")
+                return 200, job
+            if match and method == "DELETE":
+                return 200, self.jobs.cancel(int(match.group(1)))
+        except ServiceError as error:
+            return error.status, {"error": str(error)}
+        except Exception as error:
+            logging.error(f"Request {method} {path} failed!", exc_info=True)
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+        return 404, {"error": f"Unknown endpoint {method} {url.path}"}
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """The request handler of the `JobServer`."""
+
+    def handle_method(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            data = json.loads(self.rfile.read(length)) if length else None
+        except json.JSONDecodeError:
+            status, body = 400, {"error": "Invalid json"}
+        else:
+            if self.server.authorize(self.headers.get("Authorization")):
+                status, body = self.server.dispatch(self.command, self.path, data)
+            else:
+                status, body = 401, {"error": "Unauthorized (see 'get_token')"}
+
+        payload = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_DELETE = handle_method
+
+    def log_message(self, format: str, *args) -> None:
+        """Logs the requests instead of printing them."""
+        logging.info(f"{self.address_string()} {format % args}")
+
+
+def serve(
+    host: str | None = None,
+    port: int | None = None,
+    workers: int | None = None,
+    user_name: str | None = None,
+    store_password: bool | None = True,
+    server: str | None = "production",
+    warm: Path | str | None = None,
+) -> None:
+    """Runs the service (see :class:`JobServer`) until interrupted.
+
+    Parameters
+    ----------
+    host : str, optional
+        The host to listen to. Default is 'OPTIONS.service.host'.
+    port : int, optional
+        The port to listen to. Default is 'OPTIONS.service.port'.
+    workers : int, optional
+        The number of worker processes. Default is 'OPTIONS.service.workers'.
+    user_name : str, optional
+        The p2 user name. If not given, only jobs with an 'output_dir'
+        (or 'record') can be run.
+    store_password : bool, optional
+        If 'True' the password will be stored in the keyring.
+    server : str, optional
+        The server to connect to. Can be either "production" or "demo".
+    warm : path or str, optional
+        Pending night plans (e.g., a directory) for which the query cache
+        is warmed in the background.
+    """
+    setup_logging()
+    job_server = JobServer(
+        host, port, workers, None, user_name, store_password, server, warm
+    )
+    job_server.start_workers()
+    print(f"Serving on {job_server.url} with {job_server.workers} worker(s)...")
+    try:
+        job_server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping (after the running jobs)...")
+    finally:
+        job_server.server_close()
+        job_server.stop_workers()
+
+
+def request(method: str, path: str, data: Any = None, url: str | None = None) -> Any:
+    """Makes a request to the service and returns its (json) response.
+
+    Parameters
+    ----------
+    method : str
+        The HTTP method.
+    path : str
+        The endpoint (e.g., "/jobs/1").
+    data : any, optional
+        The data sent as json.
+    url : str, optional
+        The service's base url. Default is given by 'OPTIONS.service'.
+    """
+    url = url or f"http://{OPTIONS.service.host}:{OPTIONS.service.port}"
+    payload = json.dumps(data).encode("utf-8") if data is not None else None
+    try:
+        token = get_token()
+    except IOError as error:
+        raise ServiceError(401, str(error)) from None
+    service_request = urllib.request.Request(
+        f"{url}{path}",
+        data=payload,
+        method=method,
+        headers={
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    try:
+        with urllib.request.urlopen(service_request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        message = json.loads(error.read() or b"{}").get("error", error.reason)
+        raise ServiceError(error.code, message) from None
+    except urllib.error.URLError as error:
+        raise ServiceError(503, f"No service at '{url}' ({error.reason})") from None
+
+
+def submit_job(
+    night_plan: Path,
+    priority: int = 0,
+    upload_content: bool = False,
+    url: str | None = None,
+    **arguments,
+) -> Dict[str, Any]:
+    """Submits a night plan to the service (see :class:`JobServer`).
+
+    Parameters
+    ----------
+    night_plan : path
+        The night plan.
+    priority : int, optional
+        The job's priority. Jobs of a higher priority are run first.
+    upload_content : bool, optional
+        If 'True' the night plan's content is sent (e.g., if the service
+        can not read the file), otherwise its path.
+    url : str, optional
+        The service's base url. Default is given by 'OPTIONS.service'.
+    **arguments
+        Arguments passed to :func:`create_obs <p2obt.automate.create_obs>`
+        (see 'JOB_ARGUMENTS', e.g., 'output_dir' or 'container_id').
+
+    Returns
+    -------
+    job : dict
+    """
+    data = {"priority": priority, "arguments": arguments}
+    if upload_content:
+        data["content"] = Path(night_plan).read_text(encoding="utf-8")
+    else:
+        data["night_plan"] = str(Path(night_plan).resolve())
+    return request("POST", "/jobs", data, url)
+
+
+def get_job(job_id: int, url: str | None = None) -> Dict[str, Any]:
+    """Gets a job's status and summary from the service."""
+    return request("GET", f"/jobs/{job_id}", url=url)
+
+
+def wait_for_job(
+    job_id: int, interval: float = 1.0, url: str | None = None
+) -> Dict[str, Any]:
+    """Waits until a job has finished (or was cancelled) and returns it."""
+    while (job := get_job(job_id, url))["status"] in ["queued", "running"]:
+        time.sleep(interval)
+    return job
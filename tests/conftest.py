@@ -0,0 +1,109 @@
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+from p2obt import automate
+from p2obt.backend.client import reset_limiters
+from p2obt.backend.local_server import LocalP2Server
+from p2obt.config.options import options_scope
+
+PROG_ID = "110.2474.004"
+NIGHT_PLAN = f"""run 3, {PROG_ID} = 0109.C-0413(C), ATs large array, MATISSE, LR, visitor mode
+
+night 2, June 6:
+LST   source            coordinates                      L        N      K      V         SpT    diam   airm.   time  comment
+                        RA (J2000)   dec (J2000)      [Jy]     [Jy]  [mag]  [mag]               [mas]          [min]
+
+11:40 cal_LN_HD138538   15 36 43.222  -66 19 01.33    65.7     10.6          4.11     K1.5III    2.47    1.70     30
+12:10 HD 104237         12 00 05.081  -78 11 34.56     8.6     13.4   4.59                               1.69     30  MR
+
+12:40 HD 100546         11 33 25.437  -70 11 41.24     6.5     59.9   5.42                               1.47     30  MR
+13:10 cal_LN_HD102839   11 49 56.614  -70 13 32.85    43.9      7.3          4.99        G6Ib    2.02    1.49     30
+
+13:40 cal_L_HD96918     11 08 35.390  -58 58 30.13    67.2     11.0          3.92       G0Ia0    2.39    1.41     30
+14:10 HD 98922          11 22 31.674  -53 22 11.46    16.6     31.4   4.28                               1.40     30  MR
+14:40 cal_N_HD102461    11 47 19.141  -57 41 47.39    80.4     13.2          5.44       K5III    2.97    1.46     30
+"""
+
+
+class FakeCatalogs:
+    """Answers the target queries (without the catalogs) with fixed values."""
+
+    def __init__(self) -> None:
+        self.kmag = 4.0
+
+    def query(self, name: str, *args, **kwargs) -> Dict:
+        return {
+            "name": name,
+            "ra": 150.0,
+            "dec": -60.0,
+            "pmra": 1.0,
+            "pmdec": 2.0,
+            "Kmag": self.kmag,
+            "Hmag": 4.5,
+            "Vmag": 6.0,
+            "med-Lflux": 10.0,
+            "med-Nflux": 5.0,
+        }
+
+
+@pytest.fixture
+def night_plan(tmp_path: Path) -> Path:
+    """A night plan with three blocks (of one run and night)."""
+    file = tmp_path / "night_plan.txt"
+    file.write_text(NIGHT_PLAN, encoding="utf-8")
+    return file
+
+
+@pytest.fixture
+def p2(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> LocalP2Server:
+    """A local stand-in for P2 that `create_obs` logs in to (with the
+    catalog queries faked and the caches and logs in a temporary directory)."""
+    catalogs = FakeCatalogs()
+    with LocalP2Server(runs=[PROG_ID]) as server:
+        server.catalogs = catalogs
+        monkeypatch.setattr(automate, "query", catalogs.query)
+        monkeypatch.setattr(automate, "login", lambda *args: server.connect())
+        options = {
+            "cache.path": tmp_path / "cache",
+            "cache.query.active": False,
+            "cache.plans.active": False,
+            "log.path": tmp_path / "logs",
+            "p2.rate": 1000.0,
+            "p2.burst": 1000,
+        }
+        with options_scope(options):
+            reset_limiters()
+            yield server
+        reset_limiters()
+
+
+def get_items(server: LocalP2Server) -> List[Tuple]:
+    """Gets the items on the stand-in (by their path of names) with the
+    templates of the OBs, sorted."""
+    store = server.store
+    tree = []
+
+    def walk(container_id: int, path: Tuple[str, ...]) -> None:
+        for kind, item_id in store.containers[container_id]["items"]:
+            if kind == "ob":
+                templates = sorted(
+                    template["templateName"]
+                    for template in store.templates[item_id].values()
+                )
+                tree.append((*path, store.obs[item_id]["name"], *templates))
+            else:
+                name = store.containers[item_id]["name"]
+                tree.append((*path, name))
+                walk(item_id, (*path, name))
+
+    for run in store.runs:
+        walk(run["containerId"], (run["progId"],))
+    return sorted(tree)
+
+
+@pytest.fixture
+def get_tree():
+    """Gets the items on a stand-in (see :func:`get_items`)."""
+    return get_items
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+from io import BytesIO
+from typing import Callable, List
+
+import p2api
+import pytest
+
+from p2obt import aio
+from p2obt.backend.client import get_limiters, reset_limiters, set_budget
+from p2obt.config.options import OPTIONS, options_scope
+
+httpx = pytest.importorskip("httpx")
+
+
+@pytest.fixture(autouse=True)
+def limits():
+    """Calls P2 without rate limits and (nearly) without backoffs."""
+    options = {
+        "p2.rate": 1000.0,
+        "p2.burst": 1000,
+        "p2.retries": 3,
+        "p2.backoff": 0.001,
+    }
+    with options_scope(options):
+        reset_limiters()
+        yield
+    reset_limiters()
+
+
+def connect(handler: Callable, authenticate=None) -> aio.AsyncP2Connection:
+    """Connects to a P2 API whose calls are answered by the handler."""
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return aio.AsyncP2Connection("demo", "expired", http_client, authenticate)
+
+
+def respond(status: int, content: dict | None = None) -> "httpx.Response":
+    """Makes a json response of the P2 API."""
+    return httpx.Response(status, json=content or {"error": "failed"})
+
+
+def test_retry() -> None:
+    """Tests that transient errors are retried and others are not."""
+    script = [respond(503), respond(502), respond(200, {"obId": 1})]
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        return script.pop(0)
+
+    async def run():
+        async with connect(handler) as connection:
+            assert (await connection.request("GET", "/obsBlocks/1"))[0] == {"obId": 1}
+            script.append(respond(502))
+            with pytest.raises(p2api.P2Error):
+                await connection.request("POST", "/containers/1/items", {})
+
+    asyncio.run(run())
+    assert calls == ["GET", "GET", "GET", "POST"]
+
+
+def test_refresh() -> None:
+    """Tests that an unauthorized call is retried once with a new token
+    (also on its last attempt)."""
+    tokens, logins = [], []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        token = request.headers["Authorization"].split()[-1]
+        tokens.append(token)
+        if token == "expired" or len(logins) > 1:
+            return respond(401)
+        return respond(200, {"obId": 1})
+
+    async def authenticate() -> str:
+        logins.append(True)
+        return f"token-{len(logins)}"
+
+    async def run():
+        async with connect(handler, authenticate) as connection:
+            with options_scope({"p2.retries": 0}):
+                assert (await connection.request("GET", "/obsBlocks/1"))[0]
+            assert connection.access_token == "token-1"
+
+            # NOTE: A token that is rejected again is not refreshed twice
+            connection.access_token = "expired"
+            with pytest.raises(p2api.P2Error):
+                await connection.request("GET", "/obsBlocks/1")
+
+    asyncio.run(run())
+    assert tokens == ["expired", "token-1", "expired", "token-2"]
+    assert len(logins) == 2
+
+
+def test_shared_limits() -> None:
+    """Tests that the calls keep to the concurrency budget shared with the
+    threads and processes and update the shared limiter."""
+    in_flight, peaks = [0], []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        in_flight[0] += 1
+        peaks.append(in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return respond(200, {"obId": 1})
+
+    async def run():
+        async with connect(handler) as connection:
+            await asyncio.gather(
+                *[connection.request("GET", f"/obsBlocks/{i}") for i in range(8)]
+            )
+
+    budget = threading.BoundedSemaphore(2)
+    set_budget(budget)
+    try:
+        asyncio.run(run())
+    finally:
+        set_budget(None)
+    assert max(peaks) == 2 and len(peaks) == 8
+    _, concurrency_limiter = get_limiters()
+    assert concurrency_limiter.active == 0
+    assert concurrency_limiter.limit > OPTIONS.p2.concurrency.initial
+
+
+def make_votable(names: List[str]) -> bytes:
+    """Makes the VOTable of a VizieR response."""
+    from astropy.io.votable import from_table
+    from astropy.table import Table
+
+    votable = from_table(Table({"Name": names, "Kmag": [4.0] * len(names)}))
+    votable.get_first_table().name = "I/355/gaiadr3"
+    content = BytesIO()
+    votable.to_xml(content)
+    return content.getvalue()
+
+
+def test_get_catalog() -> None:
+    """Tests that a VizieR catalog is queried and parsed without astroquery's
+    private api."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=make_votable(["HD 142666"]))
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            return await aio.get_catalog(http, "HD 142666", "gaia")
+
+    table = asyncio.run(run())
+    assert list(table["Name"]) == ["HD 142666"]
+    assert requests[0].url.path == "/viz-bin/votable"
+    assert b"HD" in requests[0].content
+    assert not aio.parse_votable(b"<html>Error</html>")
@@ -0,0 +1,55 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from p2obt import automate
+from p2obt.automate import create_obs, get_batch_names
+from p2obt.backend.local_server import LocalP2Server
+
+
+def test_get_batch_names() -> None:
+    """Tests that night plans of the same name are told apart."""
+    night_plans = [Path("a/plan.txt"), Path("b/plan.txt"), Path("a/other.txt")]
+    assert get_batch_names(night_plans) == {
+        Path("a/plan.txt"): "a_plan",
+        Path("b/plan.txt"): "b_plan",
+        Path("a/other.txt"): "other",
+    }
+
+
+@pytest.mark.parametrize(
+    "night_plans",
+    [
+        [Path("a/plan.txt"), Path("a/plan.txt")],
+        [Path("x/a/plan.txt"), Path("y/a/plan.txt")],
+    ],
+)
+def test_get_batch_names_duplicates(night_plans) -> None:
+    """Tests that night plans that cannot be told apart are an error."""
+    with pytest.raises(IOError):
+        get_batch_names(night_plans)
+
+
+def test_create_obs_streaming(
+    tmp_path: Path,
+    night_plan: Path,
+    p2: LocalP2Server,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that the first block is queried while the night plan is still
+    being parsed."""
+    queried = threading.Event()
+    iter_night_plan, query = automate.iter_night_plan, automate.query
+
+    def streamed(*args, **kwargs):
+        blocks = iter_night_plan(*args, **kwargs)
+        yield next(blocks)
+        assert queried.wait(5), "The first block waits for the whole night plan!"
+        yield from blocks
+
+    monkeypatch.setattr(automate, "iter_night_plan", streamed)
+    monkeypatch.setattr(automate, "query", lambda *args: queried.set() or query(*args))
+    summary = create_obs(night_plan, output_dir=tmp_path / "obs")
+    assert summary["failed"] == 0
+    assert len(list((tmp_path / "obs").rglob("*.obx"))) == summary["obs"] > 0
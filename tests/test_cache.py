@@ -0,0 +1,50 @@
+import threading
+from contextvars import copy_context
+from pathlib import Path
+
+import pytest
+
+from p2obt.backend.cache import get_cache_dir, load_cached, save_cached
+from p2obt.config.options import options_scope
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path: Path):
+    """Keeps the caches in a temporary directory."""
+    with options_scope({"cache.path": tmp_path}):
+        yield tmp_path
+
+
+@pytest.mark.parametrize("fmt", ["pickle", "json"])
+def test_save_cached(fmt: str) -> None:
+    """Tests that a saved value is loaded again (and expires)."""
+    save_cached("queries", "key", {"name": "HD 142666"}, fmt)
+    assert load_cached("queries", "key", fmt=fmt) == {"name": "HD 142666"}
+    assert load_cached("queries", "key", ttl=-1, fmt=fmt) is None
+    assert load_cached("queries", "missing", fmt=fmt) is None
+
+
+def test_save_cached_threads() -> None:
+    """Tests that threads saving the same key at the same time do not collide."""
+    errors, barrier = [], threading.Barrier(16)
+
+    def save(index: int) -> None:
+        barrier.wait()
+        try:
+            for number in range(50):
+                save_cached("queries", "key", {"thread": index, "number": number})
+        except Exception as error:
+            errors.append(error)
+
+    threads = [
+        threading.Thread(target=copy_context().run, args=(save, index))
+        for index in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert load_cached("queries", "key")["number"] == 49
+    assert not list(get_cache_dir("queries").glob("*.tmp"))
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+
+from p2obt import cli
+from p2obt.backend import warm
+from p2obt.config.options import OPTIONS, options_scope
+
+
+def test_prefetch_options(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the warmer's flags do not set the pipeline's options."""
+    calls = []
+    monkeypatch.setattr(
+        warm,
+        "warm_cache",
+        lambda *args, **kwargs: calls.append(kwargs) or {"failed": 0},
+    )
+    with options_scope({}):
+        rate, workers = OPTIONS.p2.rate, OPTIONS.pipeline.workers.query
+        assert (
+            cli.main(["prefetch", "plans", "--rate", "2", "--query-workers", "4"]) == 0
+        )
+        assert OPTIONS.p2.rate == rate
+        assert OPTIONS.pipeline.workers.query == workers
+    assert calls == [{"refresh": None, "rate": 2.0, "workers": 4}]
+
+
+def test_main_errors(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that only the errors of the input are usage errors."""
+    with options_scope({}):
+        with pytest.raises(SystemExit) as error:
+            cli.main(["write", str(tmp_path / "missing.txt"), "-o", str(tmp_path)])
+        assert error.value.code == 2
+
+        night_plan = tmp_path / "night_plan.txt"
+        night_plan.touch()
+        for exception in [ValueError("A bug"), PermissionError("Not writable")]:
+
+            def broken(args):
+                raise exception
+
+            monkeypatch.setitem(cli.COMMANDS, "parse", broken)
+            with pytest.raises(type(exception)):
+                cli.main(["parse", str(night_plan)])
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        ["upload"],
+        ["upload", "{night_plan}", "--dry-run", "--journal", "journal.jsonl"],
+        ["submit", "{night_plan}", "--url", "http://127.0.0.1:1"],
+    ],
+)
+def test_usage_errors(
+    tmp_path: Path, capsys: pytest.CaptureFixture, arguments: list
+) -> None:
+    """Tests that the invalid combinations of arguments and the errors of
+    the service are usage errors."""
+    night_plan = tmp_path / "night_plan.txt"
+    night_plan.touch()
+    arguments = [argument.format(night_plan=night_plan) for argument in arguments]
+    with options_scope({"cache.path": tmp_path / "cache"}):
+        with pytest.raises(SystemExit) as error:
+            cli.main(arguments)
+    assert error.value.code == 2
+    assert "p2obt: error:" in capsys.readouterr().err
@@ -0,0 +1,141 @@
+from typing import Any, List
+
+import p2api
+import pytest
+import requests
+
+from p2obt.backend import client
+from p2obt.backend.client import P2Connection, get_backoff, reset_limiters
+from p2obt.config.options import options_scope
+
+
+class ScriptedAPI:
+    """Answers the calls of a connection with a script of errors and responses."""
+
+    def __init__(self, script: List[Any]) -> None:
+        self.script, self.calls = list(script), []
+
+    def __call__(self, connection, method, url, data=None, etag=None):
+        self.calls.append((method, connection.access_token))
+        result = self.script.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.fixture
+def sleeps(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    """Records the backoffs instead of sleeping (without rate limits)."""
+    sleeps = []
+    monkeypatch.setattr(client.time, "sleep", sleeps.append)
+    with options_scope({"p2.rate": 1000.0, "p2.burst": 1000, "p2.retries": 3}):
+        reset_limiters()
+        yield sleeps
+    reset_limiters()
+
+
+def connect(
+    monkeypatch: pytest.MonkeyPatch, script: List[Any], authenticate=None
+) -> ScriptedAPI:
+    api = ScriptedAPI(script)
+    monkeypatch.setattr(
+        p2api.ApiConnection, "request", lambda self, *args: api(self, *args)
+    )
+    connection = P2Connection(
+        url=p2api.API_URL["demo"], access_token="expired", authenticate=authenticate
+    )
+    return connection, api
+
+
+def test_retry(monkeypatch: pytest.MonkeyPatch, sleeps: List[float]) -> None:
+    """Tests that transient errors are retried with a backoff."""
+    script = [p2api.P2Error(503), requests.ConnectionError(), ({"obId": 1}, "etag")]
+    connection, api = connect(monkeypatch, script)
+    assert connection.request("GET", "/obsBlocks/1") == ({"obId": 1}, "etag")
+    assert len(api.calls) == 3 and len(sleeps) == 2
+
+
+def test_retry_exhausted(monkeypatch: pytest.MonkeyPatch, sleeps: List[float]) -> None:
+    """Tests that the last error is raised once the retries are used up."""
+    connection, api = connect(monkeypatch, [p2api.P2Error(503)] * 4)
+    with pytest.raises(p2api.P2Error):
+        connection.request("GET", "/obsBlocks/1")
+    assert len(api.calls) == 4 and len(sleeps) == 3
+
+
+def test_not_transient(monkeypatch: pytest.MonkeyPatch, sleeps: List[float]) -> None:
+    """Tests that an error that is not transient is not retried."""
+    connection, api = connect(monkeypatch, [p2api.P2Error(404)])
+    with pytest.raises(p2api.P2Error):
+        connection.request("GET", "/obsBlocks/1")
+    assert len(api.calls) == 1 and not sleeps
+
+
+@pytest.mark.parametrize(
+    "error, retried",
+    [
+        (requests.ConnectionError(), False),
+        (requests.ReadTimeout(), False),
+        (p2api.P2Error(500), False),
+        (p2api.P2Error(503), True),
+        (p2api.P2Error(429), True),
+        (requests.ConnectTimeout(), True),
+    ],
+)
+def test_post_retry(
+    monkeypatch: pytest.MonkeyPatch, sleeps: List[float], error, retried: bool
+) -> None:
+    """Tests that a POST is only retried if P2 certainly did not process it."""
+    connection, api = connect(monkeypatch, [error, ({"obId": 1}, "etag")])
+    if retried:
+        assert connection.request("POST", "/containers/1/items")[0] == {"obId": 1}
+    else:
+        with pytest.raises(type(error)):
+            connection.request("POST", "/containers/1/items")
+    assert len(api.calls) == (2 if retried else 1)
+
+
+def test_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the backoff grows exponentially up to its maximum."""
+    monkeypatch.setattr(client.random, "uniform", lambda low, high: high)
+    with options_scope({"p2.backoff": 0.5, "p2.max_backoff": 3.0}):
+        assert [get_backoff(attempt) for attempt in range(5)] == [
+            0.5,
+            1.0,
+            2.0,
+            3.0,
+            3.0,
+        ]
+
+
+@pytest.mark.parametrize("retries", [0, 3])
+def test_unauthorized(
+    monkeypatch: pytest.MonkeyPatch, sleeps: List[float], retries: int
+) -> None:
+    """Tests that an unauthorized call is retried once with a new token
+    (even without retries) and that the new login is not a retry."""
+    logins = []
+
+    def authenticate() -> str:
+        logins.append(True)
+        return "new"
+
+    script = [p2api.P2Error(401), ({"obId": 1}, "etag")]
+    connection, api = connect(monkeypatch, script, authenticate)
+    with options_scope({"p2.retries": retries}):
+        assert connection.request("GET", "/obsBlocks/1") == ({"obId": 1}, "etag")
+    assert api.calls == [("GET", "expired"), ("GET", "new")]
+    assert len(logins) == 1 and not sleeps
+
+
+def test_unauthorized_again(
+    monkeypatch: pytest.MonkeyPatch, sleeps: List[float]
+) -> None:
+    """Tests that a call that is unauthorized with the new token raises."""
+    connection, api = connect(
+        monkeypatch, [p2api.P2Error(401)] * 2, authenticate=lambda: "new"
+    )
+    with options_scope({"p2.retries": 0}):
+        with pytest.raises(p2api.P2Error):
+            connection.request("GET", "/obsBlocks/1")
+    assert len(api.calls) == 2
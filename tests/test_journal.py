@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+import requests
+
+from p2obt import automate
+from p2obt.automate import create_obs
+from p2obt.backend.journal import Journal
+from p2obt.backend.local_server import LocalP2Server
+
+
+def test_journal_with_sync(tmp_path: Path, night_plan: Path, p2: LocalP2Server) -> None:
+    """Tests that a journal can not be silently ignored by syncing."""
+    with pytest.raises(IOError):
+        create_obs(night_plan, sync=True, journal=tmp_path / "journal.jsonl")
+    assert not p2.store.obs
+
+
+def test_journal_resume(
+    tmp_path: Path,
+    night_plan: Path,
+    p2: LocalP2Server,
+    get_tree,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that resuming an interrupted upload with its journal creates
+    no duplicate containers or OBs."""
+    journal = tmp_path / "journal.jsonl"
+    with LocalP2Server(runs=[p2.store.runs[0]["progId"]]) as reference:
+        monkeypatch.setattr(automate, "login", lambda *args: reference.connect())
+        create_obs(night_plan)
+        expected = get_tree(reference)
+
+    calls = []
+
+    def connect(*args):
+        connection = p2.connect()
+        create_template = connection.createTemplate
+
+        def interrupted(ob_id: int, name: str):
+            calls.append(name)
+            if len(calls) == 4:
+                raise requests.ConnectionError("Connection reset")
+            return create_template(ob_id, name)
+
+        connection.createTemplate = interrupted
+        return connection
+
+    monkeypatch.setattr(automate, "login", connect)
+    with pytest.raises(requests.ConnectionError):
+        create_obs(night_plan, journal=journal)
+    assert p2.store.obs and get_tree(p2) != expected
+
+    monkeypatch.setattr(automate, "login", lambda *args: p2.connect())
+    create_obs(night_plan, journal=journal)
+    assert get_tree(p2) == expected
+
+
+def test_journal_template_resume(
+    tmp_path: Path,
+    night_plan: Path,
+    p2: LocalP2Server,
+    get_tree,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Tests that a template whose parameters were not set is reused on
+    resume (not created twice) and that the journal is closed on an error."""
+    journal = tmp_path / "journal.jsonl"
+    journals = []
+
+    class ClosedJournal(Journal):
+        def __init__(self, *args) -> None:
+            super().__init__(*args)
+            journals.append(self)
+
+    calls = []
+
+    def connect(*args):
+        connection = p2.connect()
+        set_template_params = connection.setTemplateParams
+
+        def interrupted(*args):
+            calls.append(args)
+            if len(calls) == 3:
+                raise requests.ConnectionError("Connection reset")
+            return set_template_params(*args)
+
+        connection.setTemplateParams = interrupted
+        return connection
+
+    monkeypatch.setattr(automate, "Journal", ClosedJournal)
+    monkeypatch.setattr(automate, "login", connect)
+    with pytest.raises(requests.ConnectionError):
+        create_obs(night_plan, journal=journal)
+    assert journals[0].journal_file.closed
+    templates = sum(map(len, p2.store.templates.values()))
+
+    monkeypatch.setattr(automate, "login", lambda *args: p2.connect())
+    create_obs(night_plan, journal=journal)
+    assert journals[1].journal_file.closed
+    assert all(len(templates) == 2 for templates in p2.store.templates.values())
+    assert p2.stats["create_template"] == len(p2.store.obs) * 2 > templates
@@ -0,0 +1,82 @@
+import logging
+import threading
+from contextvars import copy_context
+from pathlib import Path
+
+import pytest
+
+from p2obt.backend.logger import log_context, setup_logging, stop_logging
+from p2obt.config.options import options_scope
+
+
+@pytest.fixture
+def log_path(tmp_path: Path):
+    """Logs to a temporary directory (set up again for each test)."""
+    stop_logging()
+    with options_scope({"log.path": tmp_path / "logs"}):
+        yield tmp_path / "logs"
+        stop_logging()
+
+
+def test_log_context(log_path: Path) -> None:
+    """Tests that the records are written with their context (also from the
+    threads that run in a copy of the context)."""
+    setup_logging()
+    with log_context(target="HD 100546", ob=None):
+        logging.info("Composing %s", "OB")
+        with log_context(ob="HD_100546_SCI"):
+            thread = threading.Thread(
+                target=copy_context().run,
+                args=(logging.error, "Failed uploading OB!"),
+            )
+            thread.start()
+            thread.join()
+            try:
+                raise ValueError("Rejected")
+            except ValueError:
+                logging.exception("Failed")
+    logging.warning("Done")
+    stop_logging()
+
+    lines = (log_path / "p2obt.log").read_text(encoding="utf-8").splitlines()
+    assert lines[0].endswith("INFO - [target=HD 100546] Composing OB")
+    assert lines[1].endswith(
+        "ERROR - [target=HD 100546, ob=HD_100546_SCI] Failed uploading OB!"
+    )
+    assert "ValueError: Rejected" in lines[-2]
+    assert lines[-1].endswith("WARNING - Done")
+
+
+def test_rotation(log_path: Path) -> None:
+    """Tests that a new log rotates the previous one and that the log is
+    rotated once it is too large (keeping only the backups)."""
+    log_path.mkdir(parents=True)
+    (log_path / "p2obt.log").write_text("The previous run\n", encoding="utf-8")
+    with options_scope({"log.max_bytes": 512, "log.backups": 3}):
+        setup_logging()
+        for index in range(100):
+            logging.info(f"Record {index:03d}")
+        stop_logging()
+
+    files = sorted(file.name for file in log_path.iterdir())
+    assert files == ["p2obt.log", "p2obt.log.1", "p2obt.log.2", "p2obt.log.3"]
+    assert "Record 099" in (log_path / "p2obt.log").read_text(encoding="utf-8")
+    assert all(file.stat().st_size <= 512 for file in log_path.iterdir())
+
+
+def test_append(log_path: Path) -> None:
+    """Tests that a log is appended to (without rotating it) and that a
+    process can log to its own file."""
+    log_path.mkdir(parents=True)
+    (log_path / "p2obt.log").write_text("The previous run\n", encoding="utf-8")
+    setup_logging(mode="a")
+    logging.info("Appended")
+    stop_logging()
+    lines = (log_path / "p2obt.log").read_text(encoding="utf-8").splitlines()
+    assert lines[0] == "The previous run" and lines[1].endswith("Appended")
+
+    setup_logging(per_process=True)
+    logging.info("Worker")
+    stop_logging()
+    (worker_log,) = log_path.glob("p2obt.*[0-9].log")
+    assert worker_log.read_text(encoding="utf-8").rstrip().endswith("Worker")
@@ -0,0 +1,72 @@
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from p2obt.automate import create_obs
+from p2obt.backend import memory
+from p2obt.backend.local_server import LocalP2Server
+from p2obt.backend.memory import MemoryBudget, release_obs
+from p2obt.config.options import options_scope
+
+MiB = 1024**2
+
+
+def make_block(target: str) -> Dict:
+    """Makes a block with a created OB (its queried target and composed OB)."""
+    return {"obs": [{"target": target, "query": {}, "ob": {}, "id": 1}]}
+
+
+def is_held(blocks: List[Dict]) -> List[bool]:
+    """Checks for each block if its created OBs are still held."""
+    return [all("query" in ob and "ob" in ob for ob in b["obs"]) for b in blocks]
+
+
+def test_budget(monkeypatch: pytest.MonkeyPatch, capsys) -> None:
+    """Tests that the blocks are held until the budget is crossed and that
+    the held and later blocks are released from then on."""
+    rss = [100 * MiB]
+    monkeypatch.setattr(memory, "get_rss", lambda: rss[0])
+    budget = MemoryBudget(200 * MiB)
+    blocks = [make_block(f"HD {index}") for index in range(4)]
+    for block in blocks[:2]:
+        assert release_obs(block, budget) is block
+    assert not budget.streaming and is_held(blocks) == [True] * 4
+
+    rss[0] = 300 * MiB
+    release_obs(blocks[2], budget)
+    assert budget.streaming and not budget.held
+    assert is_held(blocks) == [False, False, False, True]
+    assert all(ob["id"] == 1 for block in blocks for ob in block["obs"])
+
+    # NOTE: The run keeps streaming once the memory is below the budget again
+    rss[0] = 100 * MiB
+    release_obs(blocks[3], budget)
+    assert is_held(blocks) == [False] * 4
+    assert capsys.readouterr().out.count("Switching to streaming") == 1
+    assert budget.summary()["streaming"] and budget.summary()["budget"] == 200.0
+
+
+@pytest.mark.parametrize("limit, streaming", [(None, False), (0, True)])
+def test_budget_limits(monkeypatch: pytest.MonkeyPatch, limit, streaming) -> None:
+    """Tests that no budget never streams and a budget of zero always does."""
+    monkeypatch.setattr(memory, "get_rss", lambda: 1024 * MiB)
+    with options_scope({"memory.budget": limit}):
+        budget = MemoryBudget()
+    block = make_block("HD 142666")
+    release_obs(block, budget)
+    assert budget.streaming is streaming
+    assert is_held([block]) == [not streaming]
+    assert len(budget.held) == int(not streaming)
+
+
+@pytest.mark.parametrize("limit", [None, 0])
+def test_create_obs_budget(
+    tmp_path: Path, night_plan: Path, p2: LocalP2Server, limit
+) -> None:
+    """Tests that a streaming run creates the same OBs."""
+    with options_scope({"memory.budget": limit}):
+        summary = create_obs(night_plan, output_dir=tmp_path / "obs")
+    assert summary["memory"]["streaming"] is (limit == 0)
+    assert summary["failed"] == 0
+    assert len(list((tmp_path / "obs").rglob("*.obx"))) == summary["obs"] > 0
@@ -0,0 +1,129 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from p2obt.automate import create_obs
+from p2obt.backend.local_server import LocalP2Server
+from p2obt.backend.metrics import (
+    Metrics,
+    collect_metrics,
+    format_report,
+    get_metrics,
+    increment,
+    observe,
+    summarise,
+    timed,
+)
+from p2obt.backend.pipeline import Stage, run_pipeline
+
+
+def test_summarise() -> None:
+    """Tests the count, total, mean, percentiles (nearest rank) and maximum."""
+    summary = summarise([float(value) for value in range(1, 101)])
+    assert summary == {
+        "count": 100,
+        "total": 5050.0,
+        "mean": 50.5,
+        "p50": 50.0,
+        "p95": 95.0,
+        "p99": 99.0,
+        "max": 100.0,
+    }
+    assert summarise([2.0])["p50"] == summarise([2.0])["p99"] == 2.0
+
+
+def test_timed() -> None:
+    """Tests that the timings, values and counters are recorded only within
+    a collector (including the errors within a timed section)."""
+    with timed("query"):
+        observe("query.rows", 1)
+        increment("query.empty")
+    assert get_metrics() is None
+
+    with collect_metrics() as metrics:
+        assert get_metrics() is metrics
+        with timed("query"):
+            observe("query.rows", 5)
+        with pytest.raises(KeyError):
+            with timed("query"):
+                raise KeyError("HD 142666")
+        increment("query.empty", 2)
+    assert get_metrics() is None
+
+    summary = metrics.summary()
+    assert summary["timings"]["query"]["count"] == 2
+    assert summary["values"] == {"query.rows": summarise([5])}
+    assert summary["counters"] == {"query.empty": 2, "query.errors": 1}
+
+
+def test_timed_threads() -> None:
+    """Tests that the pipeline's workers record into the run's collector and
+    that threads outside of its context do not."""
+
+    def query(item: int) -> int:
+        with timed("query"):
+            return item
+
+    def upload(item: int) -> int:
+        with timed("upload"):
+            return item
+
+    with collect_metrics() as metrics:
+        run_pipeline(range(20), [Stage("query", query, 4), Stage("upload", upload)])
+        thread = threading.Thread(target=query, args=(0,))
+        thread.start()
+        thread.join()
+
+    timings = metrics.summary()["timings"]
+    assert {name: row["count"] for name, row in timings.items()} == {
+        "query": 20,
+        "upload": 20,
+    }
+
+
+def test_format_report() -> None:
+    """Tests that the report has a row for each timing, value and counter."""
+    metrics = Metrics()
+    for duration in [0.1, 0.2, 0.4]:
+        metrics.record("upload.template", duration)
+    metrics.observe("query.gaia.rows", 3)
+    metrics.increment("query.cache.hits")
+    lines = format_report(metrics.summary()).splitlines()
+    assert lines[0].split()[:3] == ["stage", "count", "total"]
+    assert lines[2].split() == [
+        "upload.template",
+        "3",
+        "0.700",
+        "200.0",
+        "400.0",
+        "400.0",
+        "400.0",
+    ]
+    assert "query.gaia.rows" in lines[6] and lines[-2].split() == [
+        "query.cache.hits",
+        "1",
+    ]
+    assert lines[-1].startswith("Wall time:")
+
+
+def test_create_obs_report(
+    tmp_path: Path, night_plan: Path, p2: LocalP2Server, capsys
+) -> None:
+    """Tests that the stages of a run are timed, printed and saved."""
+    report = tmp_path / "reports" / "run.json"
+    summary = create_obs(night_plan, report=report)
+    assert summary["failed"] == 0
+
+    timings = summary["metrics"]["timings"]
+    for stage in ["query", "compose", "upload", "upload.ob"]:
+        assert timings[stage]["count"] == summary["obs"] > 0
+    assert timings["parse"]["count"] > 0
+    assert timings["upload.container"]["count"] > 0
+    assert timings["upload.template"]["count"] >= summary["obs"]
+    assert "write" not in timings
+
+    assert "upload.template" in capsys.readouterr().out
+    saved = json.loads(report.read_text(encoding="utf-8"))
+    assert saved["metrics"]["timings"]["upload.ob"] == timings["upload.ob"]
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+import pytest
+
+from p2obt.backend.pipeline import Stage, run_pipeline
+from p2obt.config.options import OPTIONS, get_options, options_scope
+
+
+def test_nested_scopes() -> None:
+    """Tests that a nested scope starts from the outer one and that both
+    are restored on exit (without changing the global options)."""
+    active, ttl = OPTIONS.catalogs.local.active, OPTIONS.p2.session.ttl
+    with options_scope({"catalogs.local.active": "ciao"}) as outer:
+        OPTIONS.p2.session.ttl = 10.0
+        with options_scope({"p2.session.ttl": 20.0}) as inner:
+            assert inner is not outer and get_options() is inner
+            assert OPTIONS.catalogs.local.active == "ciao"
+            assert OPTIONS.p2.session.ttl == 20.0
+            OPTIONS.catalogs.local.active = "standard"
+        assert get_options() is outer
+        assert OPTIONS.catalogs.local.active == "ciao"
+        assert OPTIONS.p2.session.ttl == 10.0
+    assert OPTIONS.catalogs.local.active == active
+    assert OPTIONS.p2.session.ttl == ttl
+
+
+def test_scope_exception() -> None:
+    """Tests that a scope is reset if an error is raised within."""
+    active = OPTIONS.catalogs.local.active
+    with pytest.raises(RuntimeError):
+        with options_scope({"catalogs.local.active": "ciao"}):
+            with options_scope({"p2.session.ttl": 20.0}):
+                raise RuntimeError("Failed")
+    assert OPTIONS.catalogs.local.active == active
+
+    with pytest.raises(AttributeError):
+        with options_scope({"catalogs.local.unknown": True}):
+            pass
+    assert OPTIONS.catalogs.local.active == active
+
+
+def test_scope_threads() -> None:
+    """Tests that concurrent threads keep to their own scopes and that only
+    threads run in a copied context inherit a scope."""
+    barrier, seen = threading.Barrier(4), {}
+
+    def run(name: str) -> None:
+        with options_scope({"catalogs.local.active": name}):
+            barrier.wait()
+            OPTIONS.p2.session.ttl = float(len(name))
+            barrier.wait()
+            seen[name] = (OPTIONS.catalogs.local.active, OPTIONS.p2.session.ttl)
+
+    threads = [
+        threading.Thread(target=run, args=(name,)) for name in ["a", "bb", "ccc", "dd"]
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen == {name: (name, float(len(name))) for name in ["a", "bb", "ccc", "dd"]}
+
+    def get_active() -> str:
+        return OPTIONS.catalogs.local.active
+
+    active = get_active()
+    with options_scope({"catalogs.local.active": "ciao"}):
+        with ThreadPoolExecutor(1) as executor:
+            assert executor.submit(copy_context().run, get_active).result() == "ciao"
+            assert executor.submit(get_active).result() == active
+
+
+def test_scope_pipeline() -> None:
+    """Tests that the workers of the pipeline's stages inherit the scope."""
+    stages = [
+        Stage("query", lambda item: (item, OPTIONS.catalogs.local.active), 4),
+        Stage("upload", lambda item: (*item, OPTIONS.p2.session.ttl), 2),
+    ]
+    overrides = {"catalogs.local.active": "ciao", "p2.session.ttl": 5.0}
+    with options_scope(overrides):
+        results = run_pipeline(range(16), stages)
+    assert sorted(results) == [(item, "ciao", 5.0) for item in range(16)]
+
+
+def test_scope_tasks() -> None:
+    """Tests that concurrent asyncio tasks keep to their own scopes."""
+
+    async def run(name: str) -> str:
+        with options_scope({"catalogs.local.active": name}):
+            await asyncio.sleep(0.01)
+            return OPTIONS.catalogs.local.active
+
+    async def gather():
+        return await asyncio.gather(*[run(name) for name in ["a", "b", "c"]])
+
+    assert asyncio.run(gather()) == ["a", "b", "c"]
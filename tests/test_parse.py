@@ -0,0 +1,324 @@
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from p2obt.backend.parse import (
+    iter_night_plan,
+    normalize_setting,
+    parse_array_config,
+    parse_line,
+    parse_night_plan_table,
+    parse_night_plan_to_dict,
+    parse_operational_mode,
+    parse_resolution,
+    split_cell,
+    tokenize_night_plan,
+)
+from p2obt.config.options import options_scope
+
+RUN = "run {index}, 110.2474.00{index} = 0109.C-0413(C), ATs large array, MATISSE, LR"
+NIGHT = "night {index}, June {index}:"
+HEADER = "LST   source   RA   dec   L   N   K   V   SpT   diam   airm.   time"
+BLOCKS = [
+    """11:40 cal_LN_HD138538   15 36 43.222  -66 19 01.33    65.7     10.6   4.11   30
+12:10 HD 104237         12 00 05.081  -78 11 34.56     8.6     13.4   4.59   30  MR
+""",
+    """UTs, MR, GRA4MAT
+12:40 HD 100546         11 33 25.437  -70 11 41.24     6.5     59.9   5.42   30
+13:10 cal_LN_HD102839   11 49 56.614  -70 13 32.85    43.9      7.3   4.99   30
+""",
+    """ATs small, HR
+13:40 cal_L_HD96918     11 08 35.390  -58 58 30.13    67.2     11.0   3.92   30
+14:10 HD 98922          11 22 31.674  -53 22 11.46    16.6     31.4   4.28   30
+14:40 cal_N_HD102461    11 47 19.141  -57 41 47.39    80.4     13.2   5.44   30
+""",
+    # NOTE: A science target without calibrators is dropped
+    """15:10 HD 142666        15 56 40.022  -22 01 40.00    10.0      8.0   5.00   30
+""",
+]
+
+
+def parse_groups(section: List[str]) -> List[Dict]:
+    """Parses the groups of a section as the parser before the single-pass
+    tokenizer did."""
+    data, mode, array, res = [], "", "", ""
+    current_group = {"cals": []}
+    for line in section:
+        parts = line.strip().split()
+        if not parts:
+            if current_group.get("target") is not None:
+                data.append(current_group)
+            current_group = {"cals": []}
+            continue
+
+        if line.startswith("#") or not line[0].isdigit():
+            mode = parse_operational_mode(line)
+            array = parse_array_config(line)
+            res = parse_resolution(line)
+            continue
+
+        obj_name = parse_line(parts)
+        if obj_name.startswith("cal_"):
+            _, tag, name = obj_name.split("_")[:3]
+            order = "b" if current_group.get("target") is None else "a"
+            current_group["cals"].append({"name": name, "order": order, "tag": tag})
+        else:
+            current_group.update(
+                {"target": obj_name, "mode": mode, "array": array, "res": res}
+            )
+            current_group["type"] = ""
+            mode, array, res = "", "", ""
+    return [entry for entry in data if entry["cals"]]
+
+
+def parse_file_section(lines: List[str], identifier: str) -> Dict[str, List[str]]:
+    """Splits lines into the sections of an identifier as the parser before
+    the single-pass tokenizer did."""
+    indices, labels = [], []
+    for index, line in enumerate(lines):
+        if line.lower().startswith(identifier):
+            indices.append(index)
+            labels.append(line.strip())
+
+    if not indices:
+        indices, labels = [0], ["full_" + identifier]
+    sections = [
+        lines[index : indices[i + 1] if i + 1 < len(indices) else None]
+        for i, index in enumerate(indices)
+    ]
+    return dict(zip(labels, sections))
+
+
+def parse_two_pass(night_plan: Path) -> Dict[str, Dict]:
+    """Parses a night plan by splitting it into runs and nights first."""
+    lines = night_plan.read_text(encoding="utf-8").splitlines(keepends=True)
+    runs = {}
+    for run_id, run in parse_file_section(lines, "run").items():
+        nights = {}
+        for night_id, night in parse_file_section(run, "night").items():
+            if night_content := parse_groups(night):
+                nights[night_id] = night_content
+        runs[run_id] = nights
+    return runs
+
+
+def make_night_plan(*sections: str) -> str:
+    """Makes a night plan from its sections (separated by empty lines)."""
+    return "\n".join([*sections, ""])
+
+
+NIGHT_PLANS = {
+    "single": make_night_plan(
+        RUN.format(index=1), "", NIGHT.format(index=1), HEADER, "", *BLOCKS
+    ),
+    "runs_and_nights": make_night_plan(
+        RUN.format(index=1),
+        NIGHT.format(index=1),
+        *BLOCKS[:2],
+        NIGHT.format(index=2),
+        *BLOCKS[2:],
+        RUN.format(index=2),
+        NIGHT.format(index=3),
+        *BLOCKS,
+    ),
+    "no_runs": make_night_plan(HEADER, *BLOCKS[:1], NIGHT.format(index=1), *BLOCKS[1:]),
+    "no_nights": make_night_plan(
+        *BLOCKS[:1], RUN.format(index=1), *BLOCKS, RUN.format(index=2), *BLOCKS[1:]
+    ),
+    "no_sections": make_night_plan(HEADER, *BLOCKS),
+    "preamble": make_night_plan(
+        NIGHT.format(index=1),
+        *BLOCKS[:2],
+        RUN.format(index=1),
+        *BLOCKS[2:],
+        NIGHT.format(index=2),
+        *BLOCKS[:1],
+    ),
+    "repeated": make_night_plan(
+        RUN.format(index=1),
+        NIGHT.format(index=1),
+        *BLOCKS[:1],
+        NIGHT.format(index=2),
+        *BLOCKS[1:2],
+        NIGHT.format(index=1),
+        *BLOCKS[2:],
+        RUN.format(index=2),
+        *BLOCKS[:1],
+        RUN.format(index=1),
+        NIGHT.format(index=1),
+        *BLOCKS[1:],
+    ),
+    "no_trailing_line": make_night_plan(RUN.format(index=1), *BLOCKS).rstrip(),
+}
+
+
+@pytest.mark.parametrize("name", NIGHT_PLANS)
+def test_parse_night_plan_to_dict(tmp_path: Path, name: str) -> None:
+    """Tests that the single-pass tokenizer parses the night plans as the
+    parser that split them into runs and nights first."""
+    night_plan = tmp_path / f"{name}.txt"
+    night_plan.write_text(NIGHT_PLANS[name], encoding="utf-8")
+    expected = parse_two_pass(night_plan)
+    assert any(expected.values())
+    assert parse_night_plan_to_dict(night_plan, cache=False) == expected
+
+
+@pytest.mark.parametrize("name", NIGHT_PLANS)
+def test_iter_night_plan_cached(tmp_path: Path, name: str) -> None:
+    """Tests that the blocks of a cached night plan are the same as the
+    streamed ones (also for repeated runs and nights)."""
+    night_plan = tmp_path / f"{name}.txt"
+    night_plan.write_text(NIGHT_PLANS[name], encoding="utf-8")
+    with options_scope({"cache.path": tmp_path / "cache"}):
+        streamed = list(iter_night_plan(night_plan, cache=False))
+        assert list(iter_night_plan(night_plan, cache=True)) == streamed
+        assert list((tmp_path / "cache" / "plans").iterdir())
+        assert list(iter_night_plan(night_plan, cache=True)) == streamed
+
+        # NOTE: The parsed night plan (of the same content) is cached apart
+        parse_night_plan_to_dict(night_plan, cache=True)
+        assert list(iter_night_plan(night_plan, cache=True)) == streamed
+
+
+@pytest.mark.parametrize(
+    "cell, values",
+    [
+        ("HD1, HD2;HD3", ["HD1", "HD2", "HD3"]),
+        (" HD1 ", ["HD1"]),
+        (["HD1 ", 2], ["HD1", "2"]),
+        (("b", "a"), ["b", "a"]),
+        ("", []),
+        (None, []),
+        (float("nan"), []),
+    ],
+)
+def test_split_cell(cell, values: List[str]) -> None:
+    """Tests that a cell is split into its values (and empty cells are empty)."""
+    assert split_cell(cell) == values
+
+
+def test_normalize_setting() -> None:
+    """Tests that the values of a column are normalized to the setting's."""
+    pd = pytest.importorskip("pandas")
+    column = pd.Series(["LR", "low", "MED", "medium", "HIGH", ""])
+    normalized = normalize_setting(column, "res")
+    assert normalized.tolist() == ["LOW", "LOW", "MED", "MED", "HIGH", ""]
+    assert normalize_setting(pd.Series(["UTs", "ATs large"]), "array").tolist() == [
+        "UTs",
+        "large",
+    ]
+    with pytest.raises(IOError, match="ultra, wide"):
+        normalize_setting(pd.Series(["ultra", "LR", "wide"]), "res")
+
+
+TABLE_NIGHT_PLAN = make_night_plan(
+    "UTs, MR, GRA4MAT",
+    *BLOCKS[0].splitlines()[:2],
+    "",
+    "UTs, MR, MATISSE",
+    *BLOCKS[2].splitlines()[1:],
+    "",
+)
+TABLE_EXPECTED = {
+    "full_run": {
+        "full_night": [
+            {
+                "cals": [{"name": "HD138538", "order": "b", "tag": "LN"}],
+                "target": "HD 104237",
+                "mode": "gr",
+                "array": "UTs",
+                "res": "MED",
+                "type": "",
+            },
+            {
+                "cals": [
+                    {"name": "HD96918", "order": "b", "tag": "L"},
+                    {"name": "HD102461", "order": "a", "tag": "N"},
+                ],
+                "target": "HD 98922",
+                "mode": "st",
+                "array": "UTs",
+                "res": "MED",
+                "type": "",
+            },
+        ]
+    }
+}
+
+
+def test_parse_night_plan_table(tmp_path: Path) -> None:
+    """Tests that a night plan table is parsed as the equivalent night plan."""
+    pd = pytest.importorskip("pandas")
+    night_plan = tmp_path / "night_plan.txt"
+    night_plan.write_text(TABLE_NIGHT_PLAN, encoding="utf-8")
+    assert parse_night_plan_to_dict(night_plan, cache=False) == TABLE_EXPECTED
+
+    table = pd.DataFrame(
+        {
+            "Targets": ["HD 104237", "HD 98922"],
+            "calibrator": [["HD138538"], "HD96918; HD102461"],
+            "order": ["", "before, after"],
+            "tag": ["", "L, N"],
+            "res": ["MR", "medium"],
+            "array": "UTs",
+            "mode": ["GRA4MAT", "st"],
+        }
+    )
+    assert parse_night_plan_table(table) == TABLE_EXPECTED
+    csv = tmp_path / "night_plan.csv"
+    table.assign(calibrator=["HD138538", "HD96918; HD102461"]).to_csv(csv, index=False)
+    assert parse_night_plan_table(csv) == TABLE_EXPECTED
+
+    for column, value, message in [
+        ("calibrator", ["HD138538", ""], "HD 98922"),
+        ("order", ["", "b"], None),
+        ("order", ["", "b, a, a"], "orders do not match"),
+        ("array", "", "array configuration"),
+        ("res", ["MR", "ultra"], "ultra"),
+    ]:
+        if message is None:
+            assert parse_night_plan_table(table.assign(**{column: value}))
+            continue
+        with pytest.raises(IOError, match=message):
+            parse_night_plan_table(table.assign(**{column: value}))
+
+
+def test_create_night_plan_dict() -> None:
+    """Tests that the night plan of the manual inputs is unchanged."""
+    pytest.importorskip("pandas")
+    from p2obt.backend.utils import create_night_plan_dict
+
+    night_plan = create_night_plan_dict(
+        targets=["HD 104237", "HD 98922"],
+        calibrators=[["HD138538"], "HD96918, HD102461"],
+        orders={"HD 98922": "b, a"},
+        tags=["LN", "L;N"],
+        resolution="med",
+        configuration="UTs",
+        modes=["gr", "st"],
+    )
+    assert night_plan == TABLE_EXPECTED
+    assert create_night_plan_dict() is None
+    with pytest.raises(IOError):
+        create_night_plan_dict(targets=["HD 104237"])
+    with pytest.raises(IOError):
+        create_night_plan_dict(targets=["HD 104237"], calibrators=[["A"], ["B"]])
+
+
+def test_tokenize_streaming() -> None:
+    """Tests that a block is emitted as soon as it is complete (not once all
+    lines have been read)."""
+    lines = NIGHT_PLANS["runs_and_nights"].splitlines(keepends=True)
+    read = []
+
+    def read_lines():
+        for line in lines:
+            read.append(line)
+            yield line
+
+    for kind, token in tokenize_night_plan(read_lines()):
+        if kind == "block":
+            assert token["target"] == "HD 104237"
+            break
+    assert len(read) < len(lines) / 4
@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from p2obt.backend import pipeline
+from p2obt.backend.pipeline import Stage, run_pipeline
+from p2obt.backend.profiling import profile_run
+
+
+def run_in_thread(function, timeout: float = 10) -> None:
+    """Runs a function in a thread and fails if it does not finish in time."""
+    errors = []
+
+    def run():
+        try:
+            function()
+        except BaseException as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "The pipeline hangs!"
+    if errors:
+        raise errors[0]
+
+
+def test_run_pipeline() -> None:
+    """Tests that all items pass through the stages."""
+    stages = [Stage("double", lambda x: 2 * x, 2), Stage("odd", lambda x: x + 1)]
+    assert sorted(run_pipeline(range(10), stages)) == list(range(1, 20, 2))
+
+
+def test_run_pipeline_overlap() -> None:
+    """Tests that the stages overlap, i.e., that an item reaches the last
+    stage before the source is exhausted."""
+    reached = threading.Event()
+
+    def source():
+        yield from range(3)
+        assert reached.wait(5), "The items are not passed on before the end!"
+        yield from range(3, 6)
+
+    def upload(item: int) -> int:
+        reached.set()
+        return item
+
+    stages = [Stage("query", lambda x: x), Stage("upload", upload)]
+    run_in_thread(lambda: run_pipeline(source(), stages))
+
+
+def test_run_pipeline_workers() -> None:
+    """Tests that the workers of a stage run concurrently."""
+    barrier = threading.Barrier(3, timeout=5)
+
+    def query(item: int) -> int:
+        barrier.wait()
+        return item
+
+    run_in_thread(lambda: run_pipeline(range(6), [Stage("query", query, 3)]))
+
+
+def test_run_pipeline_backpressure() -> None:
+    """Tests that a slow stage keeps the source from running ahead of it."""
+    consumed, release = [], threading.Event()
+
+    def source():
+        for item in range(50):
+            consumed.append(item)
+            yield item
+
+    def slow(item: int) -> int:
+        release.wait(5)
+        return item
+
+    def run():
+        assert len(run_pipeline(source(), [Stage("slow", slow)], 2)) == 50
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(0.5)
+    # NOTE: The queue's items, the one being processed and the one waiting
+    assert len(consumed) <= 2 + 1 + 1
+    release.set()
+    thread.join(10)
+    assert len(consumed) == 50
+
+
+def test_run_pipeline_errors() -> None:
+    """Tests that dropped items are not passed on and that an error of a
+    stage stops the pipeline and is raised."""
+    stages = [Stage("even", lambda x: x if x % 2 == 0 else None, 2)]
+    assert sorted(run_pipeline(range(10), stages)) == [0, 2, 4, 6, 8]
+
+    processed = []
+
+    def failing(item: int) -> int:
+        processed.append(item)
+        if item == 3:
+            raise KeyError(item)
+        return item
+
+    with pytest.raises(KeyError):
+        run_in_thread(lambda: run_pipeline(range(1000), [Stage("a", failing)], 2))
+    assert len(processed) < 1000
+
+
+def test_run_pipeline_worker_failure(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that a worker thread that fails (outside of its stage's
+    function) stops the pipeline instead of hanging it."""
+
+    def broken(function):
+        def wrapped(*args):
+            raise ValueError("Another profiling tool is already active")
+
+        return wrapped
+
+    monkeypatch.setattr(pipeline, "profile_thread", broken)
+    stages = [Stage("a", lambda x: x, 2), Stage("b", lambda x: x)]
+    with pytest.raises(ValueError):
+        run_in_thread(lambda: run_pipeline(range(100), stages, queue_size=2))
+
+
+def test_run_pipeline_cprofile(tmp_path) -> None:
+    """Tests that a profiled pipeline finishes (e.g., on Python >= 3.12)."""
+
+    def run():
+        with profile_run("cprofile", tmp_path):
+            assert len(run_pipeline(range(10), [Stage("a", lambda x: x, 2)])) == 10
+
+    run_in_thread(run)
+    assert list(tmp_path.glob("profiles/*/p2obt.pstats"))
@@ -0,0 +1,28 @@
+import pytest
+
+from p2obt.backend.profiling import PROFILE_ENV, get_profile_kind, profile_run
+
+
+@pytest.mark.parametrize("value", ["", "0", "false", "no", "False", "NO"])
+def test_get_profile_kind_disabled(monkeypatch: pytest.MonkeyPatch, value: str) -> None:
+    """Tests that the environment variable disables the profiling."""
+    monkeypatch.setenv(PROFILE_ENV, value)
+    assert get_profile_kind(None) is None
+
+
+@pytest.mark.parametrize(
+    "value, kind", [("1", "cprofile"), ("true", "cprofile"), ("sample", "sample")]
+)
+def test_get_profile_kind(
+    monkeypatch: pytest.MonkeyPatch, value: str, kind: str
+) -> None:
+    """Tests that the environment variable enables the profiling."""
+    monkeypatch.setenv(PROFILE_ENV, value)
+    assert get_profile_kind(None) == kind
+
+
+def test_profile_run_unknown(tmp_path) -> None:
+    """Tests that an unknown profiler is still an error."""
+    with pytest.raises(IOError):
+        with profile_run("perf", tmp_path):
+            pass
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import pytest
+
+from p2obt.backend.metrics import collect_metrics
+from p2obt.backend.query import (
+    get_catalog,
+    get_catalog_telemetry,
+    get_query_key,
+    query,
+)
+from p2obt.config.options import options_scope
+
+
+def test_get_query_key() -> None:
+    """Tests that the catalog options in effect are part of the key."""
+    keys = set()
+    for options in [
+        {},
+        {"catalogs.local.active": "ciao"},
+        {"catalogs.local.active": "standard", "catalogs.available": ["simbad"]},
+        {"catalogs.available": ["simbad", "gaia"]},
+    ]:
+        with options_scope(options):
+            keys.add(get_query_key("HD 142666"))
+    assert len(keys) == 4
+
+
+def test_get_query_key_arguments() -> None:
+    """Tests that the arguments of the query are part of the key."""
+    key = get_query_key("HD 142666")
+    assert key == get_query_key("HD 142666")
+    assert key != get_query_key("HD 142666", exclude_catalogs=["gaia"])
+    assert key != get_query_key("HD 142666", match_radius=10.0)
+    assert key != get_query_key("HD 142666", query_exinction=True)
+    with options_scope({"catalogs.available": ["simbad"]}):
+        simbad_key = get_query_key("HD 142666")
+    assert simbad_key == get_query_key("HD 142666", catalogs=["simbad"])
+
+
+def test_catalog_telemetry(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the latency, rows, bytes, empty results and errors of the
+    catalogs and the hits of the query cache are counted."""
+    from astropy.table import Table
+    from astroquery.utils import TableList
+    from astroquery.vizier import VizierClass
+
+    results = {
+        "HD 142666": TableList({"gaia": Table({"Gmag": [7.0, 9.0]})}),
+        "HD 100546": TableList({}),
+    }
+
+    def query_object(self, name: str, **kwargs) -> TableList:
+        if name not in results:
+            raise ConnectionError("VizieR is down")
+        return results[name]
+
+    monkeypatch.setattr(VizierClass, "query_object", query_object)
+    options = {"cache.path": tmp_path / "cache", "cache.query.active": True}
+    with options_scope(options), collect_metrics() as metrics:
+        for name in ["HD 142666", "HD 142666", "HD 100546"]:
+            get_catalog(name, "gaia")
+        with pytest.raises(ConnectionError):
+            get_catalog("HD 98922", "gaia")
+        for _ in range(3):
+            query("HD 142666", catalogs=[])
+
+    telemetry = get_catalog_telemetry(metrics.summary())
+    assert telemetry.keys() == {"gaia", "cache"}
+    gaia = telemetry["gaia"]
+    assert gaia["queries"] == 4 and gaia["p50"] <= gaia["p99"] <= gaia["time"]
+    assert gaia["rows"] == pytest.approx(4 / 3)
+    assert gaia["bytes"] == pytest.approx(2 * 16 / 3)
+    assert gaia["empty"] == 1 and gaia["errors"] == 1
+    assert telemetry["cache"] == {"hits": 2, "misses": 1, "hit_rate": 2 / 3}
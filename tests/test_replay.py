@@ -0,0 +1,89 @@
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+import requests
+
+from p2obt.backend.local_server import LocalP2Server
+from p2obt.backend.replay import replay
+
+PROG_ID = "110.2474.004"
+
+
+@pytest.fixture
+def server() -> LocalP2Server:
+    """A local stand-in for P2."""
+    with LocalP2Server(runs=[PROG_ID]) as server:
+        yield server
+
+
+def save_operations(file: Path, operations: List[Dict]) -> Path:
+    """Saves operations as recorded (see `RecordingConnection`)."""
+    file.write_text("\n".join(json.dumps(operation) for operation in operations))
+    return file
+
+
+def get_operations(run: str) -> List[Dict]:
+    """Gets the operations of a folder with a concatenation (of one OB) and an OB."""
+    return [
+        {
+            "op": "container",
+            "ref": "$1",
+            "parent": run,
+            "type": "Folder",
+            "name": "night",
+        },
+        {
+            "op": "container",
+            "ref": "$2",
+            "parent": "$1",
+            "type": "Concatenation",
+            "name": "block",
+        },
+        {"op": "ob", "ref": "$3", "parent": "$2", "name": "SCI_target"},
+        {"op": "save_ob", "ref": "$4", "ob": "$3", "fields": {"userPriority": 2}},
+        {"op": "template", "ref": "$5", "ob": "$3", "name": "MATISSE_img_acq"},
+        {"op": "ob", "ref": "$6", "parent": "$1", "name": "CAL_target"},
+        {"op": "save_ob", "ref": "$7", "ob": "$6", "fields": {"userPriority": 3}},
+    ]
+
+
+def test_replay(tmp_path: Path, server: LocalP2Server) -> None:
+    """Tests that all operations are replayed."""
+    file = save_operations(tmp_path / "ops.jsonl", get_operations(f"run:{PROG_ID}"))
+    summary = replay(file, server.connect())
+    assert summary == {"operations": 7, "failed": 0}
+    assert {ob["name"] for ob in server.store.obs.values()} == {
+        "SCI_target",
+        "CAL_target",
+    }
+
+
+def test_replay_missing_run(tmp_path: Path, server: LocalP2Server) -> None:
+    """Tests that the operations in a run that is not on P2 are reported
+    as failed (instead of being lost)."""
+    file = save_operations(tmp_path / "ops.jsonl", get_operations("run:999.9999.999"))
+    summary = replay(file, server.connect())
+    assert summary == {"operations": 0, "failed": 7}
+    assert not server.store.obs
+
+
+def test_replay_failed_container(
+    tmp_path: Path, server: LocalP2Server, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests that a failed container fails the operations of its items
+    (and of their OBs) as well."""
+    connection = server.connect()
+    create_concatenation = connection.createConcatenation
+
+    def failing(container_id: int, name: str):
+        if name == "block":
+            raise requests.ConnectionError("Connection reset")
+        return create_concatenation(container_id, name)
+
+    monkeypatch.setattr(connection, "createConcatenation", failing)
+    file = save_operations(tmp_path / "ops.jsonl", get_operations(f"run:{PROG_ID}"))
+    summary = replay(file, connection)
+    assert summary == {"operations": 3, "failed": 4}
+    assert [ob["name"] for ob in server.store.obs.values()] == ["CAL_target"]
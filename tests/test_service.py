@@ -0,0 +1,182 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from p2obt import service
+from p2obt.config.options import options_scope
+from p2obt.service import JobQueue, JobServer, ServiceError
+
+
+@pytest.fixture(autouse=True)
+def service_dir(tmp_path: Path):
+    """Keeps the service's token and files in a temporary directory."""
+    with options_scope({"cache.path": tmp_path / "cache"}):
+        yield tmp_path / "cache" / "service"
+
+
+@pytest.fixture
+def jobs(tmp_path: Path) -> JobQueue:
+    """A job queue in a temporary directory."""
+    return JobQueue(tmp_path / "jobs.sqlite")
+
+
+@pytest.mark.parametrize(
+    "summary, status",
+    [
+        ({"obs": 7, "created": 7, "skipped": 0, "failed": 0}, "done"),
+        ({"obs": 7, "created": 0, "skipped": 7, "failed": 0}, "done"),
+        ({"obs": 7, "created": 4, "skipped": 0, "failed": 3}, "partial"),
+        ({"obs": 7, "created": 0, "skipped": 0, "failed": 7}, "failed"),
+        ({"error": "IOError: No night plan"}, "failed"),
+    ],
+)
+def test_finish(jobs: JobQueue, summary: dict, status: str) -> None:
+    """Tests that a job is only done if none of its OBs failed."""
+    job = jobs.submit(Path("night_plan.txt"))
+    assert jobs.claim(1)["id"] == job["id"]
+    jobs.finish(job["id"], summary)
+    job = jobs.get(job["id"])
+    assert job["status"] == status
+    assert (job["error"] is None) == (status == "done")
+
+
+@pytest.mark.parametrize("priority", ["high", 1.5, None, True, [1]])
+def test_submit_priority(jobs: JobQueue, priority) -> None:
+    """Tests that a priority that is not an integer is a bad request."""
+    with pytest.raises(ServiceError) as error:
+        jobs.submit(Path("night_plan.txt"), priority=priority)
+    assert error.value.status == 400
+    assert jobs.submit(Path("night_plan.txt"), priority="2")["priority"] == 2
+
+
+def test_dispatch_priority(tmp_path: Path) -> None:
+    """Tests that the service answers an invalid priority with a 400."""
+    night_plan = tmp_path / "night_plan.txt"
+    night_plan.touch()
+    job_server = JobServer(port=0, file=tmp_path / "jobs.sqlite")
+    try:
+        data = {"night_plan": str(night_plan), "priority": "high"}
+        status, body = job_server.dispatch("POST", "/jobs", data)
+        assert status == 400 and "priority" in body["error"]
+        status, body = job_server.dispatch("POST", "/jobs", {**data, "priority": 3})
+        assert status == 201 and body["priority"] == 3
+    finally:
+        job_server.server_close()
+
+
+def run_forever(job, credentials):
+    """Runs a job that never finishes."""
+    time.sleep(600)
+
+
+def wait_until(condition, timeout: float = 30) -> bool:
+    """Waits until a condition is met."""
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="The patched job needs the worker processes to be forked.",
+)
+def test_dead_worker(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the job of a worker process that died is queued again
+    and that the worker is replaced."""
+    monkeypatch.setattr(service, "run_job", run_forever)
+    monkeypatch.setattr(service, "warm_up", lambda: None)
+    night_plan = tmp_path / "night_plan.txt"
+    night_plan.touch()
+    with options_scope({"service.poll": 0.1, "log.path": tmp_path / "logs"}):
+        job_server = JobServer(port=0, workers=1, file=tmp_path / "jobs.sqlite")
+        job_server.start_workers()
+        try:
+            job = job_server.jobs.submit(night_plan, {"output_dir": str(tmp_path)})
+            assert wait_until(
+                lambda: job_server.jobs.get(job["id"])["status"] == "running"
+            )
+            worker = job_server.jobs.get(job["id"])["worker"]
+            os.kill(worker, signal.SIGKILL)
+
+            def replaced() -> bool:
+                job_info = job_server.jobs.get(job["id"])
+                return job_info["status"] == "running" and job_info["worker"] != worker
+
+            assert wait_until(replaced)
+            assert job_server.processes[0].pid != worker
+            assert job_server.processes[0].is_alive()
+        finally:
+            job_server.server_close()
+            job_server.stop_workers(timeout=0.1)
+
+
+def test_token(tmp_path: Path, service_dir: Path) -> None:
+    """Tests that the token is only readable by its owner and that requests
+    without it are rejected."""
+    night_plan = tmp_path / "night_plan.txt"
+    night_plan.touch()
+    job_server = JobServer(port=0, file=tmp_path / "jobs.sqlite")
+    thread = threading.Thread(target=job_server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        token_file = service_dir / "token"
+        assert token_file.stat().st_mode & 0o777 == 0o600
+        assert service.get_token() == job_server.token
+
+        job = service.request(
+            "POST", "/jobs", {"night_plan": str(night_plan)}, job_server.url
+        )
+        assert (
+            service.request("GET", f"/jobs/{job['id']}", url=job_server.url)["id"]
+            == job["id"]
+        )
+
+        token_file.write_text("wrong", encoding="utf-8")
+        with pytest.raises(ServiceError) as error:
+            service.request("GET", "/status", url=job_server.url)
+        assert error.value.status == 401
+
+        token_file.chmod(0o644)
+        with pytest.raises(IOError, match="chmod 600"):
+            service.get_token()
+    finally:
+        job_server.shutdown()
+        job_server.server_close()
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        {"output_dir": "/tmp/elsewhere"},
+        {"journal": "../journal.jsonl"},
+        {"report": 1},
+        {"options": {"cache.path": "/tmp/elsewhere"}},
+        {"options": {"service.root": "/"}},
+    ],
+)
+def test_job_root(tmp_path: Path, arguments: dict) -> None:
+    """Tests that the files written by a job are restricted to the root."""
+    night_plan = tmp_path / "night_plan.txt"
+    night_plan.touch()
+    root = tmp_path / "root"
+    with options_scope({"service.root": root}):
+        job_server = JobServer(port=0, file=tmp_path / "jobs.sqlite")
+        try:
+            data = {"night_plan": str(night_plan), "arguments": arguments}
+            status, body = job_server.dispatch("POST", "/jobs", data)
+            assert status == 400
+
+            data["arguments"] = {"output_dir": "obs", "trace": str(root / "trace")}
+            status, body = job_server.dispatch("POST", "/jobs", data)
+            assert status == 201
+            assert body["arguments"]["output_dir"] == str(root.resolve() / "obs")
+        finally:
+            job_server.server_close()
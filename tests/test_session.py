@@ -0,0 +1,136 @@
+import base64
+import json
+import threading
+import time
+from contextvars import copy_context
+from pathlib import Path
+
+import p2api
+import pytest
+
+from p2obt.backend import upload
+from p2obt.backend.client import P2Connection, reset_limiters
+from p2obt.backend.session import (
+    get_token_expiry,
+    load_sessions,
+    load_token,
+    save_sessions,
+    save_token,
+)
+from p2obt.config.options import options_scope
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path: Path):
+    """Keeps the sessions in a temporary directory (without rate limits)."""
+    options = {
+        "cache.path": tmp_path / "cache",
+        "p2.session.reuse": True,
+        "p2.rate": 1000.0,
+        "p2.burst": 1000,
+    }
+    with options_scope(options):
+        reset_limiters()
+        yield tmp_path / "cache"
+    reset_limiters()
+
+
+def make_jwt(claims: dict) -> str:
+    """Makes an (unsigned) JSON web token with the claims."""
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode("utf-8"))
+    return f"header.{payload.decode('utf-8').rstrip('=')}.signature"
+
+
+def test_permissions(cache_path: Path) -> None:
+    """Tests that the sessions are only readable by the user."""
+    save_token("demo", "52052", "token")
+    assert (cache_path / "sessions.json").stat().st_mode & 0o777 == 0o600
+    assert cache_path.stat().st_mode & 0o777 == 0o700
+    assert load_token("demo", "52052") == "token"
+    assert load_token("production", "52052") is None
+
+
+def test_atomic_write(cache_path: Path) -> None:
+    """Tests that a failed save keeps the previous sessions and that
+    concurrent saves do not corrupt the file."""
+    save_token("demo", "52052", "token")
+    with pytest.raises(TypeError):
+        save_sessions({"demo/52052": {"access_token": object()}})
+    assert load_token("demo", "52052") == "token"
+    assert [file.name for file in cache_path.iterdir()] == ["sessions.json"]
+
+    def save(index: int) -> None:
+        sessions = {"demo/52052": {"access_token": "x" * index, "expires": 1e12}}
+        save_sessions(sessions)
+
+    threads = [
+        threading.Thread(target=copy_context().run, args=(save, index))
+        for index in range(1, 17)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(load_sessions()["demo/52052"]["access_token"]) in range(1, 17)
+    assert [file.name for file in cache_path.iterdir()] == ["sessions.json"]
+
+
+@pytest.mark.parametrize(
+    "exp, expires_in",
+    [(600, 600), (10 * 3600, 3600), (None, 3600), ("opaque", 3600)],
+)
+def test_token_expiry(exp: float | str | None, expires_in: float) -> None:
+    """Tests that a token's expiry is its 'exp' claim capped at the TTL."""
+    if exp == "opaque":
+        token = exp
+    else:
+        token = make_jwt({} if exp is None else {"exp": time.time() + exp})
+    with options_scope({"p2.session.ttl": 3600.0}):
+        expiry = get_token_expiry(token)
+    assert expiry - time.time() == pytest.approx(expires_in, abs=5)
+
+
+def test_expired_token() -> None:
+    """Tests that a token that (nearly) expired is not reused."""
+    save_token("demo", "52052", make_jwt({"exp": time.time() + 30}))
+    assert load_token("demo", "52052") is None
+    save_token("demo", "52052", make_jwt({"exp": time.time() + 600}))
+    assert load_token("demo", "52052") is not None
+
+
+def test_login_expired(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that a reused session that is rejected logs in again (through
+    the connection's 'authenticate') and caches the new token."""
+    logins, calls = [], []
+
+    class LoginConnection(P2Connection):
+        def __init__(self, *args, **kwargs) -> None:
+            if args:
+                logins.append(args)
+                self.access_token = f"token-{len(logins)}"
+                return
+            super().__init__(*args, **kwargs)
+
+    def request(connection, method, url, data=None, etag=None):
+        calls.append(connection.access_token)
+        if connection.access_token == "expired":
+            raise p2api.P2Error(401, method, url, "Unauthorized")
+        return [], None
+
+    monkeypatch.setattr(upload, "P2Connection", LoginConnection)
+    monkeypatch.setattr(upload, "get_credentials", lambda *args: ("52052", "pw"))
+    monkeypatch.setattr(
+        p2api.ApiConnection, "request", lambda self, *args: request(self, *args)
+    )
+
+    save_token("demo", "52052", "expired")
+    connection = upload.login("52052", server="demo")
+    assert connection.access_token == "expired" and not logins
+    assert connection.getRuns() == ([], None)
+    assert calls == ["expired", "token-1"]
+    assert logins == [("demo", "52052", "pw")]
+    assert load_token("demo", "52052") == "token-1"
+
+    # NOTE: A cached session that has expired is not reused at all
+    save_token("demo", "52052", make_jwt({"exp": time.time()}))
+    assert upload.login("52052", server="demo").access_token == "token-2"
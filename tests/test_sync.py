@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import pytest
+import requests
+
+from p2obt import automate
+from p2obt.automate import create_obs
+from p2obt.backend.local_server import LocalP2Server
+from p2obt.backend.sync import load_sync_state
+from p2obt.config.options import OPTIONS
+
+
+def test_sync_unchanged(night_plan: Path, p2: LocalP2Server, get_tree) -> None:
+    """Tests that syncing an unchanged night plan again creates nothing."""
+    create_obs(night_plan, sync=True)
+    tree, stats = get_tree(p2), p2.stats.copy()
+    assert stats["create_item"] > 0
+
+    summary = create_obs(night_plan, sync=True)
+    assert p2.stats["create_item"] == stats["create_item"]
+    assert p2.stats["create_template"] == stats["create_template"]
+    assert p2.stats["save_ob"] == stats["save_ob"]
+    assert p2.stats["save_template"] == stats["save_template"]
+    assert get_tree(p2) == tree
+    assert summary["failed"] == 0
+
+
+def test_sync_changed(night_plan: Path, p2: LocalP2Server, get_tree) -> None:
+    """Tests that a changed OB is updated in place (not created again)."""
+    create_obs(night_plan, sync=True)
+    tree, stats = get_tree(p2), p2.stats.copy()
+    ob_ids = set(p2.store.obs)
+
+    p2.catalogs.kmag = 3.0
+    create_obs(night_plan, sync=True)
+    assert p2.stats["create_item"] == stats["create_item"]
+    assert p2.stats["save_template"] > stats["save_template"]
+    assert set(p2.store.obs) == ob_ids
+    assert get_tree(p2) == tree
+
+    magnitudes = {
+        param["value"]
+        for templates in p2.store.templates.values()
+        for template in templates.values()
+        for param in template["parameters"]
+        if param["name"] == "SEQ.TARG.MAG.K"
+    }
+    assert magnitudes == {3.0}
+
+
+def test_sync_interrupted(
+    night_plan: Path, p2: LocalP2Server, get_tree, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Tests that the OBs synchronised before an error are kept in the sync
+    state and skipped when run again."""
+    calls = []
+
+    def connect(*args):
+        connection = p2.connect()
+        create_template = connection.createTemplate
+
+        def interrupted(ob_id: int, name: str):
+            calls.append(name)
+            if len(calls) == 7:
+                raise requests.ConnectionError("Connection reset")
+            return create_template(ob_id, name)
+
+        connection.createTemplate = interrupted
+        return connection
+
+    monkeypatch.setattr(automate, "login", connect)
+    with pytest.raises(requests.ConnectionError):
+        create_obs(night_plan, sync=True)
+    state = load_sync_state(OPTIONS.cache.path / "sync.json")
+    assert state and set(map(int, state)) < set(p2.store.obs)
+
+    monkeypatch.setattr(automate, "login", lambda *args: p2.connect())
+    stats = p2.stats.copy()
+    create_obs(night_plan, sync=True)
+    updated = p2.stats["save_ob"] - stats["save_ob"]
+    assert updated <= len(p2.store.obs) - len(state)
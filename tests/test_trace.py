@@ -0,0 +1,86 @@
+import json
+import random
+import time
+from pathlib import Path
+
+import p2api
+
+from p2obt.automate import create_obs
+from p2obt.backend.local_server import LocalP2Server
+from p2obt.backend.logger import log_context
+from p2obt.backend.metrics import collect_metrics
+from p2obt.backend.trace import get_endpoint, get_ids, trace_call, trace_calls
+from p2obt.config.options import options_scope
+
+
+def test_get_endpoint() -> None:
+    """Tests that the ids of a url are replaced by placeholders."""
+    url = "/obsBlocks/12/templates/345"
+    assert get_endpoint(url) == "/obsBlocks/{id}/templates/{id}"
+    assert get_ids(url) == {"obsBlocks": 12, "templates": 345}
+    assert get_endpoint("/containers/7/items") == "/containers/{id}/items"
+    assert get_endpoint("/runs") == "/runs" and not get_ids("/runs")
+
+
+def test_tracer() -> None:
+    """Tests that the calls are accounted for per endpoint, OB, container
+    and run (from the log context or the url)."""
+    trace_call("GET", "/runs", time.perf_counter())
+    with trace_calls() as tracer, collect_metrics() as metrics:
+        trace_call("GET", "/runs", time.perf_counter(), 200)
+        with log_context(run="run 3", container=5):
+            trace_call("POST", "/containers/5/items", time.perf_counter(), 201)
+            with log_context(ob="HD_142666_SCI"):
+                start = time.perf_counter()
+                trace_call("PUT", "/obsBlocks/7", start, 412, p2api.P2Error(412))
+                trace_call("PUT", "/obsBlocks/7", start, 200, attempt=1)
+        trace_call("GET", "/containers/9/items", time.perf_counter(), 200)
+
+    summary = tracer.summary()
+    assert (summary["calls"], summary["conflicts"], summary["errors"]) == (5, 1, 1)
+    assert {name: row["calls"] for name, row in summary["endpoints"].items()} == {
+        "GET /containers/{id}/items": 1,
+        "GET /runs": 1,
+        "POST /containers/{id}/items": 1,
+        "PUT /obsBlocks/{id}": 2,
+    }
+    assert summary["obs"]["HD_142666_SCI"]["conflicts"] == 1
+    assert {name: row["calls"] for name, row in summary["containers"].items()} == {
+        "5": 3,
+        "9": 1,
+    }
+    assert summary["runs"]["run 3"]["calls"] == 3
+    assert metrics.summary()["timings"]["p2 PUT /obsBlocks/{id}"]["count"] == 2
+
+
+def test_create_obs_trace(
+    tmp_path: Path, night_plan: Path, p2: LocalP2Server, get_tree
+) -> None:
+    """Tests that every call (and retry) of a run is traced and accounted
+    for per OB and container."""
+    p2.error_rate, p2.random = 0.1, random.Random(4)
+    trace = tmp_path / "trace.json"
+    with options_scope({"p2.retries": 10, "p2.backoff": 0.001}):
+        summary = create_obs(night_plan, trace=trace)
+    assert summary["failed"] == 0 and p2.stats["errors"] > 0
+
+    calls = summary["p2"]
+    assert calls["calls"] == sum(p2.stats.values()) - p2.stats["errors"]
+    assert calls["errors"] == p2.stats["errors"]
+    assert calls["endpoints"]["POST /obsBlocks/{id}/templates"]["calls"] >= len(
+        p2.store.obs
+    )
+    names = {ob["name"] for ob in p2.store.obs.values()}
+    assert calls["obs"].keys() == names
+    assert all(row["calls"] >= 4 for row in calls["obs"].values())
+    run_calls = sum(row["calls"] for row in calls["runs"].values())
+    assert run_calls == calls["calls"] - calls["endpoints"]["GET /obsRuns"]["calls"]
+
+    containers = {
+        str(container_id)
+        for container_id, container in p2.store.containers.items()
+        if any(kind == "ob" for kind, _ in container["items"])
+    }
+    assert containers <= calls["containers"].keys()
+    events = json.loads(trace.read_text(encoding="utf-8"))["traceEvents"]
+    assert sum(event["ph"] == "X" for event in events) == calls["calls"]
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from p2obt.backend import warm
+from p2obt.backend.cache import get_cache_file, load_cached, save_cached
+from p2obt.backend.query import get_query_key
+from p2obt.backend.warm import get_targets, warm_cache, watch
+from p2obt.config.options import OPTIONS, options_scope
+
+TTL = 1000.0
+
+
+@pytest.fixture
+def queried(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """Records the queried targets instead of querying the catalogs
+    (with the cache in a temporary directory)."""
+    queried = []
+
+    def query(name: str) -> Dict:
+        assert not OPTIONS.cache.query.active and not OPTIONS.cache.query.offline
+        queried.append(name)
+        if name == "HD 100546":
+            raise KeyError(name)
+        return {"name": name, "Kmag": 4.0}
+
+    monkeypatch.setattr(warm, "query", query)
+    options = {
+        "cache.path": tmp_path / "cache",
+        "cache.query.ttl": TTL,
+        "cache.warm.rate": 1000.0,
+    }
+    with options_scope(options):
+        yield queried
+
+
+def cache_query(name: str, age: float) -> None:
+    """Caches a target's query as if it had been made 'age' seconds ago."""
+    key = get_query_key(name)
+    save_cached("queries", key, {"name": name, "Kmag": 0.0})
+    modified = time.time() - age
+    os.utime(get_cache_file("queries", key), (modified, modified))
+
+
+def test_warm_cache(night_plan: Path, queried: List[str]) -> None:
+    """Tests that the missing, expired and expiring targets are queried into
+    the cache and that the others are left as is."""
+    # NOTE: The last block of a night plan ends with an empty line
+    night_plan.write_text(night_plan.read_text(encoding="utf-8") + "\n", "utf-8")
+    targets = get_targets([night_plan, night_plan])
+    assert targets == [
+        "HD 104237",
+        "HD138538",
+        "HD 100546",
+        "HD102839",
+        "HD 98922",
+        "HD96918",
+        "HD102461",
+    ]
+    cache_query("HD 104237", 0.1 * TTL)
+    cache_query("HD138538", 0.9 * TTL)
+    cache_query("HD102839", 2 * TTL)
+
+    summary = warm_cache(night_plan, refresh=0.8)
+    assert summary == {"cached": 1, "queried": 4, "refreshed": 1, "failed": 1}
+    assert sorted(queried) == sorted(targets[1:])
+    for name in targets:
+        cached = load_cached("queries", get_query_key(name), TTL)
+        if name == "HD 100546":
+            assert cached is None
+        else:
+            assert cached["Kmag"] == (0.0 if name == "HD 104237" else 4.0)
+
+    queried.clear()
+    summary = warm_cache(night_plan, refresh=0.8)
+    assert summary == {"cached": 6, "queried": 0, "refreshed": 0, "failed": 1}
+    assert queried == ["HD 100546"]
+
+
+def test_watch(night_plan: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that the night plans are warmed every interval (also after an
+    error) until stopped."""
+    stop, calls = threading.Event(), []
+
+    def warm_cache(night_plans, **kwargs) -> None:
+        calls.append((night_plans, kwargs))
+        if len(calls) == 1:
+            raise OSError("The catalogs are down")
+        if len(calls) == 3:
+            stop.set()
+
+    monkeypatch.setattr(warm, "warm_cache", warm_cache)
+    watch(night_plan, interval=0.01, stop=stop, rate=2.0)
+    assert calls == [(night_plan, {"rate": 2.0})] * 3
+
+    # NOTE: A watch that waits for its interval returns once it is stopped
+    stop.clear()
+    thread = threading.Thread(target=watch, args=(night_plan, 3600.0, stop))
+    thread.start()
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive()